@@ -0,0 +1,84 @@
+# filename: benchmark_finance.py
+"""
+Benchmark: per-ticker cost of get_financial_advice (one call per ticker) versus
+get_batch_financial_advice (one vectorised call for the whole portfolio).
+
+Runs fully offline against the fixture provider with synthetic daily bars:
+    python benchmark_finance.py --tickers 500
+"""
+import os
+import io
+import time
+import asyncio
+import argparse
+import tempfile
+import contextlib
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+
+def write_fixtures(directory: str, n_tickers: int, n_days: int = 90):
+    rng = np.random.default_rng(42)
+    dates = pd.bdate_range(end=datetime.now(), periods=n_days)
+    tickers = [f"TKR{i:04d}" for i in range(n_tickers)]
+    for t in tickers:
+        close = 100 + np.cumsum(rng.normal(0, 1.5, n_days))
+        pd.DataFrame({
+            "Date": dates,
+            "Open": close + rng.normal(0, 0.5, n_days),
+            "High": close + rng.random(n_days) * 2,
+            "Low": close - rng.random(n_days) * 2,
+            "Close": close,
+            "Volume": rng.integers(100_000, 1_000_000, n_days),
+        }).to_csv(os.path.join(directory, f"{t}.csv"), index=False)
+    return tickers
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tickers", type=int, default=500)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as fixture_dir:
+        tickers = write_fixtures(fixture_dir, args.tickers)
+        os.environ["FINANCE_DATA_PROVIDER"] = "fixture"
+        os.environ["FINANCE_FIXTURE_DIR"] = fixture_dir
+        os.environ["OHLCV_STORE_DIR"] = os.path.join(fixture_dir, "ohlcv")  # Fresh store: every run fetches
+        import finance_server as fs
+
+        async def one_call_per_ticker():
+            for t in tickers:
+                await fs.get_financial_advice(t)
+
+        # --- Current tool: one call per ticker ---
+        fs.market_cache = fs.MarketDataCache(fs.get_provider())
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            asyncio.run(one_call_per_ticker())
+        single_total = time.perf_counter() - start
+
+        # --- Batch tool: one vectorised call ---
+        fs.market_cache = fs.MarketDataCache(fs.get_provider())
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            asyncio.run(fs.get_batch_financial_advice(tickers))
+        batch_total = time.perf_counter() - start
+
+        # --- Compute only (bars already in memory) ---
+        frames = fs.market_cache.daily_bars_bulk(tickers, days=90)
+        start = time.perf_counter()
+        fs.analyse_batch(frames)
+        compute_only = time.perf_counter() - start
+
+    n = len(tickers)
+    print(f"Tickers: {n}")
+    print(f"get_financial_advice (x{n}):     {single_total:8.3f}s total | {single_total / n * 1000:8.3f} ms/ticker")
+    print(f"get_batch_financial_advice (x1): {batch_total:8.3f}s total | {batch_total / n * 1000:8.3f} ms/ticker")
+    print(f"analyse_batch compute only:      {compute_only:8.3f}s total | {compute_only / n * 1000:8.3f} ms/ticker")
+    print(f"Speed-up: {single_total / batch_total:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
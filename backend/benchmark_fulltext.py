@@ -0,0 +1,88 @@
+# filename: benchmark_fulltext.py
+"""
+Benchmark: full-text query size and latency versus description length, for the
+legacy builder (every word fuzzy-ORed) and fulltext_query.build_fulltext_query.
+
+Offline (query construction only):
+    python benchmark_fulltext.py
+Against the grant_keywords index of a running Neo4j:
+    python benchmark_fulltext.py --neo4j --uri bolt://127.0.0.1:7687 --user neo4j --password ...
+"""
+import os
+import time
+import random
+import argparse
+import statistics
+
+from fulltext_query import build_fulltext_query, legacy_fulltext_query
+
+LENGTHS = (10, 25, 50, 100, 200, 400)
+
+VOCABULARY = (
+    "i need funding for a solar rooftop plant at our textile manufacturing unit and we want to reduce "
+    "the energy cost of the factory with battery storage and efficient motors we are a small msme "
+    "registered under udyam in gujarat and looking for a subsidy or a low interest loan to expand "
+    "production buy new machines and install ev charging for our delivery vehicles"
+).split()
+
+
+def make_description(n_words: int, rng: random.Random) -> str:
+    return " ".join(rng.choice(VOCABULARY) for _ in range(n_words))
+
+
+def run_query(session, query: str) -> int:
+    cypher = 'CALL db.index.fulltext.queryNodes("grant_keywords", $q) YIELD node RETURN count(node) AS n'
+    return session.run(cypher, q=query).single()["n"]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--neo4j", action="store_true", help="Also time the queries against Neo4j")
+    parser.add_argument("--uri", default=os.getenv("NEO4J_URI", "bolt://127.0.0.1:7687"))
+    parser.add_argument("--user", default=os.getenv("NEO4J_USER", "neo4j"))
+    parser.add_argument("--password", default=os.getenv("NEO4J_PASSWORD", ""))
+    parser.add_argument("--repeats", type=int, default=20)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    descriptions = {n: make_description(n, rng) for n in LENGTHS}
+
+    session = driver = None
+    if args.neo4j:
+        from neo4j import GraphDatabase
+        driver = GraphDatabase.driver(args.uri, auth=(args.user, args.password))
+        session = driver.session()
+
+    header = f"{'words':>6} | {'legacy terms':>12} {'build ms':>9}"
+    header += f" {'db ms':>8} {'hits':>6}" if session else ""
+    header += f" | {'new terms':>9} {'build ms':>9}"
+    header += f" {'db ms':>8} {'hits':>6}" if session else ""
+    print(header)
+    print("-" * len(header))
+
+    for n, text in descriptions.items():
+        row = f"{n:>6} |"
+        for builder in (legacy_fulltext_query, build_fulltext_query):
+            start = time.perf_counter()
+            for _ in range(args.repeats):
+                query = builder(text)
+            build_ms = (time.perf_counter() - start) / args.repeats * 1000
+            row += f" {len(query.split(' OR ')):>{12 if builder is legacy_fulltext_query else 9}} {build_ms:>9.3f}"
+            if session:
+                timings, hits = [], 0
+                for _ in range(args.repeats):
+                    start = time.perf_counter()
+                    hits = run_query(session, query)
+                    timings.append((time.perf_counter() - start) * 1000)
+                row += f" {statistics.median(timings):>8.2f} {hits:>6}"
+            if builder is legacy_fulltext_query:
+                row += " |"
+        print(row)
+
+    if session:
+        session.close()
+        driver.close()
+
+
+if __name__ == "__main__":
+    main()
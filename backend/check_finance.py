@@ -0,0 +1,115 @@
+# filename: check_finance.py
+"""
+Offline checks for the Finance MCP server (no network, no Yahoo):
+
+- HTTP pool stats on the plain-requests session (served by a local HTTP server)
+- Ticker validation: LLM-supplied tickers cannot escape the OHLCV store root
+- Market cache: hits, misses and coalescing of concurrent tool calls (FixtureProvider)
+
+    python check_finance.py
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import threading
+import tempfile
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+
+class _OkHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep-alive, so the pool can reuse the connection
+
+    def do_GET(self):
+        body = b"ok"
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def check_http_stats(fs):
+    """The requests fallback must report connection reuse without iterating urllib3's pool container."""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _OkHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        fs._requests_session = fs._build_requests_session()
+        before = dict(fs.http_stats)
+        url = f"http://127.0.0.1:{server.server_port}/"
+        for _ in range(5):
+            assert fs._requests_session.get(url).status_code == 200
+        stats = fs.get_http_stats()
+        assert stats["requests"] - before["requests"] == 5, stats
+        assert stats["new_connections"] - before["new_connections"] == 1, stats
+        assert stats["open_pools"] >= 1, stats
+        assert stats["connection_reuse_rate"] is not None, stats
+    finally:
+        fs._requests_session.close()
+        server.shutdown()
+    print(f"ok  http stats: {stats['requests']} requests, {stats['new_connections']} new connections")
+
+
+def check_ticker_validation(fs):
+    """Path-like tickers are rejected before anything touches the disk."""
+    for bad in ("../../x", "..", "A/B", "A\\B", "aapl", "", "X" * 21):
+        try:
+            fs.validate_ticker(bad)
+        except ValueError:
+            continue
+        raise AssertionError(f"accepted {bad!r}")
+    for good in ("AAPL", "INFY.NS", "^NSEI", "EURUSD=X", "BRK-B"):
+        assert fs.validate_ticker(good) == good
+    out = asyncio.run(fs.get_financial_advice("../../x"))
+    assert "Invalid ticker" in out, out
+    assert not os.path.exists(os.path.normpath(os.path.join(fs.OHLCV_STORE_DIR, "../../X"))), "store root escaped"
+    print("ok  ticker validation")
+
+
+def check_cache_coalescing(fs):
+    """Concurrent tool calls for one ticker share a single provider fetch; later calls hit the cache."""
+    with open(os.path.join(fs.FINANCE_FIXTURE_DIR, "COAL.json"), "w") as f:
+        json.dump({"price": 123.45, "currency": "INR", "news": []}, f)
+    provider = fs.FixtureProvider(fs.FINANCE_FIXTURE_DIR)
+    fetches = []
+
+    def slow_quote(ticker):
+        fetches.append(ticker)
+        time.sleep(0.3)  # Long enough for every concurrent call to find the flight in progress
+        return fs.FixtureProvider.get_quote(provider, ticker)
+
+    provider.get_quote = slow_quote
+    fs.market_cache = fs.MarketDataCache(provider)
+
+    async def run():
+        first = await asyncio.gather(*(fs.get_market_data("COAL") for _ in range(5)))
+        second = await fs.get_market_data("COAL")
+        return first + [second]
+
+    outputs = asyncio.run(run())
+    assert all(json.loads(o)["current_price"] == 123.45 for o in outputs), outputs
+    stats = fs.market_cache.get_stats()
+    assert len(fetches) == 1, fetches
+    assert stats["misses"] >= 1 and stats["coalesced"] >= 4 and stats["hits"] >= 1, stats
+    print(f"ok  cache: {len(fetches)} fetch for 6 calls "
+          f"(misses={stats['misses']}, coalesced={stats['coalesced']}, hits={stats['hits']})")
+
+
+def main():
+    with tempfile.TemporaryDirectory() as fixture_dir:
+        os.environ["FINANCE_DATA_PROVIDER"] = "fixture"
+        os.environ["FINANCE_FIXTURE_DIR"] = fixture_dir
+        os.environ["OHLCV_STORE_DIR"] = os.path.join(fixture_dir, "ohlcv")
+        import finance_server as fs
+
+        checks = [check_http_stats, check_ticker_validation, check_cache_coalescing]
+        for check in checks:
+            check(fs)
+    print(f"{len(checks)} checks passed")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,166 @@
+# filename: context_packing.py
+"""
+Context assembly for grant Q&A.
+
+1. Merge adjacent / overlapping chunks from the same page (the splitter uses a
+   200-char overlap, so neighbouring hits otherwise repeat text verbatim).
+2. Pick passages with MMR (relevance vs. redundancy).
+3. Pack them into a token budget measured with tiktoken.
+"""
+import os
+import re
+from typing import Dict, List, Tuple
+
+import tiktoken
+
+GRANT_QA_TOKEN_BUDGET = int(os.getenv("GRANT_QA_TOKEN_BUDGET", "2500"))
+MMR_LAMBDA = float(os.getenv("MMR_LAMBDA", "0.7"))
+MIN_OVERLAP_CHARS = 20
+MAX_OVERLAP_CHARS = 400
+
+_encoder = None
+
+
+def get_encoder():
+    global _encoder
+    if _encoder is None:
+        try:
+            _encoder = tiktoken.encoding_for_model("gpt-4o")
+        except KeyError:
+            _encoder = tiktoken.get_encoding("cl100k_base")
+    return _encoder
+
+
+def count_tokens(text: str) -> int:
+    return len(get_encoder().encode(text))
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    tokens = get_encoder().encode(text)
+    return get_encoder().decode(tokens[:max_tokens])
+
+
+# =========================================================
+# 1️⃣ OVERLAP MERGING
+# =========================================================
+def _suffix_prefix_overlap(a: str, b: str) -> int:
+    """Length of the longest suffix of `a` that is a prefix of `b` (0 if below MIN_OVERLAP_CHARS)."""
+    for length in range(min(len(a), len(b), MAX_OVERLAP_CHARS), MIN_OVERLAP_CHARS - 1, -1):
+        if a.endswith(b[:length]):
+            return length
+    return 0
+
+
+def _group_key(doc) -> Tuple:
+    meta = doc.metadata or {}
+    return (meta.get("filename") or meta.get("source"), meta.get("page"))
+
+
+def merge_chunks(docs, scores: List[float]) -> List[Dict]:
+    """
+    Collapses chunks of the same page that overlap or touch into single passages.
+    Returns passages: {"text", "score", "metadata", "chunks"}.
+    """
+    groups: Dict[Tuple, List[Tuple]] = {}
+    for doc, score in zip(docs, scores):
+        groups.setdefault(_group_key(doc), []).append((doc, score))
+
+    passages = []
+    for items in groups.values():
+        # Order by position on the page when the splitter recorded it
+        items.sort(key=lambda it: it[0].metadata.get("start_index", 0))
+        current = None
+        for doc, score in items:
+            text = doc.page_content
+            start = doc.metadata.get("start_index")
+            if current is not None:
+                if start is not None and current["end"] is not None and start <= current["end"]:
+                    overlap = current["end"] - start
+                else:
+                    overlap = _suffix_prefix_overlap(current["text"], text)
+                if overlap or (start is not None and start == current["end"]):
+                    current["text"] += text[overlap:]
+                    current["score"] = max(current["score"], score)
+                    if start is not None and current["end"] is not None:
+                        current["end"] = max(current["end"], start + len(text))
+                    else:
+                        current["end"] = None
+                    current["chunks"] += 1
+                    continue
+                passages.append(current)
+            current = {
+                "text": text,
+                "score": score,
+                "metadata": doc.metadata,
+                "end": start + len(text) if start is not None else None,
+                "chunks": 1,
+            }
+        if current is not None:
+            passages.append(current)
+    return passages
+
+
+# =========================================================
+# 2️⃣ MMR SELECTION + TOKEN PACKING
+# =========================================================
+def _terms(text: str) -> set:
+    return set(re.findall(r"[a-z0-9]+", text.lower()))
+
+
+def _jaccard(a: set, b: set) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def mmr_pack(passages: List[Dict], budget: int, lambda_: float = MMR_LAMBDA) -> List[Dict]:
+    """
+    Greedy MMR: relevance (normalised retrieval score) minus redundancy (term Jaccard
+    against already selected passages), added while they fit in the token budget.
+    """
+    if not passages:
+        return []
+    top, low = max(p["score"] for p in passages), min(p["score"] for p in passages)
+    span = (top - low) or 1.0
+    for p in passages:
+        p["relevance"] = (p["score"] - low) / span if top != low else 1.0
+        p["terms"] = _terms(p["text"])
+        p["tokens"] = count_tokens(p["text"])
+
+    selected, remaining, used = [], list(passages), 0
+    while remaining and used < budget:
+        best = max(
+            remaining,
+            key=lambda p: lambda_ * p["relevance"]
+            - (1 - lambda_) * max((_jaccard(p["terms"], s["terms"]) for s in selected), default=0.0),
+        )
+        remaining.remove(best)
+        room = budget - used
+        if best["tokens"] > room:
+            if selected:
+                continue  # Try a smaller passage
+            # The single best passage is larger than the budget: keep its head
+            best["text"] = truncate_to_tokens(best["text"], room)
+            best["tokens"] = room
+        selected.append(best)
+        used += best["tokens"]
+    return selected
+
+
+def pack_context(docs, scores: List[float], budget: int = GRANT_QA_TOKEN_BUDGET) -> Tuple[str, List[Dict], Dict]:
+    """Returns (context_text, selected_passages, stats) with tokens saved vs. naive concatenation."""
+    naive_tokens = count_tokens("\n\n".join(d.page_content for d in docs))
+    passages = merge_chunks(docs, scores)
+    selected = mmr_pack(passages, budget)
+    context_text = "\n\n".join(p["text"] for p in selected)
+    packed_tokens = count_tokens(context_text)
+    stats = {
+        "chunks_retrieved": len(docs),
+        "passages_merged": len(passages),
+        "passages_used": len(selected),
+        "tokens_naive": naive_tokens,
+        "tokens_packed": packed_tokens,
+        "tokens_saved": max(0, naive_tokens - packed_tokens),
+        "token_budget": budget,
+    }
+    return context_text, selected, stats
@@ -0,0 +1,278 @@
+# filename: crawl_engine.py
+"""
+One configurable crawl engine for every portal.
+
+A CrawlProfile describes a site: seeds, allowed domains, depth, page budget and
+PDF link patterns. Any number of profiles are crawled concurrently by one
+Twisted reactor in a worker process (the reactor cannot be restarted inside the
+API process), which streams items back as JSON lines:
+
+    {"type": "page",      "site", "url", "depth", "pdfs"}
+    {"type": "pdf",       "site", "source_url", "pdf_link", "anchor"}
+    {"type": "site_done", "site", "pages", "pdf_pages", "reason"}
+    {"type": "error",     "message"}
+
+Links are followed best-first (crawl_frontier) under the per-domain politeness
+policy (crawl_policy).
+
+CLI (prints the stream):
+    python crawl_engine.py https://ireda.in/cpsu-scheme https://mnre.gov.in/...
+"""
+import os
+import re
+import sys
+import json
+import asyncio
+import argparse
+from typing import AsyncIterator, Dict, List, Optional
+from urllib.parse import urlparse
+
+import scrapy
+from scrapy.exceptions import CloseSpider
+from pydantic import BaseModel, Field
+
+from crawl_frontier import LinkScorer, link_tokens, should_skip, CRAWL_MIN_LINK_SCORE
+from crawl_policy import scrapy_settings
+
+CRAWL_DEPTH_LIMIT = int(os.getenv("CRAWL_DEPTH_LIMIT", "2"))
+CRAWL_PAGE_BUDGET = int(os.getenv("CRAWL_PAGE_BUDGET", "10"))        # Pages per site per crawl
+CRAWL_MAX_WORKERS = int(os.getenv("CRAWL_MAX_WORKERS", "2"))         # Concurrent crawl processes
+CRAWL_TIMEOUT_SECONDS = int(os.getenv("CRAWL_TIMEOUT_SECONDS", "900"))
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/110.0.0.0 Safari/537.36"
+
+
+class CrawlProfile(BaseModel):
+    name: str
+    seeds: List[str]
+    allowed_domains: List[str] = Field(default_factory=list)  # Empty = the seeds' hosts
+    depth_limit: int = CRAWL_DEPTH_LIMIT
+    page_budget: int = CRAWL_PAGE_BUDGET
+    pdf_patterns: List[str] = Field(default_factory=lambda: [r"\.pdf($|[?#])"])
+    onclick_patterns: List[str] = Field(default_factory=lambda: [r"open_doc\('([^']+)'\)"])
+
+
+# Known portals; anything else gets a generic profile from its URL
+SITE_PROFILES: Dict[str, CrawlProfile] = {
+    "ireda": CrawlProfile(
+        name="ireda", seeds=["https://ireda.in/cpsu-scheme"], allowed_domains=["ireda.in"],
+        depth_limit=2, page_budget=10,
+    ),
+}
+
+
+def _host(url: str) -> str:
+    host = urlparse(url).netloc.lower().split(":")[0]
+    return host[4:] if host.startswith("www.") else host
+
+
+def is_allowed(url: str, domains: List[str]) -> bool:
+    host = _host(url)
+    return any(host == d or host.endswith("." + d) for d in domains)
+
+
+def profile_for_url(url: str) -> CrawlProfile:
+    """Known profile for the URL's site (seeded with the URL), else a generic one."""
+    for profile in SITE_PROFILES.values():
+        if is_allowed(url, profile.allowed_domains):
+            return profile.model_copy(update={"seeds": [url]})
+    return CrawlProfile(name=_host(url) or url, seeds=[url], allowed_domains=[_host(url)])
+
+
+# =========================================================
+# SPIDER
+# =========================================================
+class FocusedCrawlSpider(scrapy.Spider):
+    name = "focused_crawler"
+    custom_settings = {
+        'DEPTH_PRIORITY': 0,              # Priority comes from the link score (depth is part of it)
+        'SCHEDULER_DISK_QUEUE': 'scrapy.squeues.PickleFifoDiskQueue',
+        'SCHEDULER_MEMORY_QUEUE': 'scrapy.squeues.FifoMemoryQueue',
+        'ROBOTSTXT_OBEY': False,
+        'REQUEST_FINGERPRINTER_IMPLEMENTATION': '2.7',
+        'DOWNLOAD_HANDLERS': {
+            'https': 'scrapy.core.downloader.handlers.http.HTTPDownloadHandler',
+            'http': 'scrapy.core.downloader.handlers.http.HTTPDownloadHandler',
+        },
+        **scrapy_settings(),              # Per-domain politeness: AutoThrottle, timeouts, retry budget, stats
+    }
+
+    def __init__(self, profile: Dict, scorer: Optional[LinkScorer] = None, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.profile = CrawlProfile(**profile)
+        self.site = self.profile.name
+        self.start_urls = self.profile.seeds
+        self.allowed_domains = self.profile.allowed_domains or sorted({_host(u) for u in self.profile.seeds})
+        self.pdf_patterns = [re.compile(p, re.IGNORECASE) for p in self.profile.pdf_patterns]
+        self.onclick_patterns = [re.compile(p) for p in self.profile.onclick_patterns]
+        self.scorer = scorer or LinkScorer()
+        self.pages_crawled = 0
+        self.pdf_pages = 0
+        self.seen_pdfs = set()
+
+    def start_requests(self):
+        for url in self.start_urls:
+            yield scrapy.Request(url=url, callback=self.parse)
+
+    def _is_pdf(self, url: str) -> bool:
+        return any(p.search(url) for p in self.pdf_patterns)
+
+    def _extract_pdfs(self, response):
+        for element in response.xpath('//a[@href] | //*[@onclick]'):
+            pdf_url = None
+            onclick_content = element.xpath('@onclick').get()
+            if onclick_content:
+                for pattern in self.onclick_patterns:
+                    match = pattern.search(onclick_content)
+                    if match:
+                        pdf_url = response.urljoin(match.group(1))
+                        break
+            if not pdf_url:
+                href_content = element.xpath('@href').get()
+                if href_content and self._is_pdf(href_content):
+                    pdf_url = response.urljoin(href_content)
+            if pdf_url and pdf_url not in self.seen_pdfs:
+                self.seen_pdfs.add(pdf_url)
+                yield pdf_url, element.xpath('normalize-space(string())').get() or ''
+
+    def parse(self, response):
+        if self.pages_crawled >= self.profile.page_budget:
+            return  # Already in flight when the budget ran out
+        self.pages_crawled += 1
+        depth = response.meta.get('depth', 0)
+        self.logger.info(f"Scanning URL: {response.url}")
+
+        # 1. Extract PDFs
+        pdfs = list(self._extract_pdfs(response)) if hasattr(response, 'xpath') else []
+        for pdf_url, anchor in pdfs:
+            yield {'type': 'pdf', 'site': self.site, 'source_url': response.url, 'pdf_link': pdf_url, 'anchor': anchor}
+        yield {'type': 'page', 'site': self.site, 'url': response.url, 'depth': depth, 'pdfs': len(pdfs)}
+
+        # 2. Learn from the link that led here
+        if pdfs:
+            self.pdf_pages += 1
+        if 'link_tokens' in response.meta:
+            self.scorer.record(set(response.meta['link_tokens']), bool(pdfs))
+
+        if self.pages_crawled >= self.profile.page_budget:
+            raise CloseSpider('page_budget')
+        if depth >= self.profile.depth_limit or not hasattr(response, 'xpath'):
+            return
+
+        # 3. Follow in-site links, best first
+        seen = set()
+        for link in response.xpath('//a[@href]'):
+            href = link.xpath('@href').get()
+            if not href or should_skip(href):
+                continue
+            full_url = response.urljoin(href).split('#')[0]
+            if full_url in seen or self._is_pdf(full_url) or not is_allowed(full_url, self.allowed_domains):
+                continue
+            seen.add(full_url)
+            tokens = link_tokens(full_url, link.xpath('normalize-space(string())').get() or '')
+            score = self.scorer.score(tokens, depth + 1)
+            if score < CRAWL_MIN_LINK_SCORE:
+                continue
+            yield response.follow(
+                full_url, callback=self.parse, priority=int(score * 100),
+                meta={'link_tokens': sorted(tokens), 'link_score': round(score, 2)},
+            )
+
+
+# =========================================================
+# WORKER PROCESS (one reactor, many sites)
+# =========================================================
+def _emit(item: Dict):
+    sys.stdout.write(json.dumps(item) + "\n")
+    sys.stdout.flush()
+
+
+def crawl_worker(profiles: List[Dict]):
+    """Crawls all profiles concurrently in this process, writing the item stream to stdout."""
+    from scrapy import signals
+    from scrapy.crawler import CrawlerProcess
+
+    scorer = LinkScorer()  # Shared, so every site's results train the same link weights
+    process = CrawlerProcess({"USER_AGENT": USER_AGENT, "LOG_LEVEL": "INFO"})
+
+    def forward(item, response, spider):
+        _emit(dict(item))
+
+    def site_done(spider, reason):
+        _emit({"type": "site_done", "site": spider.site, "pages": spider.pages_crawled,
+               "pdf_pages": spider.pdf_pages, "reason": reason})
+
+    for profile in profiles:
+        crawler = process.create_crawler(FocusedCrawlSpider)
+        crawler.signals.connect(forward, signal=signals.item_scraped)
+        crawler.signals.connect(site_done, signal=signals.spider_closed)
+        process.crawl(crawler, profile=profile, scorer=scorer)
+    try:
+        process.start()
+    except Exception as e:
+        _emit({"type": "error", "message": str(e)})
+    finally:
+        scorer.save()
+
+
+# =========================================================
+# API SIDE
+# =========================================================
+crawl_slots = asyncio.Semaphore(CRAWL_MAX_WORKERS)
+
+
+async def stream_crawl(profiles: List[CrawlProfile], timeout: float = CRAWL_TIMEOUT_SECONDS) -> AsyncIterator[Dict]:
+    """Runs the profiles in a crawl worker and yields its items as they arrive."""
+    async with crawl_slots:
+        worker = await asyncio.create_subprocess_exec(
+            sys.executable, os.path.abspath(__file__), "--worker",
+            stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE, stderr=None,  # Scrapy logs go to the server console
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        )
+        worker.stdin.write(json.dumps([p.model_dump() for p in profiles]).encode())
+        worker.stdin.close()
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        timed_out = False
+        try:
+            while True:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    timed_out = True
+                    yield {"type": "error", "message": f"Crawl timed out after {timeout}s"}
+                    break
+                try:
+                    line = await asyncio.wait_for(worker.stdout.readline(), timeout=remaining)
+                except asyncio.TimeoutError:
+                    continue
+                if not line:
+                    break
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # Stray print from a library
+            code = None if timed_out else await worker.wait()
+            if code:
+                yield {"type": "error", "message": f"Crawl worker exited with code {code}"}
+        finally:
+            if worker.returncode is None:
+                worker.kill()
+                await worker.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("urls", nargs="*", help="Start URLs (a profile is chosen or derived per URL)")
+    parser.add_argument("--profile", action="append", default=[], help=f"Named profile: {', '.join(SITE_PROFILES)}")
+    parser.add_argument("--worker", action="store_true", help="Read profiles as JSON from stdin")
+    args = parser.parse_args()
+
+    if args.worker:
+        profiles = json.load(sys.stdin)
+    else:
+        profiles = [SITE_PROFILES[name].model_dump() for name in args.profile]
+        profiles += [profile_for_url(url).model_dump() for url in args.urls]
+    crawl_worker(profiles)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+# filename: crawl_frontier.py
+"""
+Focused-crawl link scoring.
+
+Outgoing links are scored from their anchor text and URL tokens:
+- prior weights: scheme / guideline / circular / policy ... up, contact / gallery / login ... down
+- learned weights: per-token log-odds of the linked page actually containing PDFs,
+  updated after every crawled page and persisted between crawls.
+
+The spider turns the score into a Scrapy request priority, so the page budget is
+spent on the links most likely to lead to scheme documents.
+"""
+import os
+import re
+import json
+import math
+import threading
+from typing import Dict, Set
+from urllib.parse import urlparse
+
+CRAWL_WEIGHTS_FILE = os.getenv("CRAWL_WEIGHTS_FILE", "crawl_link_weights.json")
+CRAWL_MIN_LINK_SCORE = float(os.getenv("CRAWL_MIN_LINK_SCORE", "-2.0"))  # Links below this are never fetched
+LEARNED_WEIGHT = 1.0
+MIN_TOKEN_VISITS = 3     # Learned weight only kicks in after this many observations
+DEPTH_PENALTY = 0.5
+
+# Shared with perform_scraping's link filter
+PDF_KEYWORDS = ('scheme', 'guideline', 'circular', 'brochure', 'report', 'policy')
+
+PRIOR_WEIGHTS = {
+    "scheme": 3.0, "schemes": 3.0, "guideline": 3.0, "guidelines": 3.0, "circular": 3.0, "circulars": 3.0,
+    "policy": 2.5, "policies": 2.5, "pdf": 3.0, "download": 2.0, "downloads": 2.0, "notification": 2.0,
+    "notifications": 2.0, "brochure": 2.0, "subsidy": 2.0, "incentive": 2.0, "incentives": 2.0,
+    "document": 1.5, "documents": 1.5, "publication": 1.5, "publications": 1.5, "report": 1.5,
+    "reports": 1.5, "order": 1.0, "orders": 1.0, "tender": 1.0, "archive": 1.0, "programme": 1.5,
+    "program": 1.5, "mission": 1.0, "msme": 1.0, "finance": 1.0,
+    "contact": -3.0, "gallery": -3.0, "photo": -3.0, "photos": -3.0, "video": -3.0, "videos": -3.0,
+    "login": -3.0, "register": -2.0, "career": -2.0, "careers": -2.0, "recruitment": -2.0,
+    "feedback": -2.0, "privacy": -3.0, "disclaimer": -3.0, "terms": -2.0, "sitemap": -1.0,
+    "faq": -1.0, "about": -1.0, "team": -2.0, "event": -1.0, "events": -1.0, "news": -0.5,
+    "facebook": -5.0, "twitter": -5.0, "youtube": -5.0, "instagram": -5.0, "linkedin": -5.0,
+}
+
+SKIP_EXTENSIONS = (".jpg", ".jpeg", ".png", ".gif", ".svg", ".webp", ".zip", ".rar", ".mp4", ".mp3",
+                   ".doc", ".docx", ".xls", ".xlsx", ".ppt", ".pptx", ".css", ".js", ".ico")
+SKIP_SCHEMES = ("mailto:", "tel:", "javascript:", "#")
+
+
+def link_tokens(url: str, anchor: str = "") -> Set[str]:
+    path = urlparse(url).path + " " + (urlparse(url).query or "")
+    return set(re.findall(r"[a-z]{2,}", f"{anchor} {path}".lower()))
+
+
+def should_skip(url: str) -> bool:
+    lowered = url.lower()
+    return lowered.startswith(SKIP_SCHEMES) or urlparse(lowered).path.endswith(SKIP_EXTENSIONS)
+
+
+class LinkScorer:
+    def __init__(self, weights_file: str = CRAWL_WEIGHTS_FILE):
+        self.weights_file = weights_file
+        self._lock = threading.Lock()
+        # token -> [pages visited via a link with this token, of which had PDFs]
+        self.stats: Dict[str, list] = {}
+        if os.path.exists(weights_file):
+            try:
+                with open(weights_file, "r") as f:
+                    self.stats = json.load(f)
+            except (OSError, json.JSONDecodeError):
+                self.stats = {}
+
+    def _learned(self, token: str) -> float:
+        visits, hits = self.stats.get(token, (0, 0))
+        if visits < MIN_TOKEN_VISITS:
+            return 0.0
+        return math.log((hits + 1) / (visits - hits + 1))
+
+    def score(self, tokens: Set[str], depth: int = 0) -> float:
+        prior = sum(PRIOR_WEIGHTS.get(t, 0.0) for t in tokens)
+        learned = sum(self._learned(t) for t in tokens)
+        return max(-10.0, min(10.0, prior)) + LEARNED_WEIGHT * learned - DEPTH_PENALTY * depth
+
+    def record(self, tokens: Set[str], had_pdfs: bool):
+        """Feedback from a crawled page: did the link that led here pay off?"""
+        with self._lock:
+            for t in tokens:
+                entry = self.stats.setdefault(t, [0, 0])
+                entry[0] += 1
+                entry[1] += 1 if had_pdfs else 0
+
+    def save(self):
+        with self._lock:
+            tmp = f"{self.weights_file}.tmp"
+            with open(tmp, "w") as f:
+                json.dump(self.stats, f)
+            os.replace(tmp, self.weights_file)
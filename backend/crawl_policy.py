@@ -0,0 +1,275 @@
+# filename: crawl_policy.py
+"""
+Per-domain crawl transport policy, shared by the Scrapy spiders and the
+BeautifulSoup scraper (perform_scraping / download_pdf).
+
+- Concurrency: at most CRAWL_DOMAIN_CONCURRENCY requests in flight per domain
+- Adaptive delay: latency-driven (delay -> latency / CRAWL_TARGET_CONCURRENCY, smoothed),
+  doubled on 429/5xx/connection errors, honours Retry-After
+- Timeouts: CRAWL_CONNECT_TIMEOUT / CRAWL_READ_TIMEOUT on every request
+- Retry budget: retries per domain are capped at CRAWL_RETRY_BUDGET x requests,
+  so a failing portal cannot eat the crawl
+- Stats: per-domain throughput, latency and error counters (get_stats); Scrapy runs
+  in its own process, so its middleware publishes to CRAWL_STATS_FILE
+"""
+import os
+import json
+import time
+import random
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional
+from urllib.parse import urlparse
+
+import requests
+
+CRAWL_DOMAIN_CONCURRENCY = int(os.getenv("CRAWL_DOMAIN_CONCURRENCY", "2"))
+CRAWL_TARGET_CONCURRENCY = float(os.getenv("CRAWL_TARGET_CONCURRENCY", "1.0"))  # Avg. parallel requests per server
+CRAWL_MIN_DELAY = float(os.getenv("CRAWL_MIN_DELAY", "0.25"))
+CRAWL_MAX_DELAY = float(os.getenv("CRAWL_MAX_DELAY", "30"))
+CRAWL_CONNECT_TIMEOUT = float(os.getenv("CRAWL_CONNECT_TIMEOUT", "10"))
+CRAWL_READ_TIMEOUT = float(os.getenv("CRAWL_READ_TIMEOUT", "30"))
+CRAWL_RETRY_TIMES = int(os.getenv("CRAWL_RETRY_TIMES", "2"))
+CRAWL_RETRY_BUDGET = float(os.getenv("CRAWL_RETRY_BUDGET", "0.2"))  # Retries allowed per request made, per domain
+CRAWL_STATS_FILE = os.getenv("CRAWL_STATS_FILE", "crawl_domain_stats.json")
+
+RETRY_STATUS = {429, 500, 502, 503, 504, 522, 524, 408}
+BACKOFF_STATUS = {429, 503}
+
+
+def domain_of(url: str) -> str:
+    return urlparse(url).netloc.lower()
+
+
+class DomainState:
+    def __init__(self):
+        self.slots = threading.Semaphore(CRAWL_DOMAIN_CONCURRENCY)
+        self.lock = threading.Lock()
+        self.delay = CRAWL_MIN_DELAY
+        self.next_at = 0.0
+        self.started_at = time.time()
+        self.requests = 0
+        self.responses = 0
+        self.errors = 0
+        self.retries = 0
+        self.bytes = 0
+        self.latency_avg = None
+        self.status_counts: Dict[str, int] = {}
+
+    def snapshot(self) -> Dict:
+        elapsed = max(time.time() - self.started_at, 1e-6)
+        return {
+            "requests": self.requests,
+            "responses": self.responses,
+            "errors": self.errors,
+            "retries": self.retries,
+            "error_rate": round(self.errors / self.requests, 3) if self.requests else 0.0,
+            "bytes": self.bytes,
+            "pages_per_min": round(self.responses / elapsed * 60, 2),
+            "kb_per_sec": round(self.bytes / elapsed / 1024, 2),
+            "latency_avg_s": round(self.latency_avg, 3) if self.latency_avg is not None else None,
+            "delay_s": round(self.delay, 3),
+            "status_counts": dict(self.status_counts),
+        }
+
+
+class CrawlPolicy:
+    def __init__(self):
+        self._domains: Dict[str, DomainState] = {}
+        self._lock = threading.Lock()
+
+    def _state(self, domain: str) -> DomainState:
+        with self._lock:
+            if domain not in self._domains:
+                self._domains[domain] = DomainState()
+            return self._domains[domain]
+
+    # --- Accounting (also used by the Scrapy middleware) ---
+    def observe(self, domain: str, latency: Optional[float], status: Optional[int] = None,
+                nbytes: int = 0, error: bool = False, retry_after: Optional[float] = None):
+        """Records one finished request and adapts the domain's delay."""
+        state = self._state(domain)
+        with state.lock:
+            state.requests += 1
+            key = str(status) if status is not None else "error"
+            state.status_counts[key] = state.status_counts.get(key, 0) + 1
+            failed = error or status is None or status >= 400
+            if failed:
+                state.errors += 1
+            else:
+                state.responses += 1
+                state.bytes += nbytes
+
+            if error or status in BACKOFF_STATUS or (status is not None and status >= 500):
+                state.delay = min(CRAWL_MAX_DELAY, max(state.delay * 2, retry_after or 0, CRAWL_MIN_DELAY))
+            elif latency is not None:
+                state.latency_avg = latency if state.latency_avg is None else 0.7 * state.latency_avg + 0.3 * latency
+                # Same rule as Scrapy's AutoThrottle: aim for TARGET_CONCURRENCY requests in flight
+                target = latency / CRAWL_TARGET_CONCURRENCY
+                state.delay = min(CRAWL_MAX_DELAY, max(CRAWL_MIN_DELAY, (state.delay + target) / 2))
+
+    def allow_retry(self, domain: str) -> bool:
+        state = self._state(domain)
+        with state.lock:
+            if state.retries + 1 > max(1.0, state.requests * CRAWL_RETRY_BUDGET):
+                return False
+            state.retries += 1
+            return True
+
+    @contextmanager
+    def slot(self, domain: str):
+        """Holds one of the domain's concurrency slots, after waiting out its delay."""
+        state = self._state(domain)
+        state.slots.acquire()
+        try:
+            with state.lock:
+                now = time.monotonic()
+                wait = max(0.0, state.next_at - now)
+                # Jitter so parallel workers do not fire in lockstep
+                state.next_at = max(now, state.next_at) + state.delay * random.uniform(0.5, 1.5)
+            if wait:
+                time.sleep(wait)
+            yield state
+        finally:
+            state.slots.release()
+
+    # --- Blocking transport for the BeautifulSoup scraper ---
+    def request(self, url: str, headers: Optional[Dict] = None, sink: Optional[Callable] = None) -> requests.Response:
+        """
+        GET with per-domain slot/delay, timeouts and budgeted retries.
+        `sink(response) -> bytes` consumes a streamed body while the slot is still held.
+        Raises the last error once retries are exhausted.
+        """
+        domain = domain_of(url)
+        attempt = 0
+        while True:
+            with self.slot(domain):
+                start = time.monotonic()
+                try:
+                    resp = requests.get(url, headers=headers, stream=sink is not None, verify=False,
+                                        timeout=(CRAWL_CONNECT_TIMEOUT, CRAWL_READ_TIMEOUT))
+                    latency = time.monotonic() - start
+                    if sink is not None and resp.ok:
+                        try:
+                            nbytes = sink(resp)
+                        finally:
+                            resp.close()
+                    else:
+                        nbytes = len(resp.content)
+                except requests.RequestException as e:
+                    self.observe(domain, None, error=True)
+                    if attempt < CRAWL_RETRY_TIMES and self.allow_retry(domain):
+                        attempt += 1
+                        continue
+                    raise e
+                retry_after = resp.headers.get("Retry-After", "")
+                self.observe(domain, latency, resp.status_code, nbytes,
+                             retry_after=float(retry_after) if retry_after.isdigit() else None)
+            if resp.status_code in RETRY_STATUS and attempt < CRAWL_RETRY_TIMES and self.allow_retry(domain):
+                attempt += 1
+                continue
+            return resp
+
+    def download(self, url: str, path: str, headers: Optional[Dict] = None, chunk_size: int = 8192) -> int:
+        """Streams url to path within one domain slot; returns bytes written."""
+        def write(resp) -> int:
+            written = 0
+            with open(path, "wb") as f:
+                for chunk in resp.iter_content(chunk_size=chunk_size):
+                    f.write(chunk)
+                    written += len(chunk)
+            return written
+
+        resp = self.request(url, headers=headers, sink=write)
+        resp.raise_for_status()
+        return os.path.getsize(path)
+
+    # --- Stats ---
+    def get_stats(self) -> Dict[str, Dict]:
+        with self._lock:
+            domains = dict(self._domains)
+        stats = {}
+        for domain, state in domains.items():
+            with state.lock:
+                stats[domain] = state.snapshot()
+        return stats
+
+    def publish(self, source: str, path: str = CRAWL_STATS_FILE):
+        """Merges this process's per-domain stats into the shared stats file."""
+        published = load_published_stats(path)
+        published[source] = {"updated_at": time.time(), "domains": self.get_stats()}
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(published, f)
+        os.replace(tmp, path)
+
+
+def load_published_stats(path: str = CRAWL_STATS_FILE) -> Dict:
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return {}
+
+
+# --- Scrapy side ---
+def scrapy_settings() -> Dict:
+    """Settings applying the same policy to Scrapy (AutoThrottle does the delay maths there)."""
+    return {
+        "AUTOTHROTTLE_ENABLED": True,
+        "AUTOTHROTTLE_START_DELAY": max(CRAWL_MIN_DELAY, 1.0),
+        "AUTOTHROTTLE_MAX_DELAY": CRAWL_MAX_DELAY,
+        "AUTOTHROTTLE_TARGET_CONCURRENCY": CRAWL_TARGET_CONCURRENCY,
+        "DOWNLOAD_DELAY": CRAWL_MIN_DELAY,
+        "RANDOMIZE_DOWNLOAD_DELAY": True,
+        "CONCURRENT_REQUESTS_PER_DOMAIN": CRAWL_DOMAIN_CONCURRENCY,
+        "DOWNLOAD_TIMEOUT": CRAWL_CONNECT_TIMEOUT + CRAWL_READ_TIMEOUT,
+        "RETRY_ENABLED": True,
+        "RETRY_TIMES": CRAWL_RETRY_TIMES,
+        "RETRY_HTTP_CODES": sorted(RETRY_STATUS),
+        "DOWNLOADER_MIDDLEWARES": {"crawl_policy.DomainPolicyMiddleware": 950},
+    }
+
+
+class DomainPolicyMiddleware:
+    """Scrapy downloader middleware: per-domain stats + retry budget, published on close."""
+
+    def __init__(self):
+        self.policy = CrawlPolicy()
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        from scrapy import signals
+        middleware = cls()
+        crawler.signals.connect(middleware.spider_closed, signal=signals.spider_closed)
+        return middleware
+
+    def process_request(self, request, spider):
+        from scrapy.exceptions import IgnoreRequest
+        domain = domain_of(request.url)
+        retry_times = request.meta.get("retry_times", 0)
+        if retry_times and request.meta.get("_policy_retry_counted") != retry_times:
+            if not self.policy.allow_retry(domain):
+                raise IgnoreRequest(f"Retry budget exhausted for {domain}")
+            request.meta["_policy_retry_counted"] = retry_times
+        request.meta["_policy_start"] = time.monotonic()
+        return None
+
+    def process_response(self, request, response, spider):
+        start = request.meta.get("_policy_start")
+        latency = time.monotonic() - start if start is not None else None
+        self.policy.observe(domain_of(request.url), latency, response.status, len(response.body))
+        return response
+
+    def process_exception(self, request, exception, spider):
+        from scrapy.exceptions import IgnoreRequest
+        if isinstance(exception, IgnoreRequest):
+            return None
+        self.policy.observe(domain_of(request.url), None, error=True)
+        return None
+
+    def spider_closed(self, spider):
+        # One entry per site when several spiders share a process
+        self.policy.publish(f"scrapy:{getattr(spider, 'site', spider.name)}")
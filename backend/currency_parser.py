@@ -0,0 +1,68 @@
+# filename: currency_parser.py
+"""
+Parses the free-text money fields of extracted grants into numbers.
+
+    "19,500 Crore"              -> inr = 195_000_000_000
+    "Rs. 50 Lakhs"              -> inr = 5_000_000
+    "30% up to ₹1.5 Cr"         -> percent = 30, inr = 15_000_000
+    "Rs 20 per Watt"            -> per_watt_inr = 20
+    "₹18,000 per kW"            -> per_watt_inr = 18
+"""
+import re
+from typing import Dict, Optional
+
+UNIT_MULTIPLIERS = {
+    "crore": 1e7, "crores": 1e7, "cr": 1e7,
+    "lakh": 1e5, "lakhs": 1e5, "lac": 1e5, "lacs": 1e5, "l": 1e5,
+    "million": 1e6, "mn": 1e6,
+    "billion": 1e9, "bn": 1e9,
+    "thousand": 1e3, "k": 1e3,
+}
+WATT_DIVISORS = {"w": 1, "wp": 1, "watt": 1, "watts": 1, "kw": 1e3, "kwp": 1e3, "mw": 1e6, "mwp": 1e6}
+
+_NUMBER = r"(\d+(?:,\d+)*(?:\.\d+)?)"
+_UNIT = r"(crores?|cr|lakhs?|lacs?|l|million|mn|billion|bn|thousand|k)?"
+_AMOUNT_RE = re.compile(_NUMBER + r"\s*" + _UNIT + r"\b\.?", re.IGNORECASE)
+_PER_POWER_RE = re.compile(_NUMBER + r"\s*" + _UNIT + r"\s*(?:/|per)\s*(wp|w|watts?|kwp|kw|mwp|mw)\b", re.IGNORECASE)
+_PERCENT_RE = re.compile(r"(\d+(?:\.\d+)?)\s*(?:%|per\s*cent|percent)", re.IGNORECASE)
+_CURRENCY_PREFIX_RE = re.compile(r"(rs\.?|₹|inr)\s*$", re.IGNORECASE)
+_FOREIGN_RE = re.compile(r"\b(usd|eur|gbp)\b|\$|€|£", re.IGNORECASE)
+
+
+def _to_float(number: str) -> float:
+    return float(number.replace(",", ""))
+
+
+def parse_inr_amount(text: Optional[str]) -> Dict[str, Optional[float]]:
+    """
+    Returns {"inr", "percent", "per_watt_inr"} (None when absent).
+    `inr` is the first absolute amount in the text (normally the stated cap).
+    """
+    result = {"inr": None, "percent": None, "per_watt_inr": None}
+    if not text:
+        return result
+    text = str(text)
+
+    per_power = _PER_POWER_RE.search(text)
+    if per_power:
+        number, unit, power = per_power.groups()
+        value = _to_float(number) * UNIT_MULTIPLIERS.get((unit or "").lower(), 1)
+        result["per_watt_inr"] = value / WATT_DIVISORS[power.lower()]
+        text = text[:per_power.start()] + text[per_power.end():]
+
+    percent = _PERCENT_RE.search(text)
+    if percent:
+        result["percent"] = float(percent.group(1))
+        text = text[:percent.start()] + text[percent.end():]
+
+    if _FOREIGN_RE.search(text):
+        return result  # Not an INR amount
+
+    for match in _AMOUNT_RE.finditer(text):
+        number, unit = match.groups()
+        # Numbers without a unit are only money right after Rs/₹/INR (otherwise years, counts, clauses)
+        if unit is None and not _CURRENCY_PREFIX_RE.search(text[max(0, match.start() - 6):match.start()]):
+            continue
+        result["inr"] = _to_float(number) * UNIT_MULTIPLIERS.get((unit or "").lower(), 1)
+        break
+    return result
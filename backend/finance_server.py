@@ -1,17 +1,24 @@
+import os
 import json
+import time
+import asyncio
+import threading
 import requests
 import uvicorn
 from fastapi import FastAPI
 import yfinance as yf
 import urllib3
 import pandas as pd
+import numpy as np
+from typing import Dict, List
 from datetime import datetime, timedelta
 from mcp.server.fastmcp import FastMCP
 from langsmith import traceable
 from langsmith.middleware import TracingMiddleware
+from ohlcv_store import OHLCVStore, validate_ticker
 
 # =========================================================
-# 1️⃣ SSL PATCHING (Isolated to this server)
+# 1️⃣ SERVER SETUP
 # =========================================================
 
 app = FastAPI(title="Finance MCP Server")
@@ -19,62 +26,141 @@ app = FastAPI(title="Finance MCP Server")
 # This reads 'langsmith-trace' headers from incoming requests
 app.add_middleware(TracingMiddleware) 
 
+# SSL verification is disabled on the shared session only (no global monkey-patching)
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
-# Patch top-level requests
-methods = ("get", "post", "delete", "options", "head", "patch", "put")
-for method in methods:
-    original = getattr(requests, method)
-    def insecure_request(*args, original=original, **kwargs):
+# =========================================================
+# 2️⃣ SHARED HTTP SESSION POOL
+# =========================================================
+FINANCE_HTTP_POOL_SIZE = int(os.getenv("FINANCE_HTTP_POOL_SIZE", "20"))
+FINANCE_HTTP_TIMEOUT = float(os.getenv("FINANCE_HTTP_TIMEOUT", "15"))
+FINANCE_HTTP_RETRIES = int(os.getenv("FINANCE_HTTP_RETRIES", "2"))
+
+http_stats = {"requests": 0, "errors": 0, "new_connections": 0, "sessions_created": 0}
+_http_stats_lock = threading.Lock()
+_http_local = threading.local()
+_requests_session = None
+_requests_session_lock = threading.Lock()
+
+def _count(key: str, n: int = 1):
+    with _http_stats_lock:
+        http_stats[key] += n
+
+class PooledSession(requests.Session):
+    """requests.Session with default timeout, no SSL verification and request counting."""
+    def request(self, method, url, *args, **kwargs):
+        kwargs.setdefault("timeout", FINANCE_HTTP_TIMEOUT)
         kwargs["verify"] = False
-        return original(*args, **kwargs)
-    setattr(requests, method, insecure_request)
+        _count("requests")
+        try:
+            return super().request(method, url, *args, **kwargs)
+        except Exception:
+            _count("errors")
+            raise
 
-# Patch Session objects
-original_session_request = requests.Session.request
-def insecure_session_request(self, method, url, *args, **kwargs):
-    kwargs["verify"] = False
-    return original_session_request(self, method, url, *args, **kwargs)
-requests.Session.request = insecure_session_request
+def _counting_pool(base):
+    """Connection pool class that counts every NEW connection it opens (reuse is free)."""
+    class CountingPool(base):
+        def _new_conn(self):
+            _count("new_connections")
+            return super()._new_conn()
+    return CountingPool
 
-# =========================================================
-# 2️⃣ HELPER FUNCTIONS
-# =========================================================
-def get_yf_session():
-    """Returns a yfinance-compatible session with SSL verification disabled."""
-    session = requests.Session()
+def _build_requests_session() -> requests.Session:
+    from requests.adapters import HTTPAdapter
+    from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+    from urllib3.util.retry import Retry
+
+    class CountingHTTPAdapter(HTTPAdapter):
+        def init_poolmanager(self, *args, **kwargs):
+            super().init_poolmanager(*args, **kwargs)
+            self.poolmanager.pool_classes_by_scheme = {
+                "http": _counting_pool(HTTPConnectionPool), "https": _counting_pool(HTTPSConnectionPool),
+            }
+
+    session = PooledSession()
     session.verify = False
+    adapter = CountingHTTPAdapter(
+        pool_connections=FINANCE_HTTP_POOL_SIZE,
+        pool_maxsize=FINANCE_HTTP_POOL_SIZE,
+        max_retries=Retry(total=FINANCE_HTTP_RETRIES, backoff_factor=0.3,
+                          status_forcelist=(429, 500, 502, 503, 504), allowed_methods=None),
+    )
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    _count("sessions_created")
+    return session
+
+def _build_curl_session():
+    from curl_cffi import requests as c_requests
+
+    class PooledCurlSession(c_requests.Session):
+        def request(self, method, url, *args, **kwargs):
+            _count("requests")
+            try:
+                response = super().request(method, url, *args, **kwargs)
+            except Exception:
+                _count("errors")
+                raise
+            # libcurl reports how many NEW connections the transfer needed (0 = reused)
+            try:
+                from curl_cffi import CurlInfo
+                _count("new_connections", int(response.curl.getinfo(CurlInfo.NUM_CONNECTS)))
+            except Exception:
+                pass
+            return response
+
+    _count("sessions_created")
+    return PooledCurlSession(impersonate="chrome", verify=False, timeout=FINANCE_HTTP_TIMEOUT)
+
+def get_yf_session():
+    """
+    Returns the shared yfinance-compatible session (keep-alive, SSL verification disabled).
+    curl_cffi sessions are not thread-safe, so there is one per worker thread; the plain
+    requests fallback is a single process-wide session with a bounded connection pool.
+    """
+    global _requests_session
     try:
-        from curl_cffi import requests as c_requests
-        # Use curl_cffi for robustness if available
-        return c_requests.Session(impersonate="chrome", verify=False)
-    except ImportError:
-        # Fallback to standard requests session
+        import curl_cffi  # noqa: F401  (preferred for robustness if available)
+        session = getattr(_http_local, "session", None)
+        if session is None:
+            session = _http_local.session = _build_curl_session()
         return session
+    except ImportError:
+        with _requests_session_lock:
+            if _requests_session is None:
+                _requests_session = _build_requests_session()
+        return _requests_session
+
+def get_http_stats() -> dict:
+    stats = dict(http_stats)
+    if _requests_session is not None:
+        # new_connections is counted by the adapter's pools; len() is the container's only thread-safe view
+        stats["open_pools"] = len(_requests_session.get_adapter("https://").poolmanager.pools)
+    stats["connection_reuse_rate"] = (
+        round(1 - stats["new_connections"] / stats["requests"], 4) if stats["requests"] else None
+    )
+    stats["pool_size"] = FINANCE_HTTP_POOL_SIZE
+    stats["timeout_seconds"] = FINANCE_HTTP_TIMEOUT
+    return stats
 
 # =========================================================
-# 3️⃣ MCP SERVER SETUP & TOOLS
+# 3️⃣ MARKET DATA PROVIDERS
 # =========================================================
-mcp = FastMCP(name="Finance Service")
+FINANCE_DATA_PROVIDER = os.getenv("FINANCE_DATA_PROVIDER", "yahoo")  # 'yahoo' | 'fixture'
+FINANCE_FIXTURE_DIR = os.getenv("FINANCE_FIXTURE_DIR", "finance_fixtures")
+QUOTE_TTL_SECONDS = int(os.getenv("QUOTE_TTL_SECONDS", "30"))
+NEWS_TTL_SECONDS = int(os.getenv("NEWS_TTL_SECONDS", "600"))
+BARS_TTL_SECONDS = int(os.getenv("BARS_TTL_SECONDS", "3600"))
 
-@traceable(run_type="tool", name="Market Data Fetcher")
-@mcp.tool()
-def get_market_data(ticker: str) -> str:
-    """
-    Useful for financial analysis. Gets LIVE real-time stock price and recent news for a ticker symbol (e.g., AAPL, TSLA, MSFT).
-    Returns a JSON string.
-    """
-    print(f"DEBUG [Finance MCP]: Fetching market data for: {ticker}")
-    
-    try:
-        ticker = ticker.upper().strip()
-        session = get_yf_session()
-        stock = yf.Ticker(ticker, session=session)
-        
+class YahooProvider:
+    """Live data from Yahoo Finance."""
+    name = "yahoo"
+
+    def get_quote(self, ticker: str) -> dict:
+        stock = yf.Ticker(ticker, session=get_yf_session())
         price = None
         currency = "USD"
-        
-        # Fetch Price
         try:
             price = stock.fast_info.get('last_price')
             currency = stock.fast_info.get('currency')
@@ -88,15 +174,363 @@ def get_market_data(ticker: str) -> str:
                     currency = info.get('currency')
             except Exception:
                 pass
+        return {"price": price, "currency": currency}
 
-        # Fetch News
-        news_items = []
+    def get_news(self, ticker: str) -> list:
+        stock = yf.Ticker(ticker, session=get_yf_session())
         try:
             news_items = stock.news[:3] if stock.news else []
         except Exception:
-            pass
+            news_items = []
+        return [{"title": i.get("title"), "link": i.get("link")} for i in news_items]
+
+    def get_history(self, ticker: str, start: datetime, end: datetime) -> pd.DataFrame:
+        stock = yf.Ticker(ticker, session=get_yf_session())
+        return stock.history(start=start, end=end, interval="1d")
+
+    def get_history_bulk(self, tickers: List[str], start: datetime, end: datetime) -> Dict[str, pd.DataFrame]:
+        """One bulk download for many tickers instead of one request per ticker."""
+        session = get_yf_session()
+        # yfinance's download threads would share this one session: only the requests
+        # fallback is thread-safe, a curl_cffi session must be used from a single thread
+        data = yf.download(tickers, start=start, end=end, interval="1d", group_by="ticker",
+                           auto_adjust=True, threads=isinstance(session, requests.Session),
+                           progress=False, session=session)
+        if not isinstance(data.columns, pd.MultiIndex):
+            return {tickers[0]: data.dropna(how="all")}
+        available = set(data.columns.get_level_values(0))
+        return {t: data[t].dropna(how="all") for t in tickers if t in available}
+
+
+class FixtureProvider:
+    """
+    Offline provider for tests/dev. Reads {TICKER}.csv (Date,Open,High,Low,Close,Volume)
+    and optional {TICKER}.json ({"price", "currency", "news"}) from FINANCE_FIXTURE_DIR.
+    """
+    name = "fixture"
+
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    def _bars(self, ticker: str) -> pd.DataFrame:
+        path = os.path.join(self.directory, f"{ticker}.csv")
+        if not os.path.exists(path):
+            return pd.DataFrame(columns=["Open", "High", "Low", "Close", "Volume"])
+        return pd.read_csv(path, parse_dates=["Date"], index_col="Date").sort_index()
+
+    def _meta(self, ticker: str) -> dict:
+        path = os.path.join(self.directory, f"{ticker}.json")
+        if os.path.exists(path):
+            with open(path, "r") as f:
+                return json.load(f)
+        return {}
+
+    def get_quote(self, ticker: str) -> dict:
+        meta = self._meta(ticker)
+        price = meta.get("price")
+        if price is None:
+            bars = self._bars(ticker)
+            price = float(bars["Close"].iloc[-1]) if not bars.empty else None
+        return {"price": price, "currency": meta.get("currency", "USD")}
+
+    def get_news(self, ticker: str) -> list:
+        return self._meta(ticker).get("news", [])[:3]
+
+    def get_history(self, ticker: str, start: datetime, end: datetime) -> pd.DataFrame:
+        bars = self._bars(ticker)
+        return bars[(bars.index >= pd.Timestamp(start.date())) & (bars.index <= pd.Timestamp(end))]
+
+    def get_history_bulk(self, tickers: List[str], start: datetime, end: datetime) -> Dict[str, pd.DataFrame]:
+        return {t: self.get_history(t, start, end) for t in tickers}
+
+
+def get_provider():
+    if FINANCE_DATA_PROVIDER == "fixture":
+        return FixtureProvider(FINANCE_FIXTURE_DIR)
+    return YahooProvider()
+
+
+# =========================================================
+# 4️⃣ TTL CACHE WITH REQUEST COALESCING
+# =========================================================
+class _Flight:
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+
+class MarketDataCache:
+    """
+    TTL cache in front of the provider. Concurrent misses for the same key are
+    coalesced into a single upstream request (single-flight). Thread-safe: the tools
+    call it from worker threads (asyncio.to_thread).
+    """
+    def __init__(self, provider):
+        self.provider = provider
+        self._lock = threading.Lock()
+        self._store = {}      # key -> (expires_at, value)
+        self._inflight = {}   # key -> _Flight
+        self.stats = {"hits": 0, "misses": 0, "coalesced": 0, "errors": 0, "evictions": 0}
+
+    def get_or_fetch(self, key, ttl: int, fetch_fn):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._store.get(key)
+            if entry and entry[0] > now:
+                self.stats["hits"] += 1
+                return entry[1]
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = _Flight()
+                self._inflight[key] = flight
+                self.stats["misses"] += 1
+            else:
+                self.stats["coalesced"] += 1
+
+        if not leader:
+            flight.event.wait()
+            if flight.error:
+                raise flight.error
+            return flight.value
+
+        try:
+            flight.value = fetch_fn()
+            with self._lock:
+                self._store[key] = (time.monotonic() + ttl, flight.value)
+            return flight.value
+        except Exception as e:
+            flight.error = e
+            with self._lock:
+                self.stats["errors"] += 1
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            flight.event.set()
+
+    def purge_expired(self):
+        now = time.monotonic()
+        with self._lock:
+            expired = [k for k, (exp, _) in self._store.items() if exp <= now]
+            for k in expired:
+                del self._store[k]
+            self.stats["evictions"] += len(expired)
+
+    # --- Typed accessors ---
+    def quote(self, ticker: str) -> dict:
+        return self.get_or_fetch(("quote", ticker), QUOTE_TTL_SECONDS, lambda: self.provider.get_quote(ticker))
+
+    def news(self, ticker: str) -> list:
+        return self.get_or_fetch(("news", ticker), NEWS_TTL_SECONDS, lambda: self.provider.get_news(ticker))
+
+    def history(self, ticker: str, start: datetime, end: datetime) -> pd.DataFrame:
+        """provider.get_history behind the cache (same signature, so OHLCVStore.sync can use it)."""
+        return self.get_or_fetch(("history", ticker, start.date(), end.date()), BARS_TTL_SECONDS,
+                                 lambda: self.provider.get_history(ticker, start, end))
+
+    def daily_bars(self, ticker: str, days: int) -> pd.DataFrame:
+        def fetch():
+            end_date = datetime.now()
+            return self.provider.get_history(ticker, end_date - timedelta(days=days), end_date)
+        return self.get_or_fetch(("bars", ticker, days), BARS_TTL_SECONDS, fetch)
+
+    def daily_bars_bulk(self, tickers: List[str], days: int) -> Dict[str, pd.DataFrame]:
+        """Serves cached tickers from memory and fetches all the others in ONE bulk request."""
+        result, missing = {}, []
+        now = time.monotonic()
+        with self._lock:
+            for t in tickers:
+                entry = self._store.get(("bars", t, days))
+                if entry and entry[0] > now:
+                    self.stats["hits"] += 1
+                    result[t] = entry[1]
+                else:
+                    self.stats["misses"] += 1
+                    missing.append(t)
+
+        if missing:
+            end_date = datetime.now()
+            try:
+                fetched = self.provider.get_history_bulk(missing, end_date - timedelta(days=days), end_date)
+            except Exception:
+                with self._lock:
+                    self.stats["errors"] += 1
+                raise
+            with self._lock:
+                expires = time.monotonic() + BARS_TTL_SECONDS
+                for t, frame in fetched.items():
+                    self._store[("bars", t, days)] = (expires, frame)
+            result.update(fetched)
+        return result
+
+    def get_stats(self) -> dict:
+        self.purge_expired()
+        lookups = self.stats["hits"] + self.stats["misses"] + self.stats["coalesced"]
+        return {
+            **self.stats,
+            "provider": self.provider.name,
+            "entries": len(self._store),
+            "hit_rate": round((self.stats["hits"] + self.stats["coalesced"]) / lookups, 4) if lookups else None,
+            "ttl_seconds": {"quote": QUOTE_TTL_SECONDS, "news": NEWS_TTL_SECONDS, "bars": BARS_TTL_SECONDS},
+        }
+
+market_cache = MarketDataCache(get_provider())
+
+
+# =========================================================
+# 5️⃣ VECTORISED TECHNICAL ANALYSIS (ticker x time matrices)
+# =========================================================
+MIN_HISTORY_BARS = 60
+
+def stack_bars(frames: Dict[str, pd.DataFrame], fields=("Close", "High", "Low")):
+    """
+    Builds right-aligned (n_tickers x n_bars) matrices, left-padded with NaN.
+    Each ticker keeps its own trading calendar, so row i is exactly the series the
+    single-ticker tool would see.
+    """
+    tickers = list(frames.keys())
+    n_bars = max((len(f) for f in frames.values()), default=0)
+    matrices = {field: np.full((len(tickers), n_bars), np.nan) for field in fields}
+    lengths = np.zeros(len(tickers), dtype=int)
+    for i, t in enumerate(tickers):
+        frame = frames[t]
+        lengths[i] = len(frame)
+        if len(frame):
+            for field in fields:
+                matrices[field][i, n_bars - len(frame):] = frame[field].to_numpy(dtype=float)
+    return tickers, matrices, lengths
+
+def rolling_mean(x: np.ndarray, window: int) -> np.ndarray:
+    """Row-wise rolling mean via cumulative sums. NaN unless the full window is valid (like pandas)."""
+    out = np.full(x.shape, np.nan)
+    if x.shape[1] < window:
+        return out
+    valid = ~np.isnan(x)
+    csum = np.cumsum(np.where(valid, x, 0.0), axis=1)
+    ccount = np.cumsum(valid, axis=1)
+    csum = np.concatenate([np.zeros((x.shape[0], 1)), csum], axis=1)
+    ccount = np.concatenate([np.zeros((x.shape[0], 1), dtype=int), ccount], axis=1)
+    sums = csum[:, window:] - csum[:, :-window]
+    counts = ccount[:, window:] - ccount[:, :-window]
+    out[:, window - 1:] = np.where(counts == window, sums / window, np.nan)
+    return out
+
+def compute_indicators(close: np.ndarray, high: np.ndarray, low: np.ndarray) -> Dict[str, np.ndarray]:
+    """SMA_20, SMA_50, RSI_14 and pivot R1/S1 for every ticker and bar at once."""
+    delta = np.diff(close, axis=1, prepend=np.nan)
+    # Same semantics as delta.where(delta > 0, 0): the first diff of a series counts as 0
+    gain = np.where(np.isnan(close), np.nan, np.where(delta > 0, delta, 0.0))
+    loss = np.where(np.isnan(close), np.nan, np.where(delta < 0, -delta, 0.0))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rs = rolling_mean(gain, 14) / rolling_mean(loss, 14)
+        rsi = 100 - (100 / (1 + rs))
+    pivot = (high + low + close) / 3
+    return {
+        "SMA_20": rolling_mean(close, 20),
+        "SMA_50": rolling_mean(close, 50),
+        "RSI_14": rsi,
+        "PP_R1": (2 * pivot) - low,
+        "PP_S1": (2 * pivot) - high,
+    }
+
+RECOMMENDATIONS = np.array(["STRONG BUY", "BUY", "STRONG SELL", "SELL", "HOLD"])
+
+def recommend(price: np.ndarray, rsi: np.ndarray, sma_50: np.ndarray) -> np.ndarray:
+    """Vectorised BUY/SELL/HOLD rule (same precedence as get_financial_advice)."""
+    conditions = [
+        (rsi < 35) & (price < sma_50),
+        (rsi < 45) & (price > sma_50),
+        (rsi > 75) & (price > sma_50),
+        (rsi > 65) & (price < sma_50),
+    ]
+    index = np.select(conditions, [0, 1, 2, 3], default=4)
+    return RECOMMENDATIONS[index]
+
+def _reasoning(recommendation: str, rsi_value: float) -> str:
+    return {
+        "STRONG BUY": f"Stock is OVERSOLD (RSI: {round(rsi_value, 2)}).",
+        "BUY": "Stock in uptrend (above 50-SMA) and showing strength.",
+        "STRONG SELL": f"Stock is OVERBOUGHT (RSI: {round(rsi_value, 2)}).",
+        "SELL": "Stock failing to hold 50-day average.",
+        "HOLD": "Neutral trading conditions.",
+    }[recommendation]
+
+def analyse_batch(frames: Dict[str, pd.DataFrame]) -> Dict:
+    """Runs the full technical analysis for many tickers with a handful of NumPy ops."""
+    tickers, m, lengths = stack_bars(frames)
+    if not tickers:
+        return {"results": [], "errors": {}}
+    ind = compute_indicators(m["Close"], m["High"], m["Low"])
+
+    price = m["Close"][:, -1]
+    rsi = ind["RSI_14"][:, -1]
+    sma_50 = ind["SMA_50"][:, -1]
+    recs = recommend(price, rsi, sma_50)
+
+    results, errors = [], {}
+    for i, t in enumerate(tickers):
+        if lengths[i] < MIN_HISTORY_BARS:
+            errors[t] = f"Insufficient historical data found for {t} (need min {MIN_HISTORY_BARS} days)."
+            continue
+        r1, s1 = ind["PP_R1"][i, -1], ind["PP_S1"][i, -1]
+        results.append({
+            "ticker": t,
+            "recommendation": str(recs[i]),
+            "current_price": round(float(price[i]), 2),
+            "key_indicators": {
+                "RSI_14": round(float(rsi[i]), 2),
+                "SMA_20": round(float(ind["SMA_20"][i, -1]), 2),
+                "SMA_50": round(float(sma_50[i]), 2),
+                "R1": round(float(r1), 2) if not np.isnan(r1) else "N/A",
+                "S1": round(float(s1), 2) if not np.isnan(s1) else "N/A",
+            },
+            "reasoning": _reasoning(str(recs[i]), float(rsi[i])),
+        })
+    return {"results": results, "errors": errors}
+
+
+# Local columnar history: only missing bars are downloaded, indicators maintained incrementally
+OHLCV_STORE_DIR = os.getenv("OHLCV_STORE_DIR", "ohlcv_store")
+ohlcv_store = OHLCVStore(OHLCV_STORE_DIR, indicator_fn=compute_indicators, sync_ttl_seconds=BARS_TTL_SECONDS)
 
-        clean_news = [{"title": i.get("title"), "link": i.get("link")} for i in news_items]
+
+# =========================================================
+# 6️⃣ MCP SERVER SETUP & TOOLS
+# =========================================================
+# Tools are async and run blocking fetches in worker threads: FastMCP calls sync tools
+# on its event loop, which serialises them and leaves the cache nothing to coalesce.
+mcp = FastMCP(name="Finance Service")
+
+def _is_valid_ticker(ticker: str) -> bool:
+    try:
+        validate_ticker(ticker)
+        return True
+    except ValueError:
+        return False
+
+@traceable(run_type="tool", name="Market Data Fetcher")
+@mcp.tool()
+async def get_market_data(ticker: str) -> str:
+    """
+    Useful for financial analysis. Gets LIVE real-time stock price and recent news for a ticker symbol (e.g., AAPL, TSLA, MSFT).
+    Returns a JSON string.
+    """
+    print(f"DEBUG [Finance MCP]: Fetching market data for: {ticker}")
+    
+    try:
+        ticker = validate_ticker(ticker.upper().strip())
+
+        # Fetch Price (cached for QUOTE_TTL_SECONDS)
+        quote = await asyncio.to_thread(market_cache.quote, ticker)
+        price = quote["price"]
+        currency = quote["currency"]
+
+        # Fetch News (cached for NEWS_TTL_SECONDS)
+        try:
+            clean_news = await asyncio.to_thread(market_cache.news, ticker)
+        except Exception:
+            clean_news = []
 
         if not price:
             return f"Could not fetch price data for {ticker}."
@@ -115,51 +549,33 @@ def get_market_data(ticker: str) -> str:
 
 @traceable(run_type="tool", name="Financial Analyst Logic")
 @mcp.tool()
-def get_financial_advice(ticker: str) -> str:
+async def get_financial_advice(ticker: str) -> str:
     """
     The expert Financial Advisor. Useful for technical analysis, calculating Support/Resistance (S&R), 
     and generating a specific BUY, SELL, or HOLD recommendation. 
     Requires at least 60 days of historical data.
     """
     print(f"DEBUG [Finance MCP]: Generating financial advice for: {ticker}")
-    ticker = ticker.upper()
+    ticker = ticker.upper().strip()
     
     try:
-        session = get_yf_session()
-        stock = yf.Ticker(ticker, session=session)
-
-        # 1. Fetch Historical Data
-        end_date = datetime.now()
-        start_date = end_date - timedelta(days=90) 
-        history = stock.history(start=start_date, end=end_date, interval="1d")
+        validate_ticker(ticker)
+        # 1. Sync Local History (appends only the missing bars + their indicators; fetches go through the cache)
+        await asyncio.to_thread(ohlcv_store.sync, ticker, market_cache.history)
         
-        if history.empty or len(history) < 60:
+        if ohlcv_store.row_count(ticker) < 60:
             return f"Error: Insufficient historical data found for {ticker} (need min 60 days)."
         
-        df = pd.DataFrame(history)
-        
-        # 2. Calculate Indicators
-        df['SMA_20'] = df['Close'].rolling(window=20).mean()
-        df['SMA_50'] = df['Close'].rolling(window=50).mean()
-
-        delta = df['Close'].diff()
-        gain = (delta.where(delta > 0, 0)).rolling(window=14).mean()
-        loss = (-delta.where(delta < 0, 0)).rolling(window=14).mean()
-        rs = gain / loss
-        df['RSI_14'] = 100 - (100 / (1 + rs))
-        
-        df['Pivot'] = (df['High'] + df['Low'] + df['Close']) / 3
-        df['PP_R1'] = (2 * df['Pivot']) - df['Low']
-        df['PP_S1'] = (2 * df['Pivot']) - df['High']
+        # 2. Read Precomputed Indicators (memory-mapped, no recomputation)
+        latest = ohlcv_store.read(ticker, last_n=1)
 
         # 3. Analysis Logic
-        latest = df.iloc[-1]
-        latest_price = latest['Close']
-        rsi_value = latest['RSI_14']
-        sma_50 = latest['SMA_50']
+        latest_price = float(latest['close'][-1])
+        rsi_value = float(latest['rsi_14'][-1])
+        sma_50 = float(latest['sma_50'][-1])
         
-        R1 = latest['PP_R1'] if pd.notna(latest['PP_R1']) else None
-        S1 = latest['PP_S1'] if pd.notna(latest['PP_S1']) else None
+        R1 = float(latest['pp_r1'][-1]) if not np.isnan(latest['pp_r1'][-1]) else None
+        S1 = float(latest['pp_s1'][-1]) if not np.isnan(latest['pp_s1'][-1]) else None
         
         recommendation = "HOLD"
         reasoning = []
@@ -201,6 +617,39 @@ def get_financial_advice(ticker: str) -> str:
     except Exception as e:
         return f"Error running financial analysis for {ticker}: {str(e)}"
     
+@traceable(run_type="tool", name="Batch Financial Analyst")
+@mcp.tool()
+async def get_batch_financial_advice(tickers: List[str]) -> str:
+    """
+    Portfolio screener. Same technical analysis as get_financial_advice (SMA, RSI, R1/S1 and
+    BUY/SELL/HOLD) for MANY tickers in one call (e.g. ["AAPL", "TSLA", "INFY.NS"]).
+    Returns a JSON string with one result per ticker.
+    """
+    requested = list(dict.fromkeys(t.upper().strip() for t in tickers if t and t.strip()))
+    invalid = [t for t in requested if not _is_valid_ticker(t)]
+    clean = [t for t in requested if t not in invalid]
+    print(f"DEBUG [Finance MCP]: Batch analysis for {len(clean)} tickers")
+    try:
+        frames = await asyncio.to_thread(market_cache.daily_bars_bulk, clean, 90) if clean else {}
+        missing = [t for t in clean if t not in frames]
+        report = analyse_batch({t: frames[t] for t in clean if t in frames})
+        for t in missing:
+            report["errors"][t] = f"No historical data found for {t}."
+        for t in invalid:
+            report["errors"][t] = f"Invalid ticker symbol: {t!r}"
+        return json.dumps(report)
+    except Exception as e:
+        return f"Error running batch financial analysis: {str(e)}"
+
+@mcp.tool()
+def get_market_cache_stats() -> str:
+    """Returns hit/miss statistics of the market-data cache and HTTP pool as a JSON string."""
+    return json.dumps({**market_cache.get_stats(), "http": get_http_stats()})
+
+@app.get("/cache/stats")
+def cache_stats():
+    return {**market_cache.get_stats(), "ohlcv_store": ohlcv_store.get_stats(), "http": get_http_stats()}
+
 app.mount("/mcp", mcp.sse_app())
 
 if __name__ == "__main__":
@@ -0,0 +1,107 @@
+# filename: fulltext_query.py
+"""
+Builds Lucene queries for the grant_keywords full-text index from free-text
+project descriptions.
+
+- Tokenises and drops stopwords / filler ("I", "need", "and", "the", ...)
+- Expands domain synonyms (solar <-> PV, MSME <-> SME, EV <-> electric vehicle)
+- Weights terms (frequency + domain boost) and keeps only the top FULLTEXT_MAX_TERMS
+- Fuzzy matching only for longer words (short words + fuzziness = noise)
+
+A 200-word description therefore becomes a query of bounded size.
+"""
+import os
+import re
+from collections import Counter
+from typing import Dict, List
+
+FULLTEXT_MAX_TERMS = int(os.getenv("FULLTEXT_MAX_TERMS", "12"))
+FUZZY_MIN_LENGTH = 6     # Words shorter than this are matched exactly
+SYNONYM_WEIGHT = 0.6     # Expansions count less than the user's own word
+
+STOPWORDS = {
+    "a", "about", "above", "after", "again", "all", "also", "am", "an", "and", "any", "are", "as", "at",
+    "be", "because", "been", "being", "below", "between", "both", "but", "by", "can", "could", "did", "do",
+    "does", "doing", "down", "during", "each", "few", "for", "from", "further", "get", "got", "had", "has",
+    "have", "having", "he", "her", "here", "him", "his", "how", "i", "if", "in", "into", "is", "it", "its",
+    "just", "like", "looking", "make", "me", "more", "most", "my", "need", "needs", "needed", "no", "nor",
+    "not", "now", "of", "off", "on", "once", "only", "or", "other", "our", "out", "over", "own", "please",
+    "same", "she", "should", "so", "some", "such", "than", "that", "the", "their", "them", "then", "there",
+    "these", "they", "this", "those", "through", "to", "too", "under", "until", "up", "us", "very", "want",
+    "wants", "was", "we", "were", "what", "when", "where", "which", "while", "who", "whom", "why", "will",
+    "with", "would", "you", "your", "company", "business", "money", "fund", "funds", "help", "new", "set",
+}
+
+# Canonical term -> equivalent terms (all expanded both ways)
+SYNONYM_GROUPS = [
+    ["solar", "pv", "photovoltaic"],
+    ["msme", "sme", "smes", "msmes"],
+    ["ev", "evs", "electric", "vehicle"],
+    ["loan", "credit", "finance", "financing"],
+    ["subsidy", "grant", "incentive"],
+    ["wind", "turbine"],
+    ["biogas", "biomass", "bioenergy"],
+    ["efficiency", "conservation"],
+    ["battery", "storage"],
+    ["rooftop", "roof"],
+    ["hydrogen", "electrolyser", "electrolyzer"],
+]
+SYNONYMS: Dict[str, List[str]] = {}
+for _group in SYNONYM_GROUPS:
+    for _term in _group:
+        SYNONYMS[_term] = [t for t in _group if t != _term]
+
+# Domain words that should dominate the ranking when present
+DOMAIN_BOOST = {
+    "solar": 2.0, "pv": 2.0, "wind": 2.0, "hydrogen": 2.0, "biogas": 2.0, "ev": 2.0, "battery": 1.5,
+    "msme": 1.5, "udyam": 1.5, "rooftop": 1.5, "efficiency": 1.5, "renewable": 1.5, "energy": 1.2,
+    "manufacturing": 1.2, "textile": 1.2, "agriculture": 1.2, "export": 1.2, "technology": 1.1,
+}
+
+LUCENE_SPECIAL = re.compile(r'([+\-!(){}\[\]^"~*?:\\/]|&&|\|\|)')
+
+
+def tokenize(text: str) -> List[str]:
+    return re.findall(r"[a-z0-9]+", (text or "").lower())
+
+
+def _lucene_term(term: str, weight: float) -> str:
+    term = LUCENE_SPECIAL.sub(r"\\\1", term)
+    clause = f"{term}~1" if len(term) >= FUZZY_MIN_LENGTH and not term.isdigit() else term
+    return f"{clause}^{weight:.2f}" if abs(weight - 1.0) > 0.01 else clause
+
+
+def weighted_terms(description: str, max_terms: int = FULLTEXT_MAX_TERMS) -> List[tuple]:
+    """(term, weight) pairs, strongest first, synonyms included, capped at max_terms."""
+    tokens = [t for t in tokenize(description) if t not in STOPWORDS and len(t) > 1]
+    if not tokens:
+        return []
+    counts = Counter(tokens)
+    first_seen = {t: i for i, t in reversed(list(enumerate(tokens)))}
+
+    weights: Dict[str, float] = {}
+    for term, count in counts.items():
+        weights[term] = max(weights.get(term, 0.0), (1.0 + 0.5 * (count - 1)) * DOMAIN_BOOST.get(term, 1.0))
+    for term in list(weights):
+        for synonym in SYNONYMS.get(term, []):
+            weights.setdefault(synonym, weights[term] * SYNONYM_WEIGHT)
+
+    ranked = sorted(weights.items(), key=lambda kv: (-kv[1], first_seen.get(kv[0], len(tokens))))
+    return ranked[:max_terms]
+
+
+def build_fulltext_query(description: str, max_terms: int = FULLTEXT_MAX_TERMS) -> str:
+    """Bounded, weighted OR query; falls back to a generic term when nothing is left."""
+    terms = weighted_terms(description, max_terms)
+    if not terms:
+        return "generic~"
+    top = terms[0][1]
+    return " OR ".join(_lucene_term(term, weight / top * 2.0) for term, weight in terms)
+
+
+def legacy_fulltext_query(description: str) -> str:
+    """The previous builder (every word, fuzzy, ORed). Kept for benchmarking."""
+    words = re.sub(r'[^a-zA-Z0-9\s]', ' ', description).split()
+    if not words:
+        return "generic~"
+    return " OR ".join([f"{w}~" for w in words])
@@ -0,0 +1,225 @@
+# filename: grant_gc.py
+"""
+Cross-store consistency and garbage collection for grants.
+
+A grant lives in three places: the Grant node (+ satellite nodes) in Neo4j, its
+chunks in Chroma and its PDF (+ parsed-text cache) on disk. Deleting only the
+node leaves the rest behind, and every re-ingestion adds another copy.
+
+- purge_grant(): removes ONE grant from every store.
+- sweep(): periodic pass that
+    1. purges superseded grants (older Grant nodes for the same file),
+    2. deletes chunks whose grant no longer exists and duplicate chunks,
+    3. prunes satellite nodes (Vertical, Criterion, Region, ...) no grant points to,
+    4. removes PDFs / parsed caches no grant references (after a grace period),
+  and reports reclaimed bytes and index sizes.
+"""
+import os
+import time
+import hashlib
+from typing import Callable, Dict, List, Optional, Set
+
+GC_INTERVAL_SECONDS = int(os.getenv("GC_INTERVAL_SECONDS", str(6 * 3600)))
+GC_FILE_GRACE_DAYS = float(os.getenv("GC_FILE_GRACE_DAYS", "30"))  # Unreferenced files younger than this are kept
+GC_SCAN_BATCH = 5000
+
+SATELLITE_LABELS = ("Vertical", "Technology", "Size", "Criterion", "Region", "Country")
+
+
+def _dir_size(path: str) -> int:
+    total = 0
+    for dirpath, _, filenames in os.walk(path):
+        for name in filenames:
+            try:
+                total += os.path.getsize(os.path.join(dirpath, name))
+            except OSError:
+                pass
+    return total
+
+
+class GrantGarbageCollector:
+    def __init__(self, driver, vectorstore_fn: Callable, scrape_dir: str, parsed_cache_dir: str,
+                 chroma_dir: str, on_chunks_deleted: Optional[Callable[[str], None]] = None,
+                 on_grant_purged: Optional[Callable[[str], None]] = None):
+        self.driver = driver
+        self.vectorstore_fn = vectorstore_fn
+        self.scrape_dir = scrape_dir
+        self.parsed_cache_dir = parsed_cache_dir
+        self.chroma_dir = chroma_dir
+        self.on_chunks_deleted = on_chunks_deleted
+        self.on_grant_purged = on_grant_purged
+        self.last_report: Optional[Dict] = None
+
+    # ---------------- Helpers ----------------
+    def _referenced_filenames(self) -> Set[str]:
+        with self.driver.session() as session:
+            result = session.run("MATCH (g:Grant) WHERE g.filename IS NOT NULL RETURN DISTINCT g.filename AS f")
+            return {r["f"] for r in result}
+
+    def _remove_file(self, path: str) -> int:
+        if not os.path.isfile(path):
+            return 0
+        size = os.path.getsize(path)
+        os.remove(path)
+        return size
+
+    def _remove_document_files(self, filename: str) -> int:
+        return (self._remove_file(os.path.join(self.scrape_dir, filename))
+                + self._remove_file(os.path.join(self.parsed_cache_dir, f"{filename}.json")))
+
+    def _delete_chunks(self, grant_id: str):
+        self.vectorstore_fn().delete(where={"grant_id": grant_id})
+        if self.on_chunks_deleted:
+            self.on_chunks_deleted(grant_id)
+
+    def prune_orphan_nodes(self) -> int:
+        """Deletes satellite nodes without any relationship left."""
+        query = """
+        MATCH (n) WHERE any(l IN labels(n) WHERE l IN $labels) AND NOT (n)--()
+        DELETE n
+        RETURN count(n) AS deleted
+        """
+        with self.driver.session() as session:
+            return session.run(query, labels=list(SATELLITE_LABELS)).single()["deleted"]
+
+    # ---------------- Single grant ----------------
+    def purge_grant(self, grant_id: str, delete_files: bool = True) -> Dict:
+        """Removes a grant from Neo4j, Chroma and (if no other grant uses it) disk."""
+        with self.driver.session() as session:
+            # Catalogue facet counters are decremented in the same transaction
+            record = session.run("""
+                MATCH (g:Grant {id: $id})
+                FOREACH (k IN coalesce(g.facet_keys, []) | MERGE (f:Facet {key: k}) SET f.count = coalesce(f.count, 0) - 1)
+                WITH g, g.filename AS filename
+                DETACH DELETE g
+                RETURN filename
+                """, id=grant_id).single()
+        filename = record["filename"] if record else None
+
+        self._delete_chunks(grant_id)
+        if self.on_grant_purged:
+            self.on_grant_purged(grant_id)
+        orphans = self.prune_orphan_nodes()
+
+        bytes_reclaimed = 0
+        if delete_files and filename and filename not in self._referenced_filenames():
+            bytes_reclaimed = self._remove_document_files(filename)
+
+        print(f"🗑️ GC: Purged {grant_id} ({filename}) -> {orphans} orphan nodes, {bytes_reclaimed} bytes of files.")
+        return {"grant_id": grant_id, "filename": filename, "orphan_nodes": orphans, "bytes_reclaimed": bytes_reclaimed}
+
+    # ---------------- Sweep ----------------
+    def _superseded_grants(self) -> List[str]:
+        """Every Grant node for a file except the most recently ingested one."""
+        query = """
+        MATCH (g:Grant) WHERE g.filename IS NOT NULL
+        WITH g.filename AS filename, g ORDER BY coalesce(g.ingested_at, 0) DESC
+        WITH filename, collect(g.id) AS ids
+        WHERE size(ids) > 1
+        RETURN ids[1..] AS stale
+        """
+        with self.driver.session() as session:
+            return [gid for r in session.run(query) for gid in r["stale"]]
+
+    def _compact_chunks(self, live_grants: Set[str]) -> Dict:
+        """Deletes chunks of grants that no longer exist and exact duplicate chunks."""
+        vectorstore = self.vectorstore_fn()
+        orphan_ids, duplicate_ids, dead_grants = [], [], set()
+        seen, total, offset = set(), 0, 0
+        while True:
+            batch = vectorstore.get(include=["metadatas", "documents"], limit=GC_SCAN_BATCH, offset=offset)
+            ids = batch.get("ids") or []
+            if not ids:
+                break
+            for chunk_id, meta, text in zip(ids, batch["metadatas"], batch["documents"]):
+                total += 1
+                meta = meta or {}
+                grant_id = meta.get("grant_id")
+                if grant_id and grant_id not in live_grants:
+                    orphan_ids.append(chunk_id)
+                    dead_grants.add(grant_id)
+                    continue
+                # Chunks uploaded via /ingest have no grant_id; dedupe them per file
+                owner = grant_id or meta.get("filename") or meta.get("source")
+                key = (owner, meta.get("page"), meta.get("start_index"), hashlib.sha1((text or "").encode()).hexdigest())
+                if key in seen:
+                    duplicate_ids.append(chunk_id)
+                else:
+                    seen.add(key)
+            offset += len(ids)
+
+        to_delete = orphan_ids + duplicate_ids
+        for i in range(0, len(to_delete), GC_SCAN_BATCH):
+            vectorstore.delete(ids=to_delete[i:i + GC_SCAN_BATCH])
+        if self.on_chunks_deleted:
+            for grant_id in dead_grants:
+                self.on_chunks_deleted(grant_id)
+        return {
+            "chunks_scanned": total,
+            "orphan_chunks_deleted": len(orphan_ids),
+            "duplicate_chunks_deleted": len(duplicate_ids),
+            "chunks_remaining": total - len(to_delete),
+        }
+
+    def _sweep_files(self) -> Dict:
+        referenced = self._referenced_filenames()
+        cutoff = time.time() - GC_FILE_GRACE_DAYS * 86400
+        removed, reclaimed = 0, 0
+        for directory, suffix in ((self.scrape_dir, ""), (self.parsed_cache_dir, ".json")):
+            if not os.path.isdir(directory):
+                continue
+            for name in os.listdir(directory):
+                path = os.path.join(directory, name)
+                filename = name[:-len(suffix)] if suffix and name.endswith(suffix) else name
+                if not os.path.isfile(path) or filename in referenced or os.path.getmtime(path) > cutoff:
+                    continue
+                reclaimed += self._remove_file(path)
+                removed += 1
+        return {"files_removed": removed, "file_bytes_reclaimed": reclaimed}
+
+    def _index_sizes(self) -> Dict:
+        with self.driver.session() as session:
+            grants = session.run("MATCH (g:Grant) RETURN count(g) AS c").single()["c"]
+            satellites = session.run(
+                "MATCH (n) WHERE any(l IN labels(n) WHERE l IN $labels) RETURN count(n) AS c",
+                labels=list(SATELLITE_LABELS),
+            ).single()["c"]
+        return {
+            "grants": grants,
+            "satellite_nodes": satellites,
+            "chroma_bytes": _dir_size(self.chroma_dir),
+            "scrape_dir_bytes": _dir_size(self.scrape_dir),
+            "parsed_cache_bytes": _dir_size(self.parsed_cache_dir),
+        }
+
+    def sweep(self) -> Dict:
+        start = time.perf_counter()
+        before = self._index_sizes()
+
+        superseded = self._superseded_grants()
+        for grant_id in superseded:
+            self.purge_grant(grant_id, delete_files=False)  # The newest grant still uses the file
+
+        with self.driver.session() as session:
+            live_grants = {r["id"] for r in session.run("MATCH (g:Grant) RETURN g.id AS id")}
+        chunks = self._compact_chunks(live_grants)
+        orphan_nodes = self.prune_orphan_nodes()
+        files = self._sweep_files()
+
+        after = self._index_sizes()
+        report = {
+            "superseded_grants_purged": len(superseded),
+            "orphan_nodes_deleted": orphan_nodes,
+            **chunks,
+            **files,
+            "bytes_reclaimed": sum(max(0, before[k] - after[k]) for k in ("chroma_bytes", "scrape_dir_bytes", "parsed_cache_bytes")),
+            "before": before,
+            "after": after,
+            "seconds": round(time.perf_counter() - start, 2),
+            "finished_at": time.time(),
+        }
+        self.last_report = report
+        print(f"🧹 GC: Sweep done -> {len(superseded)} superseded grants, "
+              f"{chunks['orphan_chunks_deleted'] + chunks['duplicate_chunks_deleted']} chunks, "
+              f"{orphan_nodes} nodes, {files['files_removed']} files ({report['bytes_reclaimed']} bytes reclaimed).")
+        return report
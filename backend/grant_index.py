@@ -0,0 +1,113 @@
+# filename: grant_index.py
+"""
+Grant-partitioned retrieval on top of the shared Chroma collection.
+
+Filtered k-NN over the global HNSW graph gets slower and less accurate as the
+corpus grows. Every grant only has a few dozen to a few hundred chunks, so here:
+
+1. A grant's chunks are fetched by direct metadata lookup (`where grant_id = ...`),
+   not by an ANN search.
+2. Their embeddings are held as a normalised matrix (per-grant partition, LRU cached).
+3. Queries are answered with an EXACT brute-force cosine scan of that partition.
+
+Cost depends on the size of the grant, not on the size of the corpus.
+"""
+import os
+import time
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+GRANT_INDEX_MAX_PARTITIONS = int(os.getenv("GRANT_INDEX_MAX_PARTITIONS", "256"))
+
+
+class _Partition:
+    def __init__(self, docs: List[Document], embeddings: np.ndarray):
+        self.docs = docs
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        self.matrix = embeddings / np.where(norms == 0, 1.0, norms)
+
+
+class GrantIndex:
+    def __init__(self, vectorstore_fn: Callable, max_partitions: int = GRANT_INDEX_MAX_PARTITIONS):
+        self.vectorstore_fn = vectorstore_fn
+        self.max_partitions = max_partitions
+        self._partitions: "OrderedDict[str, _Partition]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"lookups": 0, "partition_hits": 0, "partition_loads": 0, "searches": 0, "total_search_seconds": 0.0}
+
+    # ---------------- Partitions ----------------
+    def _load(self, grant_id: str) -> Optional[_Partition]:
+        with self._lock:
+            self.stats["lookups"] += 1
+            if grant_id in self._partitions:
+                self._partitions.move_to_end(grant_id)
+                self.stats["partition_hits"] += 1
+                return self._partitions[grant_id]
+
+        # Direct ID lookup (metadata filter only, no vector search)
+        data = self.vectorstore_fn().get(where={"grant_id": grant_id}, include=["documents", "metadatas", "embeddings"])
+        ids = data.get("ids") or []
+        if not ids:
+            return None
+
+        docs = [Document(page_content=text, metadata=meta or {}) for text, meta in zip(data["documents"], data["metadatas"])]
+        # Keep the chunks in document order (page, then position on the page)
+        order = sorted(range(len(docs)), key=lambda i: (docs[i].metadata.get("page", 0), docs[i].metadata.get("start_index", 0)))
+        docs = [docs[i] for i in order]
+        embeddings = np.asarray(data["embeddings"], dtype=np.float32)[order]
+        partition = _Partition(docs, embeddings)
+
+        with self._lock:
+            self.stats["partition_loads"] += 1
+            self._partitions[grant_id] = partition
+            self._partitions.move_to_end(grant_id)
+            while len(self._partitions) > self.max_partitions:
+                self._partitions.popitem(last=False)
+        return partition
+
+    def invalidate(self, grant_id: str):
+        """Drops the cached partition (call after the grant's chunks change)."""
+        with self._lock:
+            self._partitions.pop(grant_id, None)
+
+    # ---------------- Queries ----------------
+    def get_chunks(self, grant_id: str) -> List[Document]:
+        """All chunks of a grant in document order."""
+        partition = self._load(grant_id)
+        return list(partition.docs) if partition else []
+
+    def search(self, grant_id: str, query: str, k: int = 20) -> List[Tuple[Document, float]]:
+        """Exact top-k cosine search restricted to one grant. Returns (Document, score) pairs."""
+        partition = self._load(grant_id)
+        if partition is None:
+            return []
+
+        start = time.perf_counter()
+        q = np.asarray(self.vectorstore_fn().embeddings.embed_query(query), dtype=np.float32)
+        q /= np.linalg.norm(q) or 1.0
+        scores = partition.matrix @ q
+
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+
+        self.stats["searches"] += 1
+        self.stats["total_search_seconds"] += time.perf_counter() - start
+        return [(partition.docs[i], float(scores[i])) for i in top]
+
+    def get_stats(self) -> Dict:
+        searches = self.stats["searches"] or 1
+        with self._lock:
+            cached_chunks = sum(len(p.docs) for p in self._partitions.values())
+            cached = len(self._partitions)
+        return {
+            **self.stats,
+            "cached_partitions": cached,
+            "cached_chunks": cached_chunks,
+            "max_partitions": self.max_partitions,
+            "avg_search_seconds": round(self.stats["total_search_seconds"] / searches, 4),
+        }
@@ -0,0 +1,120 @@
+# filename: ingest_outbox.py
+"""
+Ingestion outbox for extract_and_store.
+
+Every document gets one row keyed by a stable document key (hash of its parsed
+text). The row records the grant ID, the prompt version, the validated extraction
+and the last completed stage:
+
+    pending -> extracted -> graph -> notified -> committed     (or: rejected)
+
+Each stage is an idempotent upsert keyed by the grant ID, so a retry resumes at
+the first incomplete stage and never re-calls the LLM for an extraction that
+already succeeded.
+"""
+import os
+import json
+import time
+import sqlite3
+import threading
+from typing import Dict, List, Optional
+
+STAGES = ("pending", "extracted", "graph", "notified", "committed")
+TERMINAL_STAGES = ("committed", "rejected")
+
+
+class IngestOutbox:
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._conn:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS outbox (
+                    doc_key TEXT PRIMARY KEY,
+                    file_path TEXT,
+                    grant_id TEXT,
+                    prompt_version INTEGER,
+                    stage TEXT NOT NULL,
+                    extraction TEXT,
+                    error TEXT,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    updated_at REAL
+                )
+            """)
+            self._conn.execute("CREATE INDEX IF NOT EXISTS outbox_stage ON outbox(stage)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS outbox_grant ON outbox(grant_id)")
+
+    @staticmethod
+    def reached(entry: Optional[Dict], stage: str) -> bool:
+        """True if the entry already completed `stage`."""
+        if not entry or entry["stage"] not in STAGES:
+            return False
+        return STAGES.index(entry["stage"]) >= STAGES.index(stage)
+
+    def get(self, doc_key: str) -> Optional[Dict]:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM outbox WHERE doc_key = ?", (doc_key,)).fetchone()
+        if row is None:
+            return None
+        entry = dict(row)
+        entry["extraction"] = json.loads(entry["extraction"]) if entry["extraction"] else None
+        return entry
+
+    def record(self, doc_key: str, stage: str, **fields):
+        """Upserts the entry and marks `stage` as completed (clears the last error)."""
+        if "extraction" in fields and fields["extraction"] is not None:
+            fields["extraction"] = json.dumps(fields["extraction"])
+        fields.update(stage=stage, error=None, updated_at=time.time())
+        columns = ["doc_key"] + list(fields)
+        placeholders = ", ".join("?" for _ in columns)
+        updates = ", ".join(f"{c} = excluded.{c}" for c in fields)
+        with self._lock, self._conn:
+            self._conn.execute(
+                f"INSERT INTO outbox ({', '.join(columns)}) VALUES ({placeholders}) "
+                f"ON CONFLICT(doc_key) DO UPDATE SET {updates}",
+                [doc_key] + list(fields.values()),
+            )
+
+    def fail(self, doc_key: str, error: str, **fields):
+        """
+        Keeps the last completed stage, stores the error and counts the attempt.
+        A failure under a different prompt version restarts the entry at 'pending':
+        stages completed under the old rules (even 'committed' / 'rejected') no longer count.
+        """
+        entry = self.get(doc_key)
+        stage = entry["stage"] if entry else "pending"
+        new_version = bool(entry) and "prompt_version" in fields and fields["prompt_version"] != entry["prompt_version"]
+        if new_version:
+            stage = "pending"
+            fields["extraction"] = None
+        self.record(doc_key, stage, **fields)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE outbox SET error = ?, attempts = ? WHERE doc_key = ?",
+                (error[:500], 1 if new_version or not entry else entry["attempts"] + 1, doc_key),
+            )
+
+    def forget_grant(self, grant_id: str):
+        """Drops the entries of a purged grant so the document can be ingested again."""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM outbox WHERE grant_id = ?", (grant_id,))
+
+    def incomplete(self, max_attempts: int) -> List[Dict]:
+        """Entries that stopped before a terminal stage and still have retries left."""
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT doc_key, file_path, grant_id, stage, attempts, error FROM outbox "
+                f"WHERE stage NOT IN ({', '.join('?' for _ in TERMINAL_STAGES)}) AND attempts < ? "
+                f"ORDER BY updated_at",
+                list(TERMINAL_STAGES) + [max_attempts],
+            ).fetchall()
+        return [dict(r) for r in rows]
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            rows = self._conn.execute("SELECT stage, count(*) AS n FROM outbox GROUP BY stage").fetchall()
+            failing = self._conn.execute("SELECT count(*) FROM outbox WHERE error IS NOT NULL").fetchone()[0]
+        return {"by_stage": {r["stage"]: r["n"] for r in rows}, "with_errors": failing,
+                "db_bytes": os.path.getsize(self.path) if os.path.exists(self.path) else 0}
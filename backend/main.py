@@ -1,29 +1,33 @@
 import os
+import io
 import json
 import shutil
+import zipfile
+import tarfile
 import httpx
 import requests
 import random
 import re
 import uuid
+import hashlib
+import base64
 import time
+import threading
+import asyncio
 import smtplib # NEW
 from urllib.parse import urljoin
-from typing import List, Optional, Annotated, Literal, Dict
+from typing import List, Optional, Annotated, Literal, Dict, Tuple, Callable, Set
 from typing_extensions import TypedDict
 from contextlib import asynccontextmanager
-import subprocess
 from pydantic import ValidationError
 
 from dotenv import load_dotenv
 from bs4 import BeautifulSoup
-
-# Scrapy Imports
-import scrapy
-from scrapy.crawler import CrawlerProcess
+import pandas as pd
 
 # FastAPI & Pydantic
-from fastapi import FastAPI, HTTPException, UploadFile, File, BackgroundTasks
+from fastapi import FastAPI, HTTPException, UploadFile, File, Form, BackgroundTasks
+from fastapi.responses import StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel, Field, field_validator
 
@@ -33,8 +37,9 @@ from neo4j import GraphDatabase
 # LangChain Imports
 from langchain_openai import ChatOpenAI, OpenAIEmbeddings
 from langchain_core.tools import tool
-from langchain_core.messages import SystemMessage, HumanMessage, BaseMessage
-from langchain_mcp_adapters.client import MultiServerMCPClient
+from langchain_core.messages import SystemMessage, HumanMessage, BaseMessage, ToolMessage, RemoveMessage
+from langchain_core.documents import Document
+from langchain_core.utils.json import parse_partial_json
 from langchain_community.document_loaders import PyPDFLoader
 from langchain_chroma import Chroma
 from langchain_text_splitters import RecursiveCharacterTextSplitter
@@ -43,12 +48,26 @@ from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langgraph.graph import StateGraph, START, END
 from langgraph.graph.message import add_messages
 from langgraph.prebuilt import ToolNode, tools_condition
-from langgraph.checkpoint.memory import MemorySaver
+from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
 from fastapi.staticfiles import StaticFiles
 
 # LangSmith Imports
 from langsmith import traceable
 
+# Local Modules
+from ocr_fallback import ocr_textless_pages, shutdown_ocr_pool
+from mcp_session_manager import MCPSessionManager
+from context_packing import pack_context
+from grant_index import GrantIndex
+from grant_gc import GrantGarbageCollector, GC_INTERVAL_SECONDS
+from ingest_outbox import IngestOutbox
+from currency_parser import parse_inr_amount
+from fulltext_query import build_fulltext_query
+from crawl_frontier import PDF_KEYWORDS
+from crawl_policy import CrawlPolicy, load_published_stats
+from crawl_engine import profile_for_url, stream_crawl
+from regions import PAN_INDIA, resolve_region, resolve_regions, resolve_sme_state, state_for_city, hierarchy_rows
+
 load_dotenv()
 
 
@@ -60,8 +79,31 @@ NEO4J_USER = "neo4j"
 NEO4J_PASSWORD = "KushalKuldipSuhas"
 DB_DIR = "./chroma_db"
 SCRAPE_DIR = "scraped_docs"
-CRAWL_OUTPUT_FILE = "crawler_results.json"
-PROMPT_FILE = "extraction_rules.txt"
+CRAWL_DOWNLOAD_CONCURRENCY = int(os.getenv("CRAWL_DOWNLOAD_CONCURRENCY", "4"))  # PDF downloads while a crawl streams
+SCRAPE_CONCURRENCY = int(os.getenv("SCRAPE_CONCURRENCY", "4"))  # Listing pages scraped in parallel per /scrape job
+JOB_EVENT_INTERVAL = 0.5  # Seconds between job checks in /jobs/{job_id}/events
+PROMPT_FILE = "extraction_rules.txt"  # Legacy single-file prompt, imported as v1 of the registry
+PROMPT_DIR = "prompt_versions"
+PARSED_CACHE_DIR = "parsed_cache"
+EVAL_CORPUS_FILE = "eval_corpus.jsonl"
+EXTRACTION_MODE = os.getenv("EXTRACTION_MODE", "structured")  # 'structured' | 'legacy'
+MAX_REPAIR_ATTEMPTS = int(os.getenv("MAX_REPAIR_ATTEMPTS", "2"))
+CHECKPOINT_DB = "chat_checkpoints.sqlite"
+CHAT_MAX_MESSAGES = int(os.getenv("CHAT_MAX_MESSAGES", "24"))       # Summarise once history exceeds this
+CHAT_KEEP_MESSAGES = int(os.getenv("CHAT_KEEP_MESSAGES", "8"))       # Recent messages kept verbatim
+CHAT_KEEP_CHECKPOINTS = int(os.getenv("CHAT_KEEP_CHECKPOINTS", "5")) # Checkpoints retained per thread
+CHAT_REQUIRE_APPROVAL = os.getenv("CHAT_REQUIRE_APPROVAL", "true").lower() == "true"
+FEEDBACK_WINDOW_SECONDS = int(os.getenv("FEEDBACK_WINDOW_SECONDS", "300"))
+FEEDBACK_MAX_BATCH = int(os.getenv("FEEDBACK_MAX_BATCH", "20"))
+EVAL_CONCURRENCY = int(os.getenv("EVAL_CONCURRENCY", "8"))
+INGEST_DIR = "ingest_uploads"
+INGEST_MAX_FILE_MB = int(os.getenv("INGEST_MAX_FILE_MB", "100"))
+INGEST_CONCURRENCY = int(os.getenv("INGEST_CONCURRENCY", "4"))
+INGEST_OUTBOX_DB = "ingest_outbox.sqlite"
+INGEST_MAX_ATTEMPTS = int(os.getenv("INGEST_MAX_ATTEMPTS", "5"))  # Automatic resumes per document
+GRANTS_PAGE_MAX = 100  # Largest page served by /grants
+MATCH_MAX_OVERSIZE = float(os.getenv("MATCH_MAX_OVERSIZE", "1000"))  # Drop schemes capped > N x the project value
+GRANT_QA_FETCH_K = int(os.getenv("GRANT_QA_FETCH_K", "20"))  # Candidates before packing into GRANT_QA_TOKEN_BUDGET
 
 
 
@@ -113,103 +155,108 @@ Output Format
     """
 
 
-def get_current_prompt():
-    """Loads the latest self-learned prompt or returns default."""
-    if os.path.exists(PROMPT_FILE):
-        with open(PROMPT_FILE, "r") as f:
-            return f.read()
-    return DEFAULT_PROMPT
-
-def update_prompt(new_prompt_text):
-    """Saves the optimized prompt."""
-    with open(PROMPT_FILE, "w") as f:
-        f.write(new_prompt_text)
-
-
-# =========================================================
-# 2️⃣ SCRAPY SPIDER DEFINITION
-# =========================================================
-class IredaCrawlerSpider(scrapy.Spider):
+class PromptRegistry:
     """
-    A Scrapy Spider designed to crawl a scheme page and its linked pages (BFS).
+    Versioned store for the extraction prompt.
+    Every revision is kept on disk (prompt_versions/v{n}.txt) and the active one is
+    cached in memory; the cache is invalidated when the manifest changes.
     """
-    name = 'ireda_crawler'
-    # Custom settings defined inside the class for encapsulation
-    custom_settings = {
-        'DEPTH_PRIORITY': 1,
-        'SCHEDULER_DISK_QUEUE': 'scrapy.squeues.PickleFifoDiskQueue',
-        'SCHEDULER_MEMORY_QUEUE': 'scrapy.squeues.FifoMemoryQueue',
-        'DEPTH_LIMIT': 1, # Crawl depth (Start page + 1 click deep)
-        'CLOSESPIDER_PAGECOUNT': 10, # Limit total pages to prevent infinite crawling
-        'LOG_LEVEL': 'INFO',
-        'REQUEST_FINGERPRINTER_IMPLEMENTATION': '2.7',
-        'DOWNLOAD_HANDLERS': {
-            'https': 'scrapy.core.downloader.handlers.http.HTTPDownloadHandler',
-        },
-    }
+    def __init__(self, directory: str, default_prompt: str, legacy_file: Optional[str] = None):
+        self.directory = directory
+        self.manifest_path = os.path.join(directory, "manifest.json")
+        self._lock = threading.Lock()
+        self._cache: Optional[Tuple[int, str]] = None
+        self._manifest_mtime = None
+
+        os.makedirs(directory, exist_ok=True)
+        if not os.path.exists(self.manifest_path):
+            seed = default_prompt
+            if legacy_file and os.path.exists(legacy_file):
+                with open(legacy_file, "r") as f:
+                    seed = f.read()
+            self._write_text(self._version_path(1), seed)
+            self._write_manifest({"active": 1, "versions": [
+                {"version": 1, "created_at": time.time(), "note": "initial"}
+            ]})
+
+    def _version_path(self, version: int) -> str:
+        return os.path.join(self.directory, f"v{version}.txt")
+
+    @staticmethod
+    def _write_text(path: str, text: str):
+        # Write-then-rename so readers never see a half-written prompt
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+
+    def _write_manifest(self, manifest: dict):
+        self._write_text(self.manifest_path, json.dumps(manifest, indent=2))
+
+    def _read_manifest(self) -> dict:
+        with open(self.manifest_path, "r") as f:
+            return json.load(f)
+
+    def active(self) -> Tuple[int, str]:
+        """Returns (version, prompt_text) of the active prompt, served from memory."""
+        mtime = os.stat(self.manifest_path).st_mtime_ns
+        if self._cache is None or mtime != self._manifest_mtime:
+            with self._lock:
+                manifest = self._read_manifest()
+                version = manifest["active"]
+                with open(self._version_path(version), "r") as f:
+                    self._cache = (version, f.read())
+                self._manifest_mtime = mtime
+        return self._cache
+
+    @property
+    def active_version(self) -> int:
+        return self.active()[0]
+
+    def get(self, version: int) -> str:
+        with open(self._version_path(version), "r") as f:
+            return f.read()
 
-    def __init__(self, start_url=None, *args, **kwargs):
-        super(IredaCrawlerSpider, self).__init__(*args, **kwargs)
-        self.start_urls = [start_url] if start_url else []
-        self.pdf_xpath = '//a[contains(@href, ".pdf")] | //*[contains(@onclick, "open_doc")]'
-        self.url_pattern_onclick = re.compile(r"open_doc\('([^']+)'\)")
-
-    def parse(self, response):
-        # 1. Extract PDFs
-        pdf_elements = response.xpath(self.pdf_xpath)
-        for element in pdf_elements:
-            pdf_url = None
-            
-            # Check JS links
-            onclick_content = element.xpath('@onclick').get()
-            if onclick_content:
-                match = self.url_pattern_onclick.search(onclick_content)
-                if match:
-                    pdf_url = response.urljoin(match.group(1))
-
-            # Check standard links
-            if not pdf_url:
-                href_content = element.xpath('@href').get()
-                if href_content and href_content.lower().endswith('.pdf'):
-                    pdf_url = response.urljoin(href_content)
-
-            if pdf_url:
-                yield {
-                    'source_url': response.url,
-                    'pdf_link': pdf_url
-                }
+    def list_versions(self) -> dict:
+        return self._read_manifest()
+
+    def publish(self, text: str, note: str = "", activate: bool = True) -> int:
+        """Stores a new prompt revision and (optionally) makes it active."""
+        with self._lock:
+            manifest = self._read_manifest()
+            version = max(v["version"] for v in manifest["versions"]) + 1
+            self._write_text(self._version_path(version), text)
+            manifest["versions"].append({"version": version, "created_at": time.time(), "note": note})
+            if activate:
+                manifest["active"] = version
+            self._write_manifest(manifest)
+            if activate:
+                self._cache = (version, text)
+                self._manifest_mtime = os.stat(self.manifest_path).st_mtime_ns
+        return version
+
+    def activate(self, version: int):
+        """Switches the active prompt (e.g. rollback)."""
+        with self._lock:
+            manifest = self._read_manifest()
+            if not any(v["version"] == version for v in manifest["versions"]):
+                raise KeyError(f"Unknown prompt version {version}")
+            manifest["active"] = version
+            self._write_manifest(manifest)
+            self._cache = None
+
+
+prompt_registry = PromptRegistry(PROMPT_DIR, DEFAULT_PROMPT, legacy_file=PROMPT_FILE)
 
-        # 2. Follow Links (BFS)
-        # Only follow internal links to avoid crawling the whole internet
-        all_links = response.xpath('//a/@href').getall()
-        for href in all_links:
-            full_url = response.urljoin(href)
-            # Basic domain restriction logic
-            if response.url.split('/')[2] in full_url: 
-                yield response.follow(full_url, callback=self.parse)
+def get_current_prompt():
+    """Loads the latest self-learned prompt (cached) or returns default."""
+    return prompt_registry.active()[1]
+
+def update_prompt(new_prompt_text, note: str = ""):
+    """Saves the optimized prompt as a new active version. Returns the version number."""
+    return prompt_registry.publish(new_prompt_text, note=note)
 
-# =========================================================
-# 3️⃣ CRAWLER PROCESS WRAPPER
-# =========================================================
-def run_crawler_process(start_url: str, output_file: str):
-    """
-    Isolated function to run Scrapy in a separate process.
-    """
-    # Remove old results
-    if os.path.exists(output_file):
-        os.remove(output_file)
-
-    settings = {
-        'FEED_FORMAT': 'json',
-        'FEED_URI': output_file,
-        'USER_AGENT': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-    }
-    
-    process = CrawlerProcess(settings)
-    process.crawl(IredaCrawlerSpider, start_url=start_url)
-    process.start() # Blocks here until crawling finishes
 
-    
 # =========================================================
 # 1️⃣ BYPASS SSL ERRORS GLOBALLY
 # =========================================================
@@ -251,6 +298,7 @@ class GrantSchema(BaseModel):
     """Structured extraction schema for Government Grants."""
     id: Optional[str] = Field(description="Unique Identifier for the grant", default=None)
     filename: Optional[str] = Field(description="Name of the source PDF file", default=None)    
+    prompt_version: Optional[int] = Field(description="Version of the extraction prompt that produced this grant", default=None)
     name: str = Field(description="Official name of the grant or scheme")
     description: str = Field(description="Brief summary.", default="No description provided.")
     funding_type: str = Field(description="Type of funding: 'Subsidy', 'Loan', 'Grant', or 'Equity'")
@@ -276,6 +324,8 @@ class GrantSchema(BaseModel):
         return v
 
 
+PROJECT_VALUE_UNITS = {"INR": 1.0, "Lakh": 1e5, "Crore": 1e7}
+
 class SMEProfile(BaseModel):
     """SME profile with validation"""
     email: Optional[str] = Field(default=None, description="Email for notifications") # NEW FIELD
@@ -285,8 +335,14 @@ class SMEProfile(BaseModel):
     financial_performance: str 
     location_state: str 
     project_value: float 
+    project_value_unit: Literal['INR', 'Lakh', 'Crore'] = Field(default='INR', description="Unit of project_value")
     project_need_description: str = Field(description="User's description of what they need money for")
 
+    @property
+    def project_value_inr(self) -> float:
+        """Project value in rupees (budget fields on grants are stored in INR)."""
+        return (self.project_value or 0.0) * PROJECT_VALUE_UNITS[self.project_value_unit]
+
 # --- NEW: Feedback Schema ---
 class ErrorReport(BaseModel):
     grant_id: str
@@ -296,6 +352,60 @@ class ErrorReport(BaseModel):
 # =========================================================
 # 3️⃣ NEO4J HANDLER (Refactored for Direct JSON Injection)
 # =========================================================
+# --- Match features (derived once at ingest, read by every match query) ---
+MATCH_FEATURES_VERSION = 4  # v2: numeric budget fields, v3: canonical regions, v4: searchable criteria/vertical text
+FACETS_VERSION = 1          # Bump when grant_facet_keys changes: counters are rebuilt on next start
+CANONICAL_SIZES = ("Micro", "Small", "Medium", "Large")
+UDYAM_MARKERS = ("udyam", "msme", "registration")
+SECTOR_STOPWORDS = {"and", "the", "for", "all", "other", "others", "sector", "sectors", "industry", "industries"}
+
+def sector_tokens(text: str) -> List[str]:
+    return sorted({t for t in re.findall(r"[a-z0-9]+", (text or "").lower()) if len(t) > 2 and t not in SECTOR_STOPWORDS})
+
+def derive_match_features(criteria: List[str], sizes: List[str], verticals: List[str], regions: List[str],
+                          max_value: Optional[str] = None, max_subsidy: Optional[str] = None,
+                          countries: Optional[List[str]] = None) -> Dict:
+    """Normalised, query-ready properties stored on the Grant node."""
+    value = parse_inr_amount(max_value)
+    subsidy = parse_inr_amount(max_subsidy)
+    geo_set, geo_unresolved = resolve_regions(regions)
+    criteria_text = " ".join(c.lower() for c in criteria if c)
+    size_text = " ".join(s for s in sizes if s).lower()
+    if re.search(r"\b(all|any)\b", size_text):
+        match_sizes = list(CANONICAL_SIZES)
+    else:
+        match_sizes = [s for s in CANONICAL_SIZES if s.lower() in size_text]
+        if "msme" in size_text:
+            match_sizes = sorted(set(match_sizes) | {"Micro", "Small", "Medium"}, key=CANONICAL_SIZES.index)
+    return {
+        "requires_udyam": any(m in criteria_text for m in UDYAM_MARKERS),
+        "match_sizes": match_sizes,
+        "sector_tokens": sorted({t for v in verticals if v for t in sector_tokens(v)}),
+        "all_sectors": any(v.strip().lower().startswith("all") for v in verticals if v),
+        # Canonical region keys (state keys or 'pan-india'); unresolved names never exclude a grant
+        "geo_set": geo_set,
+        "geo_unresolved": geo_unresolved,
+        "india_eligible": not countries or any("india" in (c or "").lower() for c in countries),
+        # Budget (INR); None when the text has no parsable amount
+        "max_value_inr": value["inr"],
+        "max_subsidy_inr": subsidy["inr"],
+        "subsidy_percent": subsidy["percent"] if subsidy["percent"] is not None else value["percent"],
+        "subsidy_per_watt_inr": subsidy["per_watt_inr"] if subsidy["per_watt_inr"] is not None else value["per_watt_inr"],
+        # Flattened text so the full-text index also covers criteria and verticals
+        "criteria_text": " ".join(c for c in criteria if c),
+        "verticals_text": " ".join(v for v in verticals if v),
+        "features_version": MATCH_FEATURES_VERSION,
+    }
+
+def grant_facet_keys(funding_type: Optional[str], verticals: List[str], features: Dict) -> List[str]:
+    """'dimension:value' keys a grant counts towards in the catalogue facets."""
+    keys = {f"funding_type:{funding_type.strip().title()}"} if funding_type and funding_type.strip() else set()
+    keys |= {f"vertical:{v.strip()}" for v in verticals if v and v.strip()}
+    keys |= {f"size:{s}" for s in features.get("match_sizes") or []}
+    keys |= {f"region:{r}" for r in (features.get("geo_set") or ["unrestricted"])}
+    return sorted(keys)
+
+
 class Neo4jHandler:
     def __init__(self, uri, user, password):
         self.driver = GraphDatabase.driver(uri, auth=(user, password))
@@ -305,16 +415,48 @@ class Neo4jHandler:
 
     def ensure_indexes(self):
         """Creates the Fulltext Index required for search."""
-        query = "CREATE FULLTEXT INDEX grant_keywords IF NOT EXISTS FOR (n:Grant) ON EACH [n.name, n.description]"
+        properties = ["name", "description", "criteria_text", "verticals_text"]
+        query = f"CREATE FULLTEXT INDEX grant_keywords IF NOT EXISTS FOR (n:Grant) ON EACH [{', '.join('n.' + p for p in properties)}]"
         with self.driver.session() as session:
             try:
+                # Older deployments indexed name + description only: rebuild with the new fields
+                existing = session.run(
+                    "SHOW INDEXES YIELD name, properties WHERE name = 'grant_keywords' RETURN properties"
+                ).single()
+                if existing and sorted(existing["properties"]) != sorted(properties):
+                    session.run("DROP INDEX grant_keywords")
+                    print("♻️ NEO4J: Rebuilding grant_keywords with criteria and vertical text.")
                 session.run(query)
                 # Create constraint for SME emails to avoid duplicates
                 session.run("CREATE CONSTRAINT sme_email_unique IF NOT EXISTS FOR (u:SME) REQUIRE u.email IS UNIQUE")
+                # Grant lookups by id (MERGE, GC, outbox) and the precomputed match filter
+                session.run("CREATE CONSTRAINT grant_id_unique IF NOT EXISTS FOR (g:Grant) REQUIRE g.id IS UNIQUE")
+                session.run("CREATE INDEX grant_requires_udyam IF NOT EXISTS FOR (g:Grant) ON (g.requires_udyam)")
+                # Range indexes for budget-aware matching
+                session.run("CREATE INDEX grant_max_value_inr IF NOT EXISTS FOR (g:Grant) ON (g.max_value_inr)")
+                session.run("CREATE INDEX grant_max_subsidy_inr IF NOT EXISTS FOR (g:Grant) ON (g.max_subsidy_inr)")
+                session.run("CREATE CONSTRAINT region_key_unique IF NOT EXISTS FOR (r:Region) REQUIRE r.key IS UNIQUE")
+                session.run("CREATE CONSTRAINT facet_key_unique IF NOT EXISTS FOR (f:Facet) REQUIRE f.key IS UNIQUE")
                 print("✅ NEO4J: Indexes and Constraints verified.")
             except Exception as e:
                 print(f"⚠️ NEO4J Index Error: {e}")
 
+    def ensure_region_hierarchy(self):
+        """Materialises State -[:PART_OF]-> Pan-India -[:PART_OF]-> India (idempotent)."""
+        query = """
+        MERGE (india:Country {name: 'India'})
+        MERGE (nation:Region {key: $pan_india})
+        SET nation.name = 'Pan-India', nation.level = 'national'
+        MERGE (nation)-[:PART_OF]->(india)
+        WITH nation
+        UNWIND $states AS s
+        MERGE (r:Region {key: s.key})
+        SET r.name = s.name, r.level = 'state'
+        MERGE (r)-[:PART_OF]->(nation)
+        """
+        with self.driver.session() as session:
+            session.run(query, pan_india=PAN_INDIA, states=hierarchy_rows())
+
     def save_sme_profile(self, sme: dict):
         """Stores or Updates an SME profile in the Graph for future alerts."""
         if not sme.get('email'): return 
@@ -377,7 +519,10 @@ class Neo4jHandler:
         grant.description = g.description,
         grant.funding_type = g.funding_type,
         grant.max_value = g.max_value,
-        grant.max_subsidy = g.max_subsidy
+        grant.max_subsidy = g.max_subsidy,
+        grant.prompt_version = g.prompt_version,
+        grant.ingested_at = timestamp(),
+        grant += $features
         
         // Verticals
         FOREACH (v IN g.verticals | 
@@ -406,8 +551,11 @@ class Neo4jHandler:
             ON CREATE SET c2.type = 'Must-Have 2'
             MERGE (grant)-[:REQUIRES_CRITERION {type: 'Must-Have 2'}]->(c2))
 
-        // Geography
-        FOREACH (r IN g.geo_filter | 
+        // Geography (canonical hierarchy nodes; unrecognised names kept as plain regions)
+        FOREACH (k IN $features.geo_set | 
+            MERGE (reg:Region {key: k}) 
+            MERGE (grant)-[:HAS_GEOGRAPHIC_FILTER]->(reg))
+        FOREACH (r IN $unresolved_regions | 
             MERGE (reg:Region {name: TRIM(r)}) 
             MERGE (grant)-[:HAS_GEOGRAPHIC_FILTER]->(reg))
             
@@ -417,11 +565,176 @@ class Neo4jHandler:
             MERGE (grant)-[:APPLICABLE_TO_COUNTRY]->(cntry))
         """
         
+        features = derive_match_features(
+            [grant_data.get('criterion_1'), grant_data.get('criterion_2')],
+            grant_data.get('size_eligibility', []),
+            grant_data.get('verticals', []),
+            grant_data.get('geo_filter', []),
+            grant_data.get('max_value'),
+            grant_data.get('max_subsidy'),
+            grant_data.get('country', []),
+        )
+        unresolved_regions = [r for r in grant_data.get('geo_filter', []) if r and not resolve_region(r)[1]]
+        facet_rows = [{
+            "id": grant_data['id'],
+            "keys": grant_facet_keys(grant_data.get('funding_type'), grant_data.get('verticals', []), features),
+        }]
+        # Grant and its facet counters commit together, so a failed ingest cannot skew the counts
         with self.driver.session() as session:
-            session.run(cypher_query, data=grant_data)
-            print(f"✅ NEO4J: Ingested '{grant_data['name']}' ({grant_data['filename']})")
+            with session.begin_transaction() as tx:
+                tx.run(cypher_query, data=grant_data, features=features, unresolved_regions=unresolved_regions)
+                self.update_facets(facet_rows, tx=tx)
+                tx.commit()
+        print(f"✅ NEO4J: Ingested '{grant_data['name']}' ({grant_data['filename']})")
+
+    def reset_grant_relationships(self, grant_id: str):
+        """Drops outgoing edges of a grant so a re-extraction doesn't accumulate stale links."""
+        with self.driver.session() as session:
+            session.run("MATCH (g:Grant {id: $id})-[r]->() DELETE r", id=grant_id)
+
+    def find_outdated_grants(self, active_version: int) -> List[Dict]:
+        """Grants extracted under a prompt version other than the active one."""
+        query = """
+        MATCH (g:Grant)
+        WHERE g.prompt_version IS NULL OR g.prompt_version <> $version
+        RETURN g.id AS id, g.filename AS filename, g.prompt_version AS prompt_version
+        """
+        with self.driver.session() as session:
+            return [dict(r) for r in session.run(query, version=active_version)]
+
+    def backfill_match_features(self) -> int:
+        """Derives match features for grants ingested before they existed (or under an older version)."""
+        read_query = """
+        MATCH (g:Grant) WHERE g.features_version IS NULL OR g.features_version < $version
+        RETURN g.id AS id,
+               [(g)-[:REQUIRES_CRITERION]->(c) | c.description] AS criteria,
+               [(g)-[:ELIGIBLE_FOR_SIZE]->(s) | s.name] AS sizes,
+               [(g)-[:TARGETS_VERTICAL]->(v) | v.name] AS verticals,
+               [(g)-[:HAS_GEOGRAPHIC_FILTER]->(r) | r.name] AS regions,
+               [(g)-[:APPLICABLE_TO_COUNTRY]->(c) | c.name] AS countries,
+               g.max_value AS max_value, g.max_subsidy AS max_subsidy, g.funding_type AS funding_type
+        """
+        write_query = """
+        UNWIND $rows AS row MATCH (g:Grant {id: row.id}) SET g += row.features
+        FOREACH (k IN row.features.geo_set | 
+            MERGE (reg:Region {key: k}) 
+            MERGE (g)-[:HAS_GEOGRAPHIC_FILTER]->(reg))
+        """
+        with self.driver.session() as session:
+            rows, facet_rows = [], []
+            for r in session.run(read_query, version=MATCH_FEATURES_VERSION):
+                features = derive_match_features(r["criteria"], r["sizes"], r["verticals"], r["regions"],
+                                                 r["max_value"], r["max_subsidy"], r["countries"])
+                rows.append({"id": r["id"], "features": features})
+                facet_rows.append({"id": r["id"], "keys": grant_facet_keys(r["funding_type"], r["verticals"], features)})
+            if rows:
+                with session.begin_transaction() as tx:
+                    tx.run(write_query, rows=rows)
+                    self.update_facets(facet_rows, tx=tx)
+                    tx.commit()
+                print(f"🧮 NEO4J: Backfilled match features for {len(rows)} grants.")
+        return len(rows)
+
+    # ---------------- Catalogue facets (maintained incrementally) ----------------
+    def update_facets(self, rows: List[Dict], tx=None):
+        """
+        rows: [{"id", "keys"}]. Applies the difference between each grant's stored
+        facet_keys and its new keys to the Facet counters, then stores the new keys.
+        Runs inside `tx` when given (the caller's write transaction).
+        """
+        query = """
+        UNWIND $rows AS row
+        MATCH (g:Grant {id: row.id})
+        WITH g, row, coalesce(g.facet_keys, []) AS old
+        FOREACH (k IN [x IN old WHERE NOT x IN row.keys] | 
+            MERGE (f:Facet {key: k}) 
+            SET f.count = coalesce(f.count, 0) - 1)
+        FOREACH (k IN [x IN row.keys WHERE NOT x IN old] | 
+            MERGE (f:Facet {key: k}) 
+            ON CREATE SET f.dimension = split(k, ':')[0], f.value = substring(k, size(split(k, ':')[0]) + 1), f.count = 0
+            SET f.count = f.count + 1)
+        SET g.facet_keys = row.keys
+        """
+        if tx is not None:
+            tx.run(query, rows=rows)
+            return
+        with self.driver.session() as session:
+            session.run(query, rows=rows)
+
+    def ensure_facets(self):
+        """
+        Builds the counters from scratch unless the FacetIndex marker says they were
+        built at FACETS_VERSION (first start after upgrade, or a changed facet scheme).
+        """
+        with self.driver.session() as session:
+            built = session.run("MATCH (m:FacetIndex {name: 'catalogue'}) RETURN m.version AS v").single()
+            if built and built["v"] == FACETS_VERSION:
+                return
+            rows = [
+                {"id": r["id"], "keys": grant_facet_keys(r["funding_type"], r["verticals"],
+                                                         {"match_sizes": r["match_sizes"], "geo_set": r["geo_set"]})}
+                for r in session.run("""
+                MATCH (g:Grant)
+                RETURN g.id AS id, g.funding_type AS funding_type, g.match_sizes AS match_sizes, g.geo_set AS geo_set,
+                       [(g)-[:TARGETS_VERTICAL]->(v) | v.name] AS verticals
+                """)
+            ]
+            with session.begin_transaction() as tx:
+                tx.run("MATCH (f:Facet) DETACH DELETE f")
+                tx.run("MATCH (g:Grant) REMOVE g.facet_keys")
+                if rows:
+                    self.update_facets(rows, tx=tx)
+                tx.run("MERGE (m:FacetIndex {name: 'catalogue'}) SET m.version = $version", version=FACETS_VERSION)
+                tx.commit()
+        print(f"🗂️ NEO4J: Built catalogue facets for {len(rows)} grants.")
+
+    def get_facets(self) -> Dict[str, Dict[str, int]]:
+        facets: Dict[str, Dict[str, int]] = {}
+        with self.driver.session() as session:
+            for r in session.run("MATCH (f:Facet) WHERE f.count > 0 RETURN f.dimension AS d, f.value AS v, f.count AS c ORDER BY c DESC"):
+                facets.setdefault(r["d"], {})[r["v"]] = r["c"]
+        return facets
+
+    def list_grants(self, after: Optional[str], limit: int, funding_type: Optional[str] = None,
+                    vertical: Optional[str] = None, size: Optional[str] = None, region: Optional[str] = None) -> List[Dict]:
+        """Keyset page over Grant nodes in id order (index-backed; no OFFSET scans)."""
+        query = """
+        MATCH (g:Grant)
+        WHERE g.id > $after
+          AND ($funding_type IS NULL OR $funding_type IN g.facet_keys)
+          AND ($vertical IS NULL OR $vertical IN g.facet_keys)
+          AND ($size IS NULL OR $size IN g.facet_keys)
+          // Same geographic eligibility as MATCH_QUERY, so /grants?region= agrees with /match-grants
+          AND ($region IS NULL OR (coalesce(g.india_eligible, true)
+               AND (coalesce(g.geo_unresolved, false) OR size(coalesce(g.geo_set, [])) = 0
+                    OR $pan_india IN g.geo_set OR $region IN g.geo_set)))
+        WITH g ORDER BY g.id
+        LIMIT $limit
+        RETURN {
+            id: g.id,
+            title: g.name,
+            funding_type: g.funding_type,
+            max_value: g.max_value,
+            max_value_inr: g.max_value_inr,
+            regions: g.geo_set,
+            description: g.description,
+            filename: g.filename,
+            target_verticals: [(g)-[:TARGETS_VERTICAL]->(v) | v.name],
+            eligibility_criteria: [(g)-[:REQUIRES_CRITERION]->(c) | {type: c.type, description: c.description}]
+        } AS grant_data
+        """
+        with self.driver.session() as session:
+            result = session.run(
+                query, after=after or "", limit=limit, pan_india=PAN_INDIA, region=region,
+                funding_type=f"funding_type:{funding_type.strip().title()}" if funding_type else None,
+                vertical=f"vertical:{vertical.strip()}" if vertical else None,
+                size=f"size:{size.strip().title()}" if size else None,
+            )
+            return [r["grant_data"] for r in result]
+
 # Initialize Handler
 neo4j_handler = Neo4jHandler(NEO4J_URI, NEO4J_USER, NEO4J_PASSWORD)
+ingest_outbox = IngestOutbox(INGEST_OUTBOX_DB)
 
 
 # =========================================================
@@ -463,129 +776,319 @@ def send_notification_email(to_email: str, grant_name: str, grant_id: str):
         print(f"❌ EMAIL ERROR: {e}")
 
 
+def _parsed_cache_path(pdf_filename: str) -> str:
+    return os.path.join(PARSED_CACHE_DIR, f"{pdf_filename}.json")
+
+def load_document_pages(file_path: str):
+    """
+    Returns the parsed (and OCR'd) pages of a PDF.
+    Parsed text is cached in PARSED_CACHE_DIR so re-extraction never re-parses;
+    the cache is reused while the source file is unchanged (or no longer on disk).
+    """
+    pdf_filename = os.path.basename(file_path)
+    cache_path = _parsed_cache_path(pdf_filename)
+    source_stat = os.stat(file_path) if os.path.exists(file_path) else None
+
+    if os.path.exists(cache_path):
+        with open(cache_path, "r") as f:
+            cached = json.load(f)
+        if source_stat is None or (cached.get("size") == source_stat.st_size and cached.get("mtime") == source_stat.st_mtime):
+            return [Document(page_content=p["page_content"], metadata=p["metadata"]) for p in cached["pages"]]
+
+    if source_stat is None:
+        raise FileNotFoundError(f"{file_path} not found and no parsed cache available")
+
+    loader = PyPDFLoader(file_path)
+    docs = loader.load()
+    if not docs:
+        return docs
+
+    # OCR only the pages without a text layer (scanned circulars) and merge back
+    ocr_stats = ocr_textless_pages(file_path, docs)
+    if ocr_stats["pages_ocr"]:
+        print(f"🔠 AGENT: OCR cost for {pdf_filename}: {ocr_stats['cpu_seconds']}s CPU over {ocr_stats['pages_ocr']} pages.")
+
+    os.makedirs(PARSED_CACHE_DIR, exist_ok=True)
+    with open(cache_path, "w") as f:
+        json.dump({
+            "size": source_stat.st_size,
+            "mtime": source_stat.st_mtime,
+            "pages": [{"page_content": d.page_content, "metadata": d.metadata} for d in docs],
+        }, f)
+    return docs
+
+
+# --- Structured-output extraction ---
+SYSTEM_FIELDS = ("id", "filename", "prompt_version")
+GRANT_OUTPUT_SCHEMA = json.dumps({
+    name: {"type": prop.get("type", prop.get("anyOf")), "description": prop.get("description")}
+    for name, prop in GrantSchema.model_json_schema()["properties"].items()
+    if name not in SYSTEM_FIELDS
+})
+STRUCTURED_OUTPUT_RULES = f"""
+Output Contract (overrides any other output instructions)
+* Respond with a single JSON object only.
+* If the document is IRRELEVANT respond with exactly: {{"abort": true}}
+* Otherwise the object must match this schema: {GRANT_OUTPUT_SCHEMA}
+"""
+
+def _format_validation_errors(e: ValidationError) -> str:
+    return "\n".join(f"- {'.'.join(str(p) for p in err['loc'])}: {err['msg']}" for err in e.errors())
+
+async def _stream_json_object(messages) -> Tuple[Optional[dict], str]:
+    """
+    Streams a JSON-mode completion through an incremental JSON parser.
+    Returns (partial_or_complete_object, raw_text). Stops early on an abort verdict.
+    """
+    json_llm = llm.bind(response_format={"type": "json_object"})
+    buffer = ""
+    partial = None
+    async for chunk in json_llm.astream(messages):
+        buffer += chunk.content or ""
+        # Re-parse only at structural boundaries; the buffer is a few KB at most
+        if any(ch in (chunk.content or "") for ch in ",}]"):
+            partial = parse_partial_json(buffer) or partial
+            if isinstance(partial, dict) and partial.get("abort") is True:
+                break
+    final = parse_partial_json(buffer)
+    return (final if final is not None else partial), buffer
+
+async def extract_structured(prompt: str, pdf_filename: str):
+    """
+    Structured-output extraction bound to GrantSchema.
+    On validation failure only a short repair request (errors + partial object)
+    is sent - never the whole document again.
+    Returns a GrantSchema or the string 'abort'.
+    """
+    data, raw = await _stream_json_object([
+        SystemMessage(content=f"{prompt}\n{STRUCTURED_OUTPUT_RULES}"),
+    ])
+
+    for repair in range(MAX_REPAIR_ATTEMPTS + 1):
+        if isinstance(data, dict) and data.get("abort") is True:
+            return "abort"
+        try:
+            if not isinstance(data, dict):
+                raise json.JSONDecodeError("No JSON object in response", raw[:200], 0)
+            return GrantSchema(**{k: v for k, v in data.items() if k not in SYSTEM_FIELDS})
+        except (ValidationError, json.JSONDecodeError) as e:
+            if repair == MAX_REPAIR_ATTEMPTS:
+                raise
+            errors = _format_validation_errors(e) if isinstance(e, ValidationError) else str(e)
+            print(f"🩹 AGENT: Repair {repair+1}/{MAX_REPAIR_ATTEMPTS} for {pdf_filename}: {errors[:120]}")
+            current = json.dumps(data) if isinstance(data, dict) else raw[:2000]
+            data, raw = await _stream_json_object([
+                SystemMessage(content=f"You repair JSON objects so they satisfy a schema. Keep every valid value unchanged. Respond with the corrected JSON object only.\nSchema: {GRANT_OUTPUT_SCHEMA}"),
+                HumanMessage(content=f"Validation errors:\n{errors}\n\nObject:\n{current}"),
+            ])
+
+def extract_legacy(prompt: str):
+    """Free-text completion scraped with a regex (original behaviour). Returns a GrantSchema or 'abort'."""
+    response = llm.invoke(prompt)
+    content = response.content.strip()
+
+    # --- CHECK 1: ABORT ---
+    if "abort" in content.lower() and len(content) < 20:
+        return "abort"
+
+    # --- FIX 2: Robust Regex Extraction ---
+    # Instead of slicing, we look for the first '{' and last '}'
+    json_match = re.search(r"\{.*\}", content, re.DOTALL)
+    if json_match:
+        json_str = json_match.group(0)
+    else:
+        # If no JSON found, raise error to trigger retry
+        raise json.JSONDecodeError("No JSON object found in response", content[:50], 0)
+
+    # --- CHECK 3: PARSE JSON ---
+    data = json.loads(json_str)
+
+    # --- CHECK 4: VALIDATE SCHEMA ---
+    return GrantSchema(**data)
+
+
+async def _extract_with_retries(prompt: str, file_path: str, pdf_filename: str):
+    """LLM extraction with retries. Returns a GrantSchema, 'abort' or None (failed)."""
+    MAX_RETRIES = 3
+    
+    for attempt in range(MAX_RETRIES):
+        try:
+            if EXTRACTION_MODE == "structured":
+                return await extract_structured(prompt, pdf_filename)
+            return extract_legacy(prompt)
+
+        except json.JSONDecodeError as e:
+            print(f"⚠️ AGENT: Attempt {attempt+1}/{MAX_RETRIES} - JSON Decode Error. Content snippet: {e.doc[:50]}...")
+            if EXTRACTION_MODE == "structured":
+                break  # Repairs exhausted; resending the whole document would just repeat the cost
+            continue 
+            
+        except ValidationError as e:
+            print(f"⚠️ AGENT: Attempt {attempt+1}/{MAX_RETRIES} - Schema Validation Failed: {e}. Retrying...")
+            if EXTRACTION_MODE == "structured":
+                break
+            continue 
+            
+        except Exception as e:
+            print(f"❌ AGENT: Unexpected error during extraction: {e}")
+            # If it's not a JSON error, it might be an API error, so we might want to wait a bit
+            await asyncio.sleep(1) 
+            continue
+
+    print(f"❌ AGENT: Failed to extract data from {file_path} after {attempt+1} attempts.")
+    return None
+
 @traceable(run_type="chain", name="Extract & Store Pipeline")
-async def extract_and_store(file_path: str):
+async def extract_and_store(file_path: str, reuse_grant_id: Optional[str] = None,
+                            on_stage: Optional[Callable[[str], None]] = None):
+    """
+    Extracts a grant from a PDF and stores it in Neo4j + Chroma.
+    With `reuse_grant_id` the existing grant is re-extracted in place (cached text, same ID).
+    Progress is recorded per stage in the ingestion outbox: a retry resumes at the
+    failed stage and reuses a stored extraction instead of calling the LLM again.
+    `on_stage` is told 'extracted', 'embedded', 'skipped' or 'failed' (job progress).
+    Returns the grant ID on success.
+    """
+    report = on_stage or (lambda stage: None)
     pdf_filename = os.path.basename(file_path) 
     print(f"🕵️ AGENT: Processing {pdf_filename}...")
     
     # --- FIX 1: Robust PDF Loading ---
     try:
-        loader = PyPDFLoader(file_path)
-        docs = loader.load()
+        docs = await asyncio.to_thread(load_document_pages, file_path)
         if not docs:
             print(f"⚠️ AGENT: PDF {file_path} is empty or unreadable. Skipping.")
+            report("skipped")
             return
             
         # Limit context window to first 15000 chars
         full_text = "\n".join([d.page_content for d in docs])[:15000]
         
-        # Check if text was actually extracted (scanned PDFs might return empty strings)
+        # Check if text was actually extracted (even after OCR)
         if len(full_text.strip()) < 50:
-            print(f"⚠️ AGENT: PDF {file_path} contains no text (likely scanned image). Skipping.")
+            print(f"⚠️ AGENT: PDF {file_path} contains no text (even after OCR). Skipping.")
+            report("skipped")
             return
 
     except Exception as e:
         print(f"❌ AGENT: PDF Load Error for {file_path}: {e}")
+        report("failed")
         return
     
-    current_prompt_template = get_current_prompt()
+    prompt_version, current_prompt_template = prompt_registry.active()
+
+    # Stable identity: same document text -> same outbox entry -> same grant ID
+    doc_key = hashlib.sha1("\n".join(d.page_content for d in docs).encode("utf-8")).hexdigest()
+    stored = ingest_outbox.get(doc_key)
+    entry = stored if stored and stored["prompt_version"] == prompt_version else None  # Other rules: redo every stage
+    if entry and entry["stage"] == "rejected" and not reuse_grant_id:
+        print(f"🚫 AGENT: {pdf_filename} was already rejected under prompt v{prompt_version}. Skipping.")
+        report("skipped")
+        return
+    if entry and entry["stage"] == "committed" and not reuse_grant_id:
+        print(f"✅ AGENT: {pdf_filename} already ingested as {entry['grant_id']}. Skipping.")
+        report("skipped")
+        return entry["grant_id"]
+    # Full SHA-1: the ID is a MERGE key, so a shortened prefix would silently merge colliding documents
+    grant_id = reuse_grant_id or (stored and stored["grant_id"]) or f"GRANT_{doc_key}"
+    stage = "pending"
 
-    # 2. Define the Prompt
-    prompt = f"""
+    try:
+        # 1. Extraction (skipped when the outbox already holds a valid result)
+        if ingest_outbox.reached(entry, "extracted"):
+            validated_data = GrantSchema(**entry["extraction"])
+            validated_data.id = grant_id
+            print(f"♻️ AGENT: Resuming {grant_id} from stage '{entry['stage']}' (no LLM call).")
+        else:
+            prompt = f"""
     {current_prompt_template}
 
 Input Document Text
 {full_text}
     """
+            result = await _extract_with_retries(prompt, file_path, pdf_filename)
+            if result is None:
+                ingest_outbox.fail(doc_key, "extraction failed", file_path=file_path, grant_id=grant_id, prompt_version=prompt_version)
+                report("failed")
+                return
 
-    # 3. Retry Loop
-    MAX_RETRIES = 3
-    
-    for attempt in range(MAX_RETRIES):
-        try:
-            response = llm.invoke(prompt)
-            content = response.content.strip()
-
-            # --- CHECK 1: ABORT ---
-            if "abort" in content.lower() and len(content) < 20:
+            if result == "abort":
                 print(f"🚫 AGENT: Document {file_path} deemed IRRELEVANT. Skipping.")
+                ingest_outbox.record(doc_key, "rejected", file_path=file_path, grant_id=grant_id, prompt_version=prompt_version)
+                if reuse_grant_id:
+                    # The new rules reject a previously extracted grant -> remove it from every store
+                    grant_gc.purge_grant(reuse_grant_id)
+                    print(f"🗑️ CLEANUP: Removed {reuse_grant_id} (rejected under prompt v{prompt_version})")
+                report("skipped")
                 return
 
-            # --- FIX 2: Robust Regex Extraction ---
-            # Instead of slicing, we look for the first '{' and last '}'
-            json_match = re.search(r"\{.*\}", content, re.DOTALL)
-            if json_match:
-                json_str = json_match.group(0)
-            else:
-                # If no JSON found, raise error to trigger retry
-                raise ValueError("No JSON object found in response")
-
-            # --- CHECK 3: PARSE JSON ---
-            data = json.loads(json_str)
-
-            # --- CHECK 4: VALIDATE SCHEMA ---
-            validated_data = GrantSchema(**data)
-
-
-            grant_id = f"GRANT_{uuid.uuid4().hex[:8]}"
+            validated_data = result
             validated_data.id = grant_id
             validated_data.filename = pdf_filename
-
-            # 4. Success - Store in Neo4j
+            validated_data.prompt_version = prompt_version
+            ingest_outbox.record(doc_key, "extracted", file_path=file_path, grant_id=grant_id,
+                                 prompt_version=prompt_version, extraction=validated_data.model_dump())
             print(f"🧠 AGENT: Successfully Extracted: {validated_data.name}")
-            print(f"🆔 Grant ID: {grant_id}")
+            print(f"🆔 Grant ID: {grant_id} (prompt v{prompt_version})")
+        report("extracted")
+
+        # 2. Graph upsert (MERGE on the grant ID; stale edges dropped first)
+        stage = "graph"
+        if not ingest_outbox.reached(entry, stage):
+            neo4j_handler.reset_grant_relationships(grant_id)
             neo4j_handler.ingest_grant(validated_data.model_dump())
-            
-            # --- NEW: TRIGGER NOTIFICATION ---
+            ingest_outbox.record(doc_key, stage)
+        
+        # 3. Notifications (once per grant; skipped on re-extraction)
+        stage = "notified"
+        if not ingest_outbox.reached(entry, stage):
             try:
-                print(f"🔔 NOTIFY: Checking for interested SMEs for {grant_id}...")
-                grant_dict = validated_data.model_dump()
-                interested_emails = neo4j_handler.find_interested_smes(grant_dict)
-                
-                if interested_emails:
-                    print(f"🔔 NOTIFY: Found {len(interested_emails)} potential matches.")
-                    for email in interested_emails:
-                        send_notification_email(email, validated_data.name, grant_id)
-                else:
-                    print("🔔 NOTIFY: No matching subscribers found.")
+                if not reuse_grant_id:
+                    print(f"🔔 NOTIFY: Checking for interested SMEs for {grant_id}...")
+                    grant_dict = validated_data.model_dump()
+                    interested_emails = neo4j_handler.find_interested_smes(grant_dict)
+                    
+                    if interested_emails:
+                        print(f"🔔 NOTIFY: Found {len(interested_emails)} potential matches.")
+                        for email in interested_emails:
+                            send_notification_email(email, validated_data.name, grant_id)
+                    else:
+                        print("🔔 NOTIFY: No matching subscribers found.")
             except Exception as e:
                 print(f"⚠️ NOTIFICATION LOGIC FAILED: {e}")
-            # ---------------------------------
-
-            print(f"📚 VECTOR: Chunking and embedding text for {grant_id}...")
-            text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
-            
-            # Add metadata to every chunk
-            for doc in docs:
-                doc.metadata = {
-                    "grant_id": grant_id, 
-                    "source": file_path, 
-                    "filename": pdf_filename,
-                    "name": validated_data.name
-                    }
-                
-            splits = text_splitter.split_documents(docs)
-            vectorstore = get_vectorstore()
-            vectorstore.add_documents(splits)
-            print(f"✅ VECTOR: Added {len(splits)} chunks to ChromaDB.")
-            
-            return 
+            ingest_outbox.record(doc_key, stage)
 
-        except json.JSONDecodeError:
-            print(f"⚠️ AGENT: Attempt {attempt+1}/{MAX_RETRIES} - JSON Decode Error. Content snippet: {content[:50]}...")
-            continue 
-            
-        except ValidationError as e:
-            print(f"⚠️ AGENT: Attempt {attempt+1}/{MAX_RETRIES} - Schema Validation Failed: {e}. Retrying...")
-            continue 
+        # 4. Embedding (replace the grant's chunks; deterministic chunk IDs)
+        stage = "committed"
+        print(f"📚 VECTOR: Chunking and embedding text for {grant_id}...")
+        text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200, add_start_index=True)
+        
+        # Add metadata to every chunk
+        for doc in docs:
+            doc.metadata = {
+                "grant_id": grant_id, 
+                "source": file_path, 
+                "filename": pdf_filename,
+                "name": validated_data.name,
+                "page": doc.metadata.get("page", 0)
+                }
             
-        except Exception as e:
-            print(f"❌ AGENT: Unexpected error during extraction: {e}")
-            # If it's not a JSON error, it might be an API error, so we might want to wait a bit
-            time.sleep(1) 
-            continue
+        splits = text_splitter.split_documents(docs)
+        delete_grant_chunks(grant_id)
+        vectorstore = get_vectorstore()
+        vectorstore.add_documents(splits, ids=[f"{grant_id}:{i}" for i in range(len(splits))])
+        grant_index.invalidate(grant_id)
+        ingest_outbox.record(doc_key, stage)
+        print(f"✅ VECTOR: Added {len(splits)} chunks to ChromaDB.")
+        report("embedded")
+        
+        return grant_id
 
-    print(f"❌ AGENT: Failed to extract data from {file_path} after {MAX_RETRIES} attempts.")
+    except Exception as e:
+        print(f"❌ AGENT: Stage '{stage}' failed for {grant_id}: {e}. It will resume from here on retry.")
+        ingest_outbox.fail(doc_key, f"{stage}: {e}")
+        report("failed")
+        return
 
 # =========================================================
 # 2️⃣ SCRAPING HELPER FUNCTIONS (NEW)
@@ -596,34 +1099,42 @@ HEADERS = {
     "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8"
 }
 
+# Per-domain concurrency, adaptive delay, timeouts and retry budget for the BeautifulSoup scraper
+crawl_policy = CrawlPolicy()
+
 def clean_filename(text):
     """Sanitize text to be a valid filename."""
     clean = re.sub(r'[\\/*?:"<>|]', "", text)
     clean = clean.replace('\n', ' ').replace('\r', '').strip()
     return clean[:80]
 
-def download_pdf(pdf_url, folder_name, filename_hint):
-    """Downloads a PDF with SSL verification disabled."""
+def download_pdf(pdf_url, folder_name, filename_hint, unique: bool = False):
+    """
+    Downloads a PDF through the per-domain crawl policy (SSL verification disabled).
+    With `unique` the name carries a hash of the URL, so different PDFs never share a file.
+    """
+    tmp_path = None
     try:
-        response = requests.get(pdf_url, headers=HEADERS, stream=True, timeout=30, verify=False)
-        response.raise_for_status()
-        
-        server_filename = pdf_url.split('/')[-1]
+        server_filename = pdf_url.split('/')[-1].split('?')[0]
         
         if re.match(r'^\d+.*\.pdf$', server_filename) or not server_filename.lower().endswith('.pdf'):
             final_name = f"{clean_filename(filename_hint)}.pdf"
         else:
             final_name = server_filename
+        if unique:
+            final_name = f"{final_name[:-4]}_{hashlib.sha1(pdf_url.encode('utf-8')).hexdigest()[:10]}.pdf"
 
         save_path = os.path.join(folder_name, final_name)
-        
-        with open(save_path, 'wb') as f:
-            for chunk in response.iter_content(chunk_size=8192):
-                f.write(chunk)
+        # Write to a private temp file first: parallel downloads never interleave in one file
+        tmp_path = f"{save_path}.{uuid.uuid4().hex[:8]}.part"
+        crawl_policy.download(pdf_url, tmp_path, headers=HEADERS)
+        os.replace(tmp_path, save_path)
         return final_name
         
     except Exception as e:
         print(f"[ERROR] Failed to download {pdf_url}: {e}")
+        if tmp_path and os.path.exists(tmp_path):
+            os.remove(tmp_path)
         return None
 
 
@@ -639,7 +1150,7 @@ def perform_scraping(url: str, output_folder: str):
         os.makedirs(output_folder)
 
     try:
-        resp = requests.get(url, headers=HEADERS, verify=False)
+        resp = crawl_policy.request(url, headers=HEADERS)
         soup = BeautifulSoup(resp.content, 'html.parser')
         
         # 1. Try Table Scraping (Specific logic like MNRE)
@@ -673,7 +1184,7 @@ def perform_scraping(url: str, output_folder: str):
                 # Filter for PDFs or download links
                 if href.lower().endswith('.pdf') or 'download' in link_text.lower():
                      # Basic keyword filter to avoid junk
-                    if any(x in full_url.lower() for x in ['scheme', 'guideline', 'circular', 'brochure', 'report', 'policy']):
+                    if any(x in full_url.lower() for x in PDF_KEYWORDS):
                         hint = link_text if len(link_text) > 5 else f"Doc_{count}"
                         fname = download_pdf(full_url, output_folder, hint)
                         if fname: 
@@ -690,77 +1201,98 @@ def perform_scraping(url: str, output_folder: str):
 # =========================================================
 # 7️⃣ MATCHING LOGIC (FIXED AGGREGATION)
 # =========================================================
-@traceable(run_type="tool", name="Neo4j Semantic Search")
-def find_matching_grants(sme: SMEProfile) -> List[Dict]:
-    """
-    Robust Semantic Search with Fixed Aggregation Logic AND Udyam Filtering.
-    """
-    session = neo4j_handler.driver.session()
-    
-    # 1. Sanitize Input
-    clean_desc = re.sub(r'[^a-zA-Z0-9\s]', ' ', sme.project_need_description)
-    words = clean_desc.split()
-    if not words:
-        keywords = "generic~"
-    else:
-        keywords = " OR ".join([f"{w}~" for w in words])
-    
-    # 2. Cypher Query
-    query = f"""
-    CALL db.index.fulltext.queryNodes("grant_keywords", "{keywords}") 
+# One query for one or many profiles: each row of $profiles is scored in its own subquery
+MATCH_QUERY = """
+UNWIND $profiles AS p
+CALL {
+    WITH p
+    CALL db.index.fulltext.queryNodes("grant_keywords", p.keywords) 
     YIELD node AS g, score
     
-    // --- Step A: Check for Udyam Requirement (HARD RULE) ---
-    // We look at linked Criteria nodes to see if they mention 'Udyam' or 'MSME'
-    OPTIONAL MATCH (g)-[:REQUIRES_CRITERION]->(c)
-    WITH g, score, collect(toLower(c.description)) as criteria_texts
-    
-    // Determine if the grant implies Udyam requirement based on text analysis
-    WITH g, score, 
-         ANY(txt IN criteria_texts WHERE txt CONTAINS 'udyam' OR txt CONTAINS 'msme' OR txt CONTAINS 'registration') as requires_udyam
-    
-    // FILTER: If User is NOT registered ($udyam_status = false) AND Grant REQUIRES it, remove the grant.
-    WHERE NOT ($udyam_status = false AND requires_udyam = true)
-
-    // --- Step B: Calculate Size Score ---
-    OPTIONAL MATCH (g)-[:ELIGIBLE_FOR_SIZE]->(s)
-    WITH g, score, 
-         max(CASE WHEN s.name = '{sme.sme_size}' THEN 2.0 ELSE 0.5 END) AS size_score
-    
-    // --- Step C: Calculate Sector Score ---
-    OPTIONAL MATCH (g)-[:TARGETS_VERTICAL]->(v)
-    WITH g, score, size_score,
-         max(CASE 
-            WHEN v.name CONTAINS '{sme.sector_category}' THEN 3.0 
-            WHEN v.name STARTS WITH 'All' THEN 1.0
+    // --- Step A: Udyam Requirement (HARD RULE, precomputed at ingest) ---
+    // FILTER: If User is NOT registered (udyam_status = false) AND Grant REQUIRES it, remove the grant.
+    WHERE NOT (p.udyam_status = false AND coalesce(g.requires_udyam, false) = true)
+      // FILTER: Schemes whose cap is orders of magnitude above the project (national outlays) are out of scope
+      AND NOT (p.project_value > 0 AND coalesce(g.max_value_inr, 0) > p.project_value * $max_oversize)
+      // FILTER: Geographic eligibility (no restriction, Pan-India, or the SME's state)
+      AND coalesce(g.india_eligible, true)
+      AND (p.region IS NULL OR coalesce(g.geo_unresolved, false) OR size(coalesce(g.geo_set, [])) = 0
+           OR $pan_india IN g.geo_set OR p.region IN g.geo_set)
+
+    // --- Step B/C: Size and Sector Scores (normalised feature sets on the node, no fan-out) ---
+    WITH g, score,
+         CASE WHEN p.sme_size IN coalesce(g.match_sizes, []) THEN 2.0 ELSE 0.5 END AS size_score,
+         CASE 
+            WHEN any(t IN p.sector_tokens WHERE t IN coalesce(g.sector_tokens, [])) THEN 3.0 
+            WHEN g.all_sectors THEN 1.0
             ELSE 0.5 
-         END) AS sector_score
+         END AS sector_score,
+         // Budget fit: share of the project the scheme can cover (neutral when unknown)
+         CASE 
+            WHEN p.project_value <= 0 OR g.max_value_inr IS NULL THEN 1.0
+            WHEN g.max_value_inr >= p.project_value THEN 2.0
+            ELSE 2.0 * g.max_value_inr / p.project_value
+         END AS budget_score,
+         // Estimated subsidy: percentage of the project, capped by the absolute limit
+         CASE 
+            WHEN p.project_value > 0 AND g.subsidy_percent IS NOT NULL
+            THEN CASE WHEN g.max_subsidy_inr IS NOT NULL AND g.max_subsidy_inr < p.project_value * g.subsidy_percent / 100
+                      THEN g.max_subsidy_inr ELSE p.project_value * g.subsidy_percent / 100 END
+            ELSE g.max_subsidy_inr
+         END AS estimated_subsidy_inr
          
     // --- Step D: Final Calculation ---
-    WITH g, 
-         (score * 5) + coalesce(size_score, 0.5) + coalesce(sector_score, 0.5) AS final_score
+    WITH g, estimated_subsidy_inr, budget_score,
+         (score * 5) + size_score + sector_score + budget_score AS final_score
+    ORDER BY final_score DESC
+    LIMIT 5
     
     // --- Step E: Return Data ---
-    RETURN {{
+    RETURN collect({
         id: g.id,
         title: g.name,
         funding_type: g.funding_type,
         max_value: g.max_value,
+        max_value_inr: g.max_value_inr,
+        regions: g.geo_set,
+        estimated_subsidy_inr: estimated_subsidy_inr,
+        budget_fit: budget_score / 2.0,
         description: g.description,
         filename: g.filename,
         match_score: final_score,
         target_verticals: [(g)-[:TARGETS_VERTICAL]->(v) | v.name],
-        eligibility_criteria: [(g)-[:REQUIRES_CRITERION]->(c) | {{type: c.type, description: c.description}}]
-    }} AS grant_data
-    ORDER BY final_score DESC
-    LIMIT 5
+        eligibility_criteria: [(g)-[:REQUIRES_CRITERION]->(c) | {type: c.type, description: c.description}]
+    }) AS matches
+}
+RETURN p.idx AS idx, matches
+"""
+
+def run_match_query(smes: List[SMEProfile]) -> List[List[Dict]]:
+    """Scores every profile in ONE round trip. Returns the top matches per profile (input order)."""
+    profiles = [{
+        "idx": i,
+        "keywords": build_fulltext_query(sme.project_need_description),
+        "udyam_status": sme.udyam_status,
+        "sme_size": sme.sme_size,
+        "sector_tokens": sector_tokens(sme.sector_category),
+        "project_value": sme.project_value_inr,
+        "region": resolve_sme_state(sme.location_state),
+    } for i, sme in enumerate(smes)]
+
+    results: List[List[Dict]] = [[] for _ in smes]
+    with neo4j_handler.driver.session() as session:
+        for record in session.run(MATCH_QUERY, profiles=profiles, max_oversize=MATCH_MAX_OVERSIZE, pan_india=PAN_INDIA):
+            results[record["idx"]] = record["matches"]
+    return results
+
+@traceable(run_type="tool", name="Neo4j Semantic Search")
+def find_matching_grants(sme: SMEProfile) -> List[Dict]:
+    """
+    Robust Semantic Search with Fixed Aggregation Logic AND Udyam Filtering.
     """
-    
     try:
-        print(f"🔍 MATCHING: Searching for keywords: {keywords[:50]}...")
-        # CRITICAL: Pass udyam_status as a parameter to the query
-        result = session.run(query, udyam_status=sme.udyam_status)
-        matches = [record["grant_data"] for record in result]
+        print(f"🔍 MATCHING: Searching for keywords: {build_fulltext_query(sme.project_need_description)[:50]}...")
+        matches = run_match_query([sme])[0]
         
         if not matches:
             print("⚠️ No matches found.")
@@ -769,8 +1301,6 @@ def find_matching_grants(sme: SMEProfile) -> List[Dict]:
     except Exception as e:
         print(f"❌ Match Error: {e}")
         return []
-    finally:
-        session.close()
 
 @traceable(run_type="chain", name="Generate Checklist")
 async def generate_application_checklist(grant_title: str, sme: SMEProfile):
@@ -806,6 +1336,31 @@ def get_vectorstore():
         )
     )
 
+# Per-grant partitions: direct lookup + exact search, independent of corpus size
+grant_index = GrantIndex(get_vectorstore)
+
+def delete_grant_chunks(grant_id: str):
+    """Removes every chunk of a grant from the vector store."""
+    get_vectorstore().delete(where={"grant_id": grant_id})
+    grant_index.invalidate(grant_id)
+
+# Keeps Neo4j, Chroma and the document folders consistent when grants go away
+grant_gc = GrantGarbageCollector(
+    neo4j_handler.driver, get_vectorstore,
+    scrape_dir=SCRAPE_DIR, parsed_cache_dir=PARSED_CACHE_DIR, chroma_dir=DB_DIR,
+    on_chunks_deleted=grant_index.invalidate,
+    on_grant_purged=ingest_outbox.forget_grant,
+)
+
+async def gc_loop():
+    """Scheduled background sweep."""
+    while True:
+        await asyncio.sleep(GC_INTERVAL_SECONDS)
+        try:
+            await asyncio.to_thread(grant_gc.sweep)
+        except Exception as e:
+            print(f"⚠️ GC: Sweep failed: {e}")
+
 @tool
 def search_financial_reports(query: str):
     """
@@ -828,11 +1383,16 @@ def search_financial_reports(query: str):
     
 
 @traceable(run_type="chain", name="Prompt Optimization Agent")
-async def optimize_prompt_logic(user_feedback: str, document_snippet: str):
+async def optimize_prompt_logic(feedback_batch: List[Dict], current_rules: str) -> Optional[str]:
     """
     The 'Prompt Engineer' Agent.
+    Produces ONE consolidated rules revision for a whole batch of user reports.
+    Returns the candidate prompt text (not activated).
     """
-    current_rules = get_current_prompt()
+    reports = "\n".join(
+        f"{i+1}. USER FEEDBACK: \"{item['user_feedback']}\"\n   DOCUMENT SNIPPET: \"{item['snippet'][:500]}...\""
+        for i, item in enumerate(feedback_batch)
+    )
     
     meta_prompt = f"""
     You are a Senior Prompt Engineer for an AI extraction system.
@@ -845,14 +1405,14 @@ async def optimize_prompt_logic(user_feedback: str, document_snippet: str):
     [CURRENT RULES END]
     
     PROBLEM:
-    A user has reported a FALSE POSITIVE. The system extracted data from a document that should have been ignored (aborted), or extracted it incorrectly.
+    Users have reported {len(feedback_batch)} FALSE POSITIVE(S). The system extracted data from documents that should have been ignored (aborted), or extracted them incorrectly.
     
-    USER FEEDBACK: "{user_feedback}"
-    DOCUMENT SNIPPET: "{document_snippet[:500]}..."
+    REPORTS:
+    {reports}
     
     TASK:
-    Rewrite the [CURRENT RULES] to prevent this mistake in the future. 
-    - You MUST add a specific exclusion criteria to the "Relevance Check" section based on the user's feedback.
+    Rewrite the [CURRENT RULES] ONCE to prevent all of these mistakes in the future. 
+    - You MUST add specific exclusion criteria to the "Relevance Check" section based on the feedback. Merge similar reports into one rule.
     - Do NOT remove the core functionality of extracting legitimate grants.
     - Keep the output concise.
     
@@ -861,13 +1421,334 @@ async def optimize_prompt_logic(user_feedback: str, document_snippet: str):
     
     try:
         response = await llm.ainvoke(meta_prompt)
-        new_rules = response.content
-        update_prompt(new_rules)
-        print("🧠 SELF-LEARNING: Extraction rules updated based on user feedback.")
-        return True
+        return response.content
     except Exception as e:
         print(f"❌ Learning Error: {e}")
-        return False
+        return None
+
+
+# =========================================================
+# 5️⃣ SELF-LEARNING: FEEDBACK AGGREGATION & OFFLINE EVALUATION
+# =========================================================
+class EvalCorpus:
+    """
+    Cached labelled corpus (JSON lines) used to gate prompt revisions.
+    Each example: {"id", "label": "relevant" | "irrelevant", "text", "source"}.
+    Model verdicts are cached per (prompt_version, example id) so the baseline is never re-run.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self.examples: Dict[str, dict] = {}
+        self.verdicts: Dict[Tuple[int, str], Tuple[str, float]] = {}
+        if os.path.exists(path):
+            with open(path, "r") as f:
+                for line in f:
+                    if line.strip():
+                        ex = json.loads(line)
+                        self.examples[ex["id"]] = ex
+
+    def add(self, example_id: str, label: str, text: str, source: str = ""):
+        with self._lock:
+            example = {"id": example_id, "label": label, "text": text[:15000], "source": source}
+            self.examples[example_id] = example
+            # Relabelling invalidates any cached verdicts for this example
+            self.verdicts = {k: v for k, v in self.verdicts.items() if k[1] != example_id}
+            with open(self.path, "w") as f:
+                for ex in self.examples.values():
+                    f.write(json.dumps(ex) + "\n")
+
+eval_corpus = EvalCorpus(EVAL_CORPUS_FILE)
+
+async def _classify_example(prompt_text: str, example: dict, semaphore: asyncio.Semaphore) -> Tuple[str, float]:
+    """Replays one corpus example through a prompt. Returns (predicted_label, latency_seconds)."""
+    async with semaphore:
+        start = time.perf_counter()
+        try:
+            response = await llm.ainvoke(f"{prompt_text}\n\nInput Document Text\n{example['text']}")
+            content = response.content.strip()
+            predicted = "irrelevant" if ("abort" in content.lower() and len(content) < 20) else "relevant"
+        except Exception as e:
+            print(f"⚠️ EVAL: Example {example['id']} failed: {e}")
+            predicted = "error"
+        return predicted, time.perf_counter() - start
+
+async def replay_prompt(version: int, prompt_text: str, examples: List[Dict]):
+    """Runs the labelled examples through a prompt version in parallel (verdicts cached per version; errors are not)."""
+    semaphore = asyncio.Semaphore(EVAL_CONCURRENCY)
+    todo = [ex for ex in examples if (version, ex["id"]) not in eval_corpus.verdicts]
+    results = await asyncio.gather(*[_classify_example(prompt_text, ex, semaphore) for ex in todo])
+    for ex, verdict in zip(todo, results):
+        if verdict[0] != "error":
+            eval_corpus.verdicts[(version, ex["id"])] = verdict
+
+def score_prompt(version: int, examples: List[Dict], corpus_size: int) -> Dict:
+    """Accuracy / recall / latency of a version over exactly `examples` (all must have a verdict)."""
+    scored = [(ex, eval_corpus.verdicts[(version, ex["id"])]) for ex in examples]
+    if not scored:
+        return {"version": version, "examples": 0, "corpus_size": corpus_size,
+                "accuracy": None, "relevant_recall": None, "mean_latency_s": None}
+
+    correct = sum(1 for ex, (pred, _) in scored if pred == ex["label"])
+    relevant = [(ex, pred) for ex, (pred, _) in scored if ex["label"] == "relevant"]
+    return {
+        "version": version,
+        "examples": len(scored),
+        "corpus_size": corpus_size,
+        "accuracy": round(correct / len(scored), 4),
+        "relevant_recall": round(sum(1 for _, pred in relevant if pred == "relevant") / len(relevant), 4) if relevant else None,
+        "mean_latency_s": round(sum(lat for _, (_, lat) in scored) / len(scored), 3),
+    }
+
+async def evaluate_prompts(baseline_version: int, baseline_rules: str,
+                           candidate_version: int, candidate_rules: str) -> Tuple[Dict, Dict]:
+    """
+    Replays the corpus through both versions and scores both on the examples that have
+    a verdict under BOTH, so the gate's deltas compare the same population.
+    """
+    examples = list(eval_corpus.examples.values())
+    await asyncio.gather(
+        replay_prompt(baseline_version, baseline_rules, examples),
+        replay_prompt(candidate_version, candidate_rules, examples),
+    )
+    compared = [ex for ex in examples
+                if (baseline_version, ex["id"]) in eval_corpus.verdicts
+                and (candidate_version, ex["id"]) in eval_corpus.verdicts]
+    return (score_prompt(baseline_version, compared, len(examples)),
+            score_prompt(candidate_version, compared, len(examples)))
+
+class FeedbackAggregator:
+    """
+    Batches /report-error submissions over a window and produces ONE consolidated
+    prompt revision per batch. A revision is only activated if it does not lose
+    accuracy (or recall on legitimate grants) on the labelled corpus.
+    """
+    def __init__(self, window_seconds: int, max_batch: int):
+        self.window_seconds = window_seconds
+        self.max_batch = max_batch
+        self.pending: List[Dict] = []
+        self.history: List[Dict] = []
+        self._lock = asyncio.Lock()
+        self._revision_lock = asyncio.Lock()  # Only one revision in flight -> no racing writes
+        self._flush_task: Optional[asyncio.Task] = None
+        self._batch_flushes: Set[asyncio.Task] = set()  # Strong refs: the loop only keeps weak ones to running tasks
+
+    def _spawn_flush(self):
+        task = asyncio.create_task(self.flush())
+        self._batch_flushes.add(task)
+        task.add_done_callback(self._batch_flushes.discard)
+
+    async def submit(self, item: Dict) -> int:
+        async with self._lock:
+            self.pending.append(item)
+            if len(self.pending) >= self.max_batch:
+                self._spawn_flush()
+            elif self._flush_task is None:
+                self._flush_task = asyncio.create_task(self._flush_after_window())
+            return len(self.pending)
+
+    async def _flush_after_window(self):
+        await asyncio.sleep(self.window_seconds)
+        await self.flush()
+
+    async def flush(self) -> Optional[Dict]:
+        async with self._lock:
+            batch, self.pending = self.pending, []
+            if self._flush_task is not None and self._flush_task is not asyncio.current_task():
+                self._flush_task.cancel()
+            self._flush_task = None
+        if not batch:
+            return None
+
+        async with self._revision_lock:
+            report = await self._process_batch(batch)
+            self.history = (self.history + [report])[-50:]
+            return report
+
+    async def _requeue(self, batch: List[Dict]):
+        """Puts the reports back so the next window retries them."""
+        async with self._lock:
+            self.pending = batch + self.pending
+            if self._flush_task is None:
+                self._flush_task = asyncio.create_task(self._flush_after_window())
+
+    @traceable(run_type="chain", name="Batched Self-Learning Revision")
+    async def _process_batch(self, batch: List[Dict]) -> Dict:
+        baseline_version, baseline_rules = prompt_registry.active()
+        print(f"🧠 SELF-LEARNING: Consolidating {len(batch)} reports against prompt v{baseline_version}...")
+
+        candidate_rules = await optimize_prompt_logic(batch, baseline_rules)
+        if not candidate_rules:
+            await self._requeue(batch)
+            return {"status": "error", "reports": len(batch), "message": "Revision generation failed."}
+
+        candidate_version = prompt_registry.publish(
+            candidate_rules, note=f"batch of {len(batch)} reports", activate=False
+        )
+
+        # Offline evaluation gate (baseline verdicts are cached, candidate replayed in parallel)
+        baseline_eval, candidate_eval = await evaluate_prompts(
+            baseline_version, baseline_rules, candidate_version, candidate_rules
+        )
+        if candidate_eval["examples"] < candidate_eval["corpus_size"]:
+            # Some replays failed (LLM outage / rate limit): no verdict on this revision yet
+            await self._requeue(batch)
+            print(f"⚠️ SELF-LEARNING: v{candidate_version} evaluated on {candidate_eval['examples']}/"
+                  f"{candidate_eval['corpus_size']} examples; retrying next window.")
+            return {"status": "error", "reports": len(batch), "baseline": baseline_eval, "candidate": candidate_eval,
+                    "message": "Evaluation incomplete; the reports are retried in the next window."}
+        activated = self._passes_gate(baseline_eval, candidate_eval)
+        if activated:
+            prompt_registry.activate(candidate_version)
+
+        # The reported grants are removed only once a rule change was adopted; a rejected
+        # revision keeps them (listed in the report) so they can be re-extracted later
+        if activated:
+            for item in batch:
+                await asyncio.to_thread(grant_gc.purge_grant, item["grant_id"])
+                print(f"🗑️ CLEANUP: Deleted bad grant {item['grant_id']}")
+
+        def delta(key):
+            if baseline_eval[key] is None or candidate_eval[key] is None:
+                return None
+            return round(candidate_eval[key] - baseline_eval[key], 4)
+
+        report = {
+            "status": "activated" if activated else "rejected",
+            "reports": len(batch),
+            "baseline": baseline_eval,
+            "candidate": candidate_eval,
+            "compared_examples": candidate_eval["examples"],
+            "accuracy_delta": delta("accuracy"),
+            "latency_delta_s": delta("mean_latency_s"),
+            "finished_at": time.time(),
+        }
+        if activated:
+            report["reextract_offer"] = {
+                "outdated_grants": len(neo4j_handler.find_outdated_grants(candidate_version)),
+                "endpoint": "/prompts/reextract",
+            }
+        else:
+            report["kept_grants"] = [item["grant_id"] for item in batch]
+        print(f"🧠 SELF-LEARNING: v{candidate_version} {report['status']} "
+              f"(accuracy Δ {report['accuracy_delta']}, latency Δ {report['latency_delta_s']}s)")
+        return report
+
+    @staticmethod
+    def _passes_gate(baseline: Dict, candidate: Dict) -> bool:
+        if not candidate["corpus_size"]:
+            # Empty corpus: nothing to compare against, accept the revision as before
+            return True
+        if candidate["examples"] < candidate["corpus_size"]:
+            # Never activate a revision that was not evaluated on the whole corpus
+            return False
+        if baseline["accuracy"] is not None and candidate["accuracy"] < baseline["accuracy"]:
+            return False
+        if baseline["relevant_recall"] is not None and (candidate["relevant_recall"] or 0) < baseline["relevant_recall"]:
+            return False
+        return True
+
+feedback_aggregator = FeedbackAggregator(FEEDBACK_WINDOW_SECONDS, FEEDBACK_MAX_BATCH)
+
+
+# =========================================================
+# 6️⃣ AGENT GRAPH (LangGraph + Persistent Memory)
+# =========================================================
+app_state = {}
+
+AGENT_SYSTEM_PROMPT = """
+You are a helpful assistant for Indian SMEs exploring government grants and financial decisions.
+- Use `search_financial_reports` for questions about uploaded documents and schemes.
+- Use the finance tools for live market data and technical BUY/SELL/HOLD analysis.
+Answer concisely and cite which tool the information came from.
+"""
+
+class AgentState(TypedDict):
+    messages: Annotated[List[BaseMessage], add_messages]
+    summary: str
+
+def _history_cutoff(messages: List[BaseMessage]) -> int:
+    """
+    Index before which messages get summarised. Keeps the last CHAT_KEEP_MESSAGES and
+    moves the cut back to a HumanMessage so tool calls are never split from their results.
+    """
+    cut = max(0, len(messages) - CHAT_KEEP_MESSAGES)
+    while cut > 0 and not isinstance(messages[cut], HumanMessage):
+        cut -= 1
+    return cut
+
+def create_agent_graph(tools, checkpointer):
+    llm_with_tools = llm.bind_tools(tools) if tools else llm
+
+    async def summarize_history(state: AgentState):
+        messages = state["messages"]
+        cut = _history_cutoff(messages)
+        if cut == 0:
+            return {}
+        old = messages[:cut]
+        transcript = "\n".join(f"{m.type}: {m.content}" for m in old if m.content)
+        response = await llm.ainvoke(
+            f"Previous summary:\n{state.get('summary') or 'None'}\n\n"
+            f"Extend the summary with this conversation. Keep facts, tickers, grant IDs and user preferences.\n\n{transcript}"
+        )
+        print(f"🧹 MEMORY: Summarised {len(old)} messages.")
+        return {"summary": response.content, "messages": [RemoveMessage(id=m.id) for m in old]}
+
+    async def agent(state: AgentState):
+        system = AGENT_SYSTEM_PROMPT
+        if state.get("summary"):
+            system += f"\nSummary of the earlier conversation:\n{state['summary']}"
+        response = await llm_with_tools.ainvoke([SystemMessage(content=system)] + state["messages"])
+        return {"messages": [response]}
+
+    def route_start(state: AgentState):
+        return "summarize" if len(state["messages"]) > CHAT_MAX_MESSAGES else "agent"
+
+    builder = StateGraph(AgentState)
+    builder.add_node("summarize", summarize_history)
+    builder.add_node("agent", agent)
+    builder.add_node("tools", ToolNode(tools))
+    builder.add_conditional_edges(START, route_start, ["summarize", "agent"])
+    builder.add_edge("summarize", "agent")
+    builder.add_conditional_edges("agent", tools_condition)
+    builder.add_edge("tools", "agent")
+
+    return builder.compile(
+        checkpointer=checkpointer,
+        interrupt_before=["tools"] if CHAT_REQUIRE_APPROVAL else None,
+    )
+
+async def prune_checkpoints(thread_id: str):
+    """Keeps only the newest CHAT_KEEP_CHECKPOINTS checkpoints of a thread on disk."""
+    checkpointer = app_state.get("checkpointer")
+    if checkpointer is None:
+        return
+    async with checkpointer.lock:
+        for table in ("writes", "checkpoints"):
+            await checkpointer.conn.execute(
+                f"""
+                DELETE FROM {table} WHERE thread_id = ? AND checkpoint_id NOT IN (
+                    SELECT checkpoint_id FROM checkpoints WHERE thread_id = ?
+                    ORDER BY checkpoint_id DESC LIMIT ?
+                )
+                """,
+                (thread_id, thread_id, CHAT_KEEP_CHECKPOINTS),
+            )
+        await checkpointer.conn.commit()
+
+
+mcp_manager = MCPSessionManager()
+
+
+async def rebuild_agent_graph(mcp_tools):
+    """Recompiles the agent with a changed MCP tool list (same checkpointer, so threads carry over)."""
+    checkpointer = app_state.get("checkpointer")
+    if checkpointer is None:
+        return
+    app_state["graph"] = create_agent_graph([search_financial_reports] + mcp_tools, checkpointer)
+    print(f"🔄 GRAPH: Recompiled with {len(mcp_tools)} MCP tools.")
+
+mcp_manager.on_tools_changed = rebuild_agent_graph
 
 
 # =========================================================
@@ -878,45 +1759,293 @@ async def lifespan(app: FastAPI):
     print("\n🔄 LIFESPAN: Initializing MCP Client...")
 
     neo4j_handler.ensure_indexes()
+    neo4j_handler.ensure_region_hierarchy()
+    neo4j_handler.ensure_facets()              # Before the backfill: it updates counters incrementally
+    neo4j_handler.backfill_match_features()
     if not os.path.exists(DB_DIR): os.makedirs(DB_DIR)
 
-    yield
-    print("🛑 Shutdown")
+    # Tool list comes from cache when available; sessions are opened lazily on first call
+    print("⏳ LIFESPAN: Loading Finance MCP tools...")
+    try:
+        mcp_tools = await mcp_manager.get_tools()    
+        print(f"✅ LIFESPAN: Loaded {len(mcp_tools)} MCP tools")
+    except Exception as e:
+        print(f"⚠️ WARN: Could not load MCP tools (check if MCP server is running): {e}")
+        mcp_tools = []
+
+    all_tools = [search_financial_reports] + mcp_tools
+
+    print("📊 LIFESPAN: Compiling LangGraph with SQLite Memory...")
+    async with AsyncSqliteSaver.from_conn_string(CHECKPOINT_DB) as checkpointer:
+        app_state["checkpointer"] = checkpointer
+        app_state["graph"] = create_agent_graph(all_tools, checkpointer)
+        print("🚀 LIFESPAN: Graph Ready.")
+
+        gc_task = asyncio.create_task(gc_loop())
+        resume_task = asyncio.create_task(resume_incomplete_ingestions())
+        yield
+        gc_task.cancel()
+        resume_task.cancel()
+
+    app_state.clear()
+    await mcp_manager.close()
+    shutdown_ocr_pool()
+    print("🛑 LIFESPAN: Application shutdown.")
 
-    mcp_client = MultiServerMCPClient({
-        "finance": {
-            "transport": "sse",
-            "url": "http://localhost:8001/mcp/sse",
-        }
-    })
 
+# =========================================================
+# 7️⃣ BACKGROUND JOB TRACKING
+# =========================================================
+JOBS: Dict[str, dict] = {}
+MAX_TRACKED_JOBS = 2000
+
+def create_job(kind: str, **fields) -> str:
+    """Registers a background job and returns its ID."""
+    # Evict the oldest finished jobs so the registry stays bounded
+    if len(JOBS) >= MAX_TRACKED_JOBS:
+        finished = [j for j in JOBS.values() if j["status"] in ("completed", "failed")]
+        for job in sorted(finished, key=lambda j: j["updated_at"])[:len(JOBS) - MAX_TRACKED_JOBS + 1]:
+            JOBS.pop(job["job_id"], None)
+
+    job_id = f"JOB_{uuid.uuid4().hex[:12]}"
+    now = time.time()
+    JOBS[job_id] = {"job_id": job_id, "kind": kind, "status": "queued",
+                    "created_at": now, "updated_at": now, **fields}
+    return job_id
+
+def update_job(job_id: str, **fields):
+    job = JOBS.get(job_id)
+    if job:
+        job.update(fields)
+        job["updated_at"] = time.time()
+
+def bump_job(job_id: str, **deltas):
+    """Increments a job's progress counters."""
+    job = JOBS.get(job_id)
+    if job:
+        progress = job.setdefault("progress", {})
+        for key, delta in deltas.items():
+            progress[key] = progress.get(key, 0) + delta
+        job["updated_at"] = time.time()
+
+
+# =========================================================
+# 8️⃣ STREAMING UPLOAD INGESTION
+# =========================================================
+ingest_semaphore = asyncio.Semaphore(INGEST_CONCURRENCY)
+
+def _spool_to_unique_file(src, display_name: str) -> str:
+    """
+    Streams a file-like object to a uniquely named file in INGEST_DIR in 1MB chunks.
+    Never holds the whole upload in memory and never collides on equal filenames.
+    """
+    os.makedirs(INGEST_DIR, exist_ok=True)
+    safe_name = clean_filename(os.path.basename(display_name)) or "upload.pdf"
+    dest_path = os.path.join(INGEST_DIR, f"{uuid.uuid4().hex}_{safe_name}")
+    max_bytes = INGEST_MAX_FILE_MB * 1024 * 1024
+    written = 0
     try:
-        print("⏳ LIFESPAN: Connecting to Finance MCP Server...")
-        # Note: In production, wrap this in try/except for timeout robustness
+        with open(dest_path, "wb") as out:
+            while True:
+                chunk = src.read(1024 * 1024)
+                if not chunk:
+                    break
+                written += len(chunk)
+                if written > max_bytes:
+                    raise ValueError(f"{display_name} exceeds {INGEST_MAX_FILE_MB}MB limit")
+                out.write(chunk)
+    except Exception:
+        if os.path.exists(dest_path):
+            os.remove(dest_path)
+        raise
+    return dest_path
+
+def spool_upload(upload: UploadFile) -> List[Dict]:
+    """
+    Expands one uploaded part (PDF, .zip or .tar[.gz]) into spooled PDF files.
+    Returns a list of {"filename", "path"} or {"filename", "error"} entries.
+    """
+    name = upload.filename or "upload"
+    lower = name.lower()
+    spooled = []
+
+    def add(member_name, fileobj):
         try:
-            mcp_tools = await mcp_client.get_tools()    
-            print(f"✅ LIFESPAN: Loaded {len(mcp_tools)} MCP tools")
+            spooled.append({"filename": os.path.basename(member_name), "path": _spool_to_unique_file(fileobj, member_name)})
         except Exception as e:
-             print(f"⚠️ WARN: Could not load MCP tools (check if MCP server is running): {e}")
-             mcp_tools = []
+            spooled.append({"filename": os.path.basename(member_name), "error": str(e)})
+
+    if lower.endswith(".pdf"):
+        add(name, upload.file)
+    elif lower.endswith(".zip"):
+        with zipfile.ZipFile(upload.file) as archive:
+            for info in archive.infolist():
+                if not info.is_dir() and info.filename.lower().endswith(".pdf"):
+                    with archive.open(info) as member:
+                        add(info.filename, member)
+    elif lower.endswith((".tar", ".tar.gz", ".tgz")):
+        # Stream mode ("r|*") reads the archive sequentially without seeking
+        with tarfile.open(fileobj=upload.file, mode="r|*") as archive:
+            for member in archive:
+                if member.isfile() and member.name.lower().endswith(".pdf"):
+                    add(member.name, archive.extractfile(member))
+    else:
+        spooled.append({"filename": name, "error": "Unsupported file type (expected .pdf, .zip or .tar)"})
+    return spooled
+
+def _load_and_split(file_path: str, filename: str):
+    loader = PyPDFLoader(file_path)
+    docs = loader.load()
+    ocr_textless_pages(file_path, docs)
+    for doc in docs:
+        doc.metadata["filename"] = filename
+    text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200, add_start_index=True)
+    return text_splitter.split_documents(docs)
 
-        all_tools = mcp_tools
-        
-        print("📊 LIFESPAN: Compiling LangGraph with Memory...")
-        # app_state["graph"] = create_agent_graph(all_tools)
-        print("🚀 LIFESPAN: Graph Ready.")
-        
-        yield
-        
+@traceable(run_type="chain", name="PDF Ingestion Pipeline")
+async def ingest_pipeline(job_id: str, file_path: str, filename: str):
+    """Background stage: parse -> chunk -> embed a spooled upload, then drop the spool file."""
+    async with ingest_semaphore:
+        update_job(job_id, status="running")
+        try:
+            splits = await asyncio.to_thread(_load_and_split, file_path, filename)
+            if not splits:
+                update_job(job_id, status="failed", error="No text could be extracted.")
+                return
+
+            vectorstore = get_vectorstore()
+            await asyncio.to_thread(vectorstore.add_documents, splits)
+            update_job(job_id, status="completed", chunks_added=len(splits))
+            print(f"✅ INGEST: Added {len(splits)} chunks from {filename} ({job_id}).")
+        except Exception as e:
+            print(f"❌ INGEST ERROR ({job_id}): {e}")
+            update_job(job_id, status="failed", error=str(e))
+        finally:
+            if os.path.exists(file_path):
+                os.remove(file_path)
+
+
+# =========================================================
+# 8️⃣ SCRAPE & CRAWL JOBS
+# =========================================================
+def _new_scrape_job(kind: str, urls: List[str]) -> str:
+    return create_job(kind, urls=urls, files=[], errors=[], progress={
+        "pages_fetched": 0, "pdfs_found": 0, "pdfs_downloaded": 0,
+        "extracted": 0, "embedded": 0, "skipped": 0, "failed": 0,
+    })
+
+async def _extract_for_job(job_id: str, file_path: str):
+    async with ingest_semaphore:
+        await extract_and_store(file_path, on_stage=lambda stage: bump_job(job_id, **{stage: 1}))
+
+def _queue_extraction(job_id: str, filename: str, extractions: list):
+    """Starts extraction once per file name per job."""
+    files = JOBS[job_id]["files"]
+    if filename in files:
+        return
+    files.append(filename)
+    extractions.append(asyncio.create_task(_extract_for_job(job_id, os.path.join(SCRAPE_DIR, filename))))
+
+async def _finish_scrape_job(job_id: str, extractions: list):
+    await asyncio.gather(*extractions)
+    job = JOBS[job_id]
+    progress = job["progress"]
+    update_job(job_id, status="completed", message=(
+        f"{progress['pages_fetched']} pages, {progress['pdfs_downloaded']} PDFs downloaded, "
+        f"{progress['embedded']} grants embedded, {progress['failed']} failed."
+    ))
+    print(f"✅ JOB {job_id}: {job['message']}")
+
+async def run_scrape_job(job_id: str, urls: List[str]):
+    """Scrapes every listing page (in parallel, politeness per domain) and extracts each new PDF."""
+    update_job(job_id, status="running")
+    extractions = []
+    scrape_slots = asyncio.Semaphore(SCRAPE_CONCURRENCY)
+
+    async def scrape(url: str):
+        print(f"📥 SCRAPE REQUEST: {url}")
+        try:
+            async with scrape_slots:
+                files = await asyncio.to_thread(perform_scraping, url, SCRAPE_DIR)
+            bump_job(job_id, pages_fetched=1, pdfs_found=len(files), pdfs_downloaded=len(files))
+            for filename in files:
+                _queue_extraction(job_id, filename, extractions)
+        except Exception as e:
+            print(f"❌ Error scraping {url}: {e}")
+            JOBS[job_id]["errors"].append(f"Error at {url}: {e}")
+            bump_job(job_id, failed=1)
+
+    try:
+        await asyncio.gather(*(scrape(url) for url in urls))
+        await _finish_scrape_job(job_id, extractions)
     except Exception as e:
-        print(f"❌ LIFESPAN ERROR: {e}")
-        raise e
-    
-    print("🛑 LIFESPAN: Application shutdown.")
+        print(f"❌ SCRAPE JOB {job_id} FAILED: {e}")
+        update_job(job_id, status="failed", error=str(e))
+
+async def run_crawl_job(job_id: str, urls: List[str]):
+    """Crawls all sites in one engine run, downloading and extracting PDFs as they stream in."""
+    update_job(job_id, status="running")
+    os.makedirs(SCRAPE_DIR, exist_ok=True)
+    extractions, downloads, sites = [], [], []
+    seen_links = set()  # Several sites may link the same PDF
+    download_slots = asyncio.Semaphore(CRAWL_DOWNLOAD_CONCURRENCY)
+
+    async def fetch(item: dict):
+        # Downloads run beside the stream so the crawl worker is never blocked on its output
+        async with download_slots:
+            anchor = item.get("anchor") or ""
+            hint = anchor if len(anchor) > 5 else f"Crawled_{item['site']}"
+            fname = await asyncio.to_thread(download_pdf, item["pdf_link"], SCRAPE_DIR, hint, True)
+        if fname:
+            bump_job(job_id, pdfs_downloaded=1)
+            _queue_extraction(job_id, fname, extractions)
+        else:
+            bump_job(job_id, failed=1)
+
+    try:
+        async for item in stream_crawl([profile_for_url(url) for url in urls]):
+            if item["type"] == "page":
+                bump_job(job_id, pages_fetched=1)
+            elif item["type"] == "pdf" and item["pdf_link"] not in seen_links:
+                seen_links.add(item["pdf_link"])
+                bump_job(job_id, pdfs_found=1)
+                downloads.append(asyncio.create_task(fetch(item)))
+            elif item["type"] == "site_done":
+                sites.append(item)
+                update_job(job_id, sites=sites)
+            elif item["type"] == "error":
+                print(f"❌ CRAWL ERROR: {item['message']}")
+                update_job(job_id, errors=JOBS[job_id]["errors"] + [item["message"]])
+        await asyncio.gather(*downloads)
+        await _finish_scrape_job(job_id, extractions)
+    except Exception as e:
+        print(f"❌ CRAWL JOB {job_id} FAILED: {e}")
+        update_job(job_id, status="failed", error=str(e))
+
+async def job_events(job_id: str):
+    """Server-sent events: a 'progress' event whenever the job changes, then 'done'."""
+    last_update = None
+    last_sent = time.monotonic()
+    while True:
+        job = JOBS.get(job_id)
+        if job is None:
+            yield f"event: error\ndata: {json.dumps({'detail': f'Unknown job {job_id}'})}\n\n"
+            return
+        if job["updated_at"] != last_update:
+            last_update = job["updated_at"]
+            last_sent = time.monotonic()
+            yield f"event: progress\ndata: {json.dumps(job, default=str)}\n\n"
+            if job["status"] in ("completed", "failed"):
+                yield f"event: done\ndata: {json.dumps({'status': job['status']})}\n\n"
+                return
+        elif time.monotonic() - last_sent > 15:
+            last_sent = time.monotonic()
+            yield ": keep-alive\n\n"
+        await asyncio.sleep(JOB_EVENT_INTERVAL)
 
 
 # =========================================================
-# 7️⃣ FASTAPI APP
+# 9️⃣ FASTAPI APP
 # =========================================================
 app = FastAPI(title="Unified GenAI Platform (HITL Enabled)", lifespan=lifespan)
 
@@ -957,6 +2086,93 @@ class MatchRequest(BaseModel):
     sme_profile: SMEProfile
 
 
+# --- CHAT AGENT ENDPOINT ---
+@app.post("/chat")
+async def chat_endpoint(request: ChatRequest):
+    """
+    LangGraph agent with per-thread persistent memory and HITL tool approval.
+    action=None -> new message, 'resume' -> approve pending tool call,
+    'feedback' -> reject pending tool call with feedback_text.
+    """
+    graph = app_state.get("graph")
+    if graph is None:
+        raise HTTPException(status_code=503, detail="Agent graph is not initialised.")
+
+    config = {"configurable": {"thread_id": request.thread_id}}
+    try:
+        if request.action == "resume":
+            inputs = None
+        elif request.action == "feedback":
+            state = await graph.aget_state(config)
+            pending = state.values["messages"][-1] if state.values.get("messages") else None
+            if not pending or not getattr(pending, "tool_calls", None):
+                raise HTTPException(status_code=400, detail="No pending action to give feedback on.")
+            rejection = [
+                ToolMessage(content=f"User rejected this action. Feedback: {request.feedback_text}",
+                            tool_call_id=tc["id"], name=tc["name"])
+                for tc in pending.tool_calls
+            ]
+            await graph.aupdate_state(config, {"messages": rejection}, as_node="tools")
+            inputs = None
+        else:
+            if not request.message:
+                raise HTTPException(status_code=400, detail="message is required.")
+            inputs = {"messages": [HumanMessage(content=request.message)]}
+
+        result = await graph.ainvoke(inputs, config)
+        await prune_checkpoints(request.thread_id)
+
+        # HITL: graph paused before running a tool
+        state = await graph.aget_state(config)
+        if state.next and "tools" in state.next:
+            tool_call = state.values["messages"][-1].tool_calls[0]
+            return {
+                "status": "requires_approval",
+                "response": f"I want to run `{tool_call['name']}`. Do you approve?",
+                "tool_call": {"name": tool_call["name"], "args": tool_call["args"]},
+            }
+
+        return {"status": "success", "response": result["messages"][-1].content}
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"❌ CHAT ERROR: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/gc/sweep")
+async def gc_sweep():
+    return await asyncio.to_thread(grant_gc.sweep)
+
+@app.get("/gc/stats")
+async def gc_stats():
+    return {"interval_seconds": GC_INTERVAL_SECONDS, "last_sweep": grant_gc.last_report}
+
+@app.get("/crawl/stats")
+async def crawl_stats():
+    """Per-domain throughput / latency / error stats: scraper (this process) and spiders (published)."""
+    return {"scraper": crawl_policy.get_stats(), "spiders": load_published_stats()}
+
+@app.get("/grant-index/stats")
+async def grant_index_stats():
+    return grant_index.get_stats()
+
+@app.get("/mcp/stats")
+async def mcp_stats():
+    return mcp_manager.get_stats()
+
+@app.post("/mcp/tools/refresh")
+async def mcp_tools_refresh():
+    """Re-lists the Finance MCP tools; the agent graph is recompiled if they changed."""
+    try:
+        changed = await mcp_manager.refresh_tools()
+    except Exception as e:
+        raise HTTPException(status_code=503, detail=f"MCP server unavailable: {e}")
+    stats = mcp_manager.get_stats()
+    return {"changed": changed, "tools": stats["cached_tools"], "tools_hash": stats["tools_hash"]}
+
+
 # --- NEW: Error Reporting Endpoint ---
 @app.post("/report-error")
 async def report_error_endpoint(report: ErrorReport):
@@ -967,28 +2183,74 @@ async def execute_feedback_loop(report: ErrorReport):
     """
     Trigger the Self-Learning Loop.
     1. Retrieve the document text from Vector Store (using grant_id).
-    2. Call the Prompt Engineer to update rules.
-    3. Delete the bad node from Neo4j (Clean up).
+    2. Add the document to the labelled eval corpus as a negative example.
+    3. Queue the report; the aggregator revises the rules once per batch window.
     """
     print(f"⚠️ FEEDBACK: User flagged grant {report.grant_id}. Reason: {report.user_feedback}")
     
-    # 1. Get Context
-    vs = get_vectorstore()
-    retriever = vs.as_retriever(search_kwargs={"k": 20, "filter": {"grant_id": report.grant_id}})
-    docs = retriever.invoke("What is this document?")
+    # 1. Get Context (direct lookup of the grant's chunks, in document order)
+    docs = (await asyncio.to_thread(grant_index.get_chunks, report.grant_id))[:20]
     
     context_snippet = docs[0].page_content if docs else "No text found."
+
+    # 2. Label the full document text (parsed cache) for offline evaluation
+    if docs:
+        full_text = "\n".join(d.page_content for d in docs)
+        filename = docs[0].metadata.get("filename")
+        if filename:
+            try:
+                pages = await asyncio.to_thread(load_document_pages, os.path.join(SCRAPE_DIR, filename))
+                full_text = "\n".join(p.page_content for p in pages)
+            except Exception:
+                pass
+        eval_corpus.add(report.grant_id, "irrelevant", full_text, source=filename or "")
     
-    # 2. Self-Correction
-    success = await optimize_prompt_logic(report.user_feedback, context_snippet)
-    
-    # 3. Cleanup Bad Data
-    if success:
-        with neo4j_handler.driver.session() as session:
-            session.run("MATCH (g:Grant {id: $id}) DETACH DELETE g", id=report.grant_id)
-            print(f"🗑️ CLEANUP: Deleted bad grant node {report.grant_id}")
-            
-    return {"status": "success", "message": "System has learned from your feedback. The bad entry was removed and rules updated."}
+    # 3. Queue for the next consolidated revision
+    pending = await feedback_aggregator.submit({
+        "grant_id": report.grant_id,
+        "user_feedback": report.user_feedback,
+        "snippet": context_snippet,
+    })
+    return {
+        "status": "queued",
+        "message": "Thank you! Your feedback is queued and the rules will be revised in the next learning batch.",
+        "pending_reports": pending,
+        "window_seconds": FEEDBACK_WINDOW_SECONDS,
+    }
+
+class EvalExample(BaseModel):
+    grant_id: str
+    label: Literal['relevant', 'irrelevant']
+
+@app.post("/feedback/label")
+async def label_eval_example(example: EvalExample):
+    """Adds a grant's document to the labelled eval corpus (e.g. confirm a correct extraction)."""
+    with neo4j_handler.driver.session() as session:
+        record = session.run("MATCH (g:Grant {id: $id}) RETURN g.filename AS filename", id=example.grant_id).single()
+    if not record or not record["filename"]:
+        raise HTTPException(status_code=404, detail=f"Unknown grant {example.grant_id}")
+    try:
+        pages = await asyncio.to_thread(load_document_pages, os.path.join(SCRAPE_DIR, record["filename"]))
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    eval_corpus.add(example.grant_id, example.label, "\n".join(p.page_content for p in pages), source=record["filename"])
+    return {"status": "success", "corpus_size": len(eval_corpus.examples)}
+
+@app.post("/feedback/flush")
+async def flush_feedback():
+    """Processes the pending feedback batch now instead of waiting for the window."""
+    report = await feedback_aggregator.flush()
+    return report or {"status": "empty", "message": "No pending feedback."}
+
+@app.get("/feedback/status")
+async def feedback_status():
+    return {
+        "pending_reports": len(feedback_aggregator.pending),
+        "window_seconds": FEEDBACK_WINDOW_SECONDS,
+        "corpus_size": len(eval_corpus.examples),
+        "active_prompt_version": prompt_registry.active_version,
+        "recent_revisions": feedback_aggregator.history[-10:],
+    }
 
 
 # --- MATCH ENDPOINT ---
@@ -1011,148 +2273,330 @@ async def execute_match_pipeline(sme_profile: SMEProfile):
     return {"status": "success", "matches": matches, "top_match_checklist": checklist}
 
 
-@app.post("/crawl")
-async def crawl_endpoint(request: ScrapeRequest, background_tasks: BackgroundTasks):
-    """
-    1. Runs Scrapy Spider to find URLs.
-    2. Extracts unique source URLs.
-    3. Runs Scrape + Extraction on each unique URL found.
-    """
-    print(f"🕷️ CRAWL REQUEST: {request.url}")
-    
-    # 1. Run Scrapy as Subprocess
-    try:
-        # NOTE: Assumes 'crawler_spider.py' is in the same folder
-        subprocess.run(
-            ["scrapy", "runspider", "crawler_spider.py", "-a", f"start_url={request.url}", "-O", "crawled_output.json"], 
-            check=True
-        )
-    except subprocess.CalledProcessError as e:
-        raise HTTPException(status_code=500, detail=f"Crawler failed: {e}")
-
-    # 2. Process Output
-    if not os.path.exists("crawled_output.json"):
-        return {"status": "warning", "message": "Crawler finished but no output file found."}
+# --- Bulk matching (portfolio onboarding) ---
+MATCH_BATCH_SIZE = int(os.getenv("MATCH_BATCH_SIZE", "200"))    # Profiles per UNWIND round trip
+MATCH_CONCURRENCY = int(os.getenv("MATCH_CONCURRENCY", "4"))    # Batches in flight against Neo4j
+
+# Spreadsheet headers accepted for SMEProfile fields (lower-cased)
+PROFILE_COLUMN_ALIASES = {
+    "industry": "sector_category",
+    "sector": "sector_category",
+    "size": "sme_size",
+    "state": "location_state",
+    "city": "location_city",
+    "udyam": "udyam_status",
+    "udyam_registered": "udyam_status",
+    "project_need": "project_need_description",
+    "description": "project_need_description",
+}
 
-    with open("crawled_output.json", "r") as f:
+def _profile_from_row(row: Dict, defaults: Dict) -> SMEProfile:
+    data = dict(defaults)
+    for key, value in row.items():
+        if value is None or (isinstance(value, float) and value != value):  # Skip empty / NaN cells
+            continue
+        field = str(key).strip().lower().replace(" ", "_")
+        data[PROFILE_COLUMN_ALIASES.get(field, field)] = value
+    if not data.get("location_state") and data.get("location_city"):
+        # City-only registers: known cities map to their state, others stay unresolved (row error)
+        state = state_for_city(str(data["location_city"]))
+        if state:
+            data["location_state"] = state
+    if isinstance(data.get("udyam_status"), str):
+        data["udyam_status"] = data["udyam_status"].strip().lower() in ("true", "yes", "y", "1")
+    if not data.get("project_need_description") and data.get("sector_category"):
+        # Registers without a free-text need: search by sector
+        data["project_need_description"] = str(data["sector_category"])
+    for field in ("sector_category", "financial_performance", "location_state", "project_need_description"):
+        if field in data:
+            data[field] = str(data[field])
+    return SMEProfile(**{k: v for k, v in data.items() if k in SMEProfile.model_fields})
+
+def parse_profile_file(fileobj, filename: str, defaults: Dict) -> Tuple[List[Tuple[int, SMEProfile]], List[Dict]]:
+    """Reads JSON lines, a JSON array, CSV or Excel. Returns ([(row, profile)], [row errors])."""
+    name = (filename or "").lower()
+    errors = []
+    if name.endswith((".jsonl", ".ndjson")):
+        rows = []
+        lines = [line for line in io.TextIOWrapper(fileobj, encoding="utf-8") if line.strip()]
+        for i, line in enumerate(lines):
+            try:
+                rows.append(json.loads(line))
+            except json.JSONDecodeError as e:
+                rows.append(None)  # Keeps row numbers aligned with the file
+                errors.append({"row": i, "status": "invalid", "error": f"Invalid JSON: {e}"})
+    elif name.endswith(".json"):
+        try:
+            data = json.load(io.TextIOWrapper(fileobj, encoding="utf-8"))
+        except json.JSONDecodeError as e:
+            raise HTTPException(status_code=400, detail=f"Invalid JSON file: {e}")
+        if isinstance(data, dict):
+            # {"profiles": [...]} or a single profile object
+            data = next((v for v in data.values() if isinstance(v, list)), [data])
+        rows = data if isinstance(data, list) else []
+    elif name.endswith(".csv"):
+        rows = pd.read_csv(fileobj).to_dict(orient="records")
+    elif name.endswith((".xlsx", ".xls")):
+        rows = pd.read_excel(fileobj).to_dict(orient="records")
+    else:
+        raise HTTPException(status_code=400, detail="Unsupported file type (expected .jsonl, .json, .csv or .xlsx)")
+
+    profiles = []
+    for i, row in enumerate(rows):
+        if row is None:
+            continue  # Already reported
+        if not isinstance(row, dict):
+            errors.append({"row": i, "status": "invalid", "error": "Expected a JSON object per profile"})
+            continue
         try:
-            crawled_data = json.load(f)
-        except json.JSONDecodeError:
-            return {"status": "warning", "message": "Crawler output is empty."}
+            profiles.append((i, _profile_from_row(row, defaults)))
+        except ValidationError as e:
+            errors.append({"row": i, "status": "invalid", "error": _format_validation_errors(e)})
+    return profiles, errors
 
-    # 3. Extract Unique Source URLs (Pages that contain PDFs)
-    # The user asked to pass "source_url" to perform_scraping.
-    # We will also pass the direct PDF links if available to save time.
-    
-    unique_sources = list(set([item['source_url'] for item in crawled_data if 'source_url' in item]))
-    print(f"✅ Found {len(unique_sources)} unique pages with PDFs.")
-    
-    files_queued = []
-    
-    # 4. Trigger Scraping for each Source URL
-    for source_url in unique_sources:
-        print(f"📥 Triggering Scrape for: {source_url}")
-        new_files = perform_scraping(source_url, SCRAPE_DIR)
-        
-        for f in new_files:
-            if f not in files_queued:
-                full_path = os.path.join(SCRAPE_DIR, f)
-                background_tasks.add_task(extract_and_store, full_path)
-                files_queued.append(f)
+async def stream_bulk_matches(profiles: List[Tuple[int, SMEProfile]], errors: List[Dict], include_checklist: bool):
+    """Yields one NDJSON line per SME as its batch completes, then a summary line."""
+    start = time.perf_counter()
+    for err in errors:
+        yield json.dumps(err) + "\n"
 
-    return {
-        "status": "success", 
-        "message": f"Crawled {len(unique_sources)} pages. Queued {len(files_queued)} PDFs for analysis.",
-        "pages_found": unique_sources,
-        "files_queued": files_queued
+    semaphore = asyncio.Semaphore(MATCH_CONCURRENCY)
+
+    async def score_batch(batch):
+        async with semaphore:
+            try:
+                return batch, await asyncio.to_thread(run_match_query, [sme for _, sme in batch]), None
+            except Exception as e:
+                return batch, None, str(e)
+
+    batches = [profiles[i:i + MATCH_BATCH_SIZE] for i in range(0, len(profiles), MATCH_BATCH_SIZE)]
+    matched = failed = 0
+    for next_done in asyncio.as_completed([score_batch(b) for b in batches]):
+        batch, results, error = await next_done
+        for n, (row, sme) in enumerate(batch):
+            if error:
+                failed += 1
+                yield json.dumps({"row": row, "email": sme.email, "status": "error", "error": error}) + "\n"
+                continue
+            matches = results[n]
+            line = {"row": row, "email": sme.email, "status": "success" if matches else "no_match", "matches": matches}
+            if include_checklist and matches:
+                line["top_match_checklist"] = await generate_application_checklist(matches[0]["title"], sme)
+            matched += 1 if matches else 0
+            yield json.dumps(line, default=str) + "\n"
+
+    summary = {
+        "profiles": len(profiles) + len(errors),
+        "invalid": len(errors),
+        "matched": matched,
+        "failed": failed,
+        "batches": len(batches),
+        "seconds": round(time.perf_counter() - start, 3),
     }
+    print(f"📋 BULK MATCH: {summary}")
+    yield json.dumps({"summary": summary}) + "\n"
+
+@app.post("/match-grants/bulk")
+async def bulk_match_endpoint(file: UploadFile = File(...),
+                              include_checklist: bool = False,
+                              defaults: Optional[str] = Form(None)):
+    """
+    Scores a whole portfolio (JSON lines, JSON array, CSV or Excel, e.g. sme_data.xlsx).
+    `defaults` is a JSON object applied to fields missing from the file.
+    Results stream back as NDJSON; LLM checklists only with include_checklist=true.
+    """
+    try:
+        default_fields = json.loads(defaults) if defaults else {}
+    except json.JSONDecodeError:
+        raise HTTPException(status_code=400, detail="defaults must be a JSON object")
+    profiles, errors = await asyncio.to_thread(parse_profile_file, file.file, file.filename, default_fields)
+    print(f"📋 BULK MATCH: {len(profiles)} valid profiles, {len(errors)} invalid rows from {file.filename}")
+    return StreamingResponse(stream_bulk_matches(profiles, errors, include_checklist), media_type="application/x-ndjson")
+
+
+@app.get("/grants")
+async def list_grants_endpoint(cursor: Optional[str] = None, limit: int = 20,
+                               funding_type: Optional[str] = None, vertical: Optional[str] = None,
+                               size: Optional[str] = None, region: Optional[str] = None,
+                               include_facets: bool = True):
+    """
+    Browses the grant catalogue with keyset (cursor) pagination.
+    `next_cursor` is opaque; pass it back to get the following page.
+    Facet counts are global and maintained incrementally at ingest / deletion.
+    """
+    limit = max(1, min(limit, GRANTS_PAGE_MAX))
+    try:
+        after = base64.urlsafe_b64decode(cursor.encode()).decode() if cursor else None
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    region_key = None
+    if region:
+        region_key = resolve_sme_state(region)
+        if region_key is None:
+            raise HTTPException(status_code=400, detail=f"Unknown region '{region}'")
+
+    # One extra row tells us whether another page exists
+    rows = await asyncio.to_thread(neo4j_handler.list_grants, after, limit + 1,
+                                   funding_type, vertical, size, region_key)
+    has_more = len(rows) > limit
+    grants = rows[:limit]
+    next_cursor = base64.urlsafe_b64encode(grants[-1]["id"].encode()).decode() if has_more else None
+
+    response = {"grants": grants, "next_cursor": next_cursor}
+    if include_facets:
+        response["facets"] = await asyncio.to_thread(neo4j_handler.get_facets)
+    return response
+
+@app.post("/crawl", status_code=202)
+async def crawl_endpoint(request: ScrapeRequest, background_tasks: BackgroundTasks):
+    """
+    Queues a crawl of every URL (crawl engine, all sites in parallel) and returns a job
+    handle at once. PDFs are downloaded and extracted as the crawl streams them;
+    follow progress via /jobs/{job_id} or the /jobs/{job_id}/events stream.
+    """
+    if not request.urls:
+        raise HTTPException(status_code=400, detail="No URLs given.")
+    print(f"🕷️ CRAWL REQUEST: {', '.join(request.urls)}")
+    job_id = _new_scrape_job("crawl", request.urls)
+    background_tasks.add_task(run_crawl_job, job_id, request.urls)
+    return {"status": "accepted", "job_id": job_id,
+            "status_url": f"/jobs/{job_id}", "events_url": f"/jobs/{job_id}/events"}
 
 
 # --- THE AUTOMATED ENDPOINT (UPDATED) ---
-@app.post("/scrape")
+@app.post("/scrape", status_code=202)
 async def scrape_endpoint(request: ScrapeRequest, background_tasks: BackgroundTasks):
     """
-    1. Scrapes PDFs from a LIST of URLs.
-    2. Automatically schedules them for AI Extraction & Neo4j Ingestion.
+    Queues scraping of a LIST of URLs and returns a job handle at once.
+    Downloads, AI extraction and Neo4j/Chroma ingestion all run in the background;
+    follow progress via /jobs/{job_id} or the /jobs/{job_id}/events stream.
+    """
+    if not request.urls:
+        raise HTTPException(status_code=400, detail="No URLs given.")
+    job_id = _new_scrape_job("scrape", request.urls)
+    background_tasks.add_task(run_scrape_job, job_id, request.urls)
+    return {"status": "accepted", "job_id": job_id,
+            "status_url": f"/jobs/{job_id}", "events_url": f"/jobs/{job_id}/events"}
+
+
+@app.post("/ingest", status_code=202)
+async def ingest_document(background_tasks: BackgroundTasks,
+                          files: List[UploadFile] = File(None),
+                          file: Optional[UploadFile] = File(None)):
     """
-    all_files_queued = []
-    status_messages = []
+    Accepts many PDFs per request (repeated 'files' parts, a single 'file' part,
+    or .zip/.tar archives of PDFs), spools each to a unique file and returns job IDs
+    immediately. Parsing, chunking and embedding run in the background.
+    """
+    uploads = list(files or []) + ([file] if file else [])
+    if not uploads:
+        raise HTTPException(status_code=400, detail="No files uploaded.")
 
-    try:
-        for url in request.urls:
-            print(f"📥 SCRAPE REQUEST: {url}")
-            
-            # 1. Perform Scraping for this specific URL
-            # We wrap this in a try/except so one bad URL doesn't fail the whole batch
-            try:
-                files = perform_scraping(url, SCRAPE_DIR)
-                
-                if not files:
-                    status_messages.append(f"No PDFs found at {url}")
-                    continue
-                
-                # 2. Queue for Extraction
-                for filename in files:
-                    # Avoid re-queuing duplicates if multiple sites link to the same file name
-                    if filename not in all_files_queued:
-                        full_path = os.path.join(SCRAPE_DIR, filename)
-                        background_tasks.add_task(extract_and_store, full_path)
-                        all_files_queued.append(filename)
-                
-                status_messages.append(f"Found {len(files)} PDFs at {url}")
+    jobs, rejected = [], []
+    for upload in uploads:
+        print(f"📥 INGEST: Received {upload.filename}")
+        try:
+            spooled = await asyncio.to_thread(spool_upload, upload)
+        except (zipfile.BadZipFile, tarfile.TarError) as e:
+            rejected.append({"filename": upload.filename, "error": f"Corrupt archive: {e}"})
+            continue
 
-            except Exception as e:
-                print(f"❌ Error scraping {url}: {e}")
-                status_messages.append(f"Error at {url}: {str(e)}")
+        for item in spooled:
+            if "error" in item:
+                rejected.append(item)
+                continue
+            job_id = create_job("ingest", filename=item["filename"])
+            background_tasks.add_task(ingest_pipeline, job_id, item["path"], item["filename"])
+            jobs.append({"job_id": job_id, "filename": item["filename"]})
 
-        if not all_files_queued:
-            return {
-                "status": "warning", 
-                "message": "Process completed but no PDFs were downloaded.",
-                "details": status_messages
-            }
-        
-        return {
-            "status": "success", 
-            "message": f"Downloaded {len(all_files_queued)} unique files across {len(request.urls)} sites. Processing in background.",
-            "files_queued": all_files_queued,
-            "details": status_messages
-        }
+    if not jobs:
+        raise HTTPException(status_code=400, detail={"message": "No PDFs could be queued.", "rejected": rejected})
 
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    return {
+        "status": "accepted",
+        "message": f"Queued {len(jobs)} PDFs for ingestion.",
+        "job_ids": [j["job_id"] for j in jobs],
+        "jobs": jobs,
+        "rejected": rejected,
+    }
 
-    
-@app.post("/ingest")
-@traceable(run_type="chain", name="PDF Ingestion Pipeline")
-async def ingest_document(file: UploadFile = File(...)):
-    print(f"📥 INGEST: Received file {file.filename}")
-    file_path = f"temp_{file.filename}"
+@app.get("/jobs/{job_id}")
+async def get_job_status(job_id: str):
+    job = JOBS.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail=f"Unknown job {job_id}")
+    return job
+
+@app.get("/jobs/{job_id}/events")
+async def get_job_events(job_id: str):
+    if job_id not in JOBS:
+        raise HTTPException(status_code=404, detail=f"Unknown job {job_id}")
+    return StreamingResponse(job_events(job_id), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+# --- PROMPT REGISTRY ENDPOINTS ---
+class PromptActivateRequest(BaseModel):
+    version: int
+
+@app.get("/prompts")
+async def list_prompt_versions():
+    return prompt_registry.list_versions()
+
+@app.post("/prompts/activate")
+async def activate_prompt_version(request: PromptActivateRequest):
     try:
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-            
-        loader = PyPDFLoader(file_path)
-        docs = loader.load()
-        text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
-        splits = text_splitter.split_documents(docs)
-        
-        if not splits:
-            return {"status": "error", "message": "No text could be extracted."}
+        prompt_registry.activate(request.version)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    return {"status": "success", "active": request.version}
+
+@traceable(run_type="chain", name="Targeted Re-Extraction")
+async def reextract_outdated_grants(job_id: str):
+    """Re-runs extraction (from cached parsed text) only for grants stamped with an old prompt version."""
+    version = prompt_registry.active_version
+    outdated = neo4j_handler.find_outdated_grants(version)
+    update_job(job_id, status="running", prompt_version=version, total=len(outdated), done=0, removed_or_failed=0)
+    print(f"♻️ REEXTRACT: {len(outdated)} grants to refresh under prompt v{version}")
+
+    for i, grant in enumerate(outdated):
+        if not grant.get("filename"):
+            JOBS[job_id]["removed_or_failed"] += 1
+            continue
+        file_path = os.path.join(SCRAPE_DIR, grant["filename"])
+        result = await extract_and_store(file_path, reuse_grant_id=grant["id"])
+        if result is None:
+            # Either rejected by the new rules (grant removed) or could not be processed
+            JOBS[job_id]["removed_or_failed"] += 1
+        update_job(job_id, done=i + 1)
+
+    update_job(job_id, status="completed")
+
+async def resume_incomplete_ingestions() -> Dict:
+    """Re-runs documents whose ingestion stopped mid-way; each resumes at its failed stage."""
+    entries = ingest_outbox.incomplete(INGEST_MAX_ATTEMPTS)
+    if entries:
+        print(f"♻️ OUTBOX: Resuming {len(entries)} incomplete ingestions...")
+    resumed = 0
+    for entry in entries:
+        if entry["file_path"] and await extract_and_store(entry["file_path"]):
+            resumed += 1
+    return {"incomplete": len(entries), "resumed": resumed}
+
+@app.get("/ingest/outbox")
+async def ingest_outbox_status():
+    return {**ingest_outbox.get_stats(), "incomplete": ingest_outbox.incomplete(INGEST_MAX_ATTEMPTS)}
+
+@app.post("/ingest/outbox/resume")
+async def ingest_outbox_resume():
+    return await resume_incomplete_ingestions()
+
+@app.post("/prompts/reextract", status_code=202)
+async def reextract_endpoint(background_tasks: BackgroundTasks):
+    job_id = create_job("reextract")
+    background_tasks.add_task(reextract_outdated_grants, job_id)
+    return {"status": "accepted", "job_id": job_id}
 
-        vectorstore = get_vectorstore()
-        vectorstore.add_documents(splits)
-        print(f"✅ INGEST: Added {len(splits)} chunks to DB.")
-        
-        return {"status": "success", "chunks_added": len(splits), "filename": file.filename}
-
-    except Exception as e:
-        print(f"❌ INGEST ERROR: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
-        
-    finally:
-        if os.path.exists(file_path):
-            os.remove(file_path)
 
 @app.post("/grant-qa")
 async def grant_qa_endpoint(request: GrantQARequest):
@@ -1162,26 +2606,21 @@ async def grant_qa_endpoint(request: GrantQARequest):
     print(f"❓ RAG: Question on Grant {request.grant_id}: {request.question}")
     
     try:
-        vectorstore = get_vectorstore()
-        
-        # 1. Create Filtered Retriever
+        # 1. Exact search inside this grant's partition (over-fetch; packing trims to the token budget)
         # This ensures we ONLY retrieve chunks belonging to this specific Grant ID
-        retriever = vectorstore.as_retriever(
-            search_kwargs={
-                "k": 10,
-                "filter": {"grant_id": request.grant_id} 
-            }
-        )
-        
-        # 2. Get Context
-        docs = retriever.invoke(request.question)
-        if not docs:
+        results = await asyncio.to_thread(grant_index.search, request.grant_id, request.question, GRANT_QA_FETCH_K)
+        if not results:
             return {
                 "answer": "I couldn't find any specific details in the document for this grant. It might not have been processed correctly.",
                 "sources": []
             }
-            
-        context_text = "\n\n".join([d.page_content for d in docs])
+        docs = [d for d, _ in results]
+        scores = [score for _, score in results]
+
+        # 2. Pack Context (merge overlapping chunks, MMR, token budget)
+        context_text, passages, context_stats = pack_context(docs, scores)
+        print(f"📦 RAG: {context_stats['chunks_retrieved']} chunks -> {context_stats['passages_used']} passages, "
+              f"{context_stats['tokens_packed']} tokens ({context_stats['tokens_saved']} saved).")
         
         # 3. Generate Answer
         rag_prompt = f"""
@@ -1196,18 +2635,18 @@ async def grant_qa_endpoint(request: GrantQARequest):
         {request.question}
         """
         
-        response = llm.invoke(rag_prompt)
+        response = await llm.ainvoke(rag_prompt)
 
-        # Return distinct filenames instead of full source paths
+        # Return distinct filenames of the passages actually used
         seen_files = set()
         sources = []
-        for d in docs:
-            fname = d.metadata.get("filename", "unknown.pdf") # <--- GET FILENAME
+        for p in passages:
+            fname = p["metadata"].get("filename", "unknown.pdf")
             if fname not in seen_files:
                 sources.append(fname)
                 seen_files.add(fname)
                 
-        return {"answer": response.content, "sources": sources}
+        return {"answer": response.content, "sources": sources, "context_stats": context_stats}
 
     except Exception as e:
         print(f"❌ RAG ERROR: {e}")
@@ -0,0 +1,284 @@
+# filename: mcp_session_manager.py
+"""
+Long-lived, pooled MCP client for the Finance MCP server.
+
+- Connects lazily (first tool call), not on every startup.
+- Caches the discovered tool list in memory and on disk; the cache is re-checked
+  against the server after the first successful connect (or on refresh_tools),
+  and on_tools_changed is called when the tool set differs.
+- Keeps a pool of SSE sessions so concurrent tool calls are multiplexed.
+- Reconnects dead sessions with exponential backoff.
+"""
+import os
+import json
+import time
+import hashlib
+import asyncio
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from mcp import ClientSession
+from mcp.client.sse import sse_client
+from langchain_core.tools import StructuredTool, ToolException
+
+MCP_FINANCE_URL = os.getenv("MCP_FINANCE_URL", "http://localhost:8001/mcp/sse")
+MCP_POOL_SIZE = int(os.getenv("MCP_POOL_SIZE", "4"))
+MCP_TOOLS_CACHE = os.getenv("MCP_TOOLS_CACHE", "mcp_tools_cache.json")
+MCP_MAX_RECONNECT_ATTEMPTS = int(os.getenv("MCP_MAX_RECONNECT_ATTEMPTS", "5"))
+MCP_CALL_TIMEOUT = float(os.getenv("MCP_CALL_TIMEOUT", "60"))
+
+
+class _PooledSession:
+    """
+    Owns one SSE connection inside its own task. anyio cancel scopes must be
+    entered and exited by the same task, so the session lives in a dedicated runner.
+    """
+    def __init__(self, url: str):
+        self.url = url
+        self.session: Optional[ClientSession] = None
+        self._ready: asyncio.Future = asyncio.get_running_loop().create_future()
+        self._stop = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        try:
+            async with sse_client(self.url) as (read, write):
+                async with ClientSession(read, write) as session:
+                    await session.initialize()
+                    self.session = session
+                    self._ready.set_result(session)
+                    await self._stop.wait()
+        except Exception as e:
+            if not self._ready.done():
+                self._ready.set_exception(e)
+        finally:
+            self.session = None
+
+    async def wait_ready(self) -> ClientSession:
+        return await self._ready
+
+    @property
+    def alive(self) -> bool:
+        return self.session is not None and not self._task.done()
+
+    async def close(self):
+        self._stop.set()
+        try:
+            await asyncio.wait_for(self._task, timeout=5)
+        except Exception:
+            self._task.cancel()
+
+
+class MCPSessionManager:
+    def __init__(self, url: str = MCP_FINANCE_URL, pool_size: int = MCP_POOL_SIZE,
+                 cache_file: str = MCP_TOOLS_CACHE):
+        self.url = url
+        self.pool_size = pool_size
+        self.cache_file = cache_file
+        self._idle: Optional[asyncio.Queue] = None
+        self._open = 0
+        self._lock: Optional[asyncio.Lock] = None
+        self._tool_specs: Optional[List[Dict]] = None
+        self._langchain_tools: Optional[List[StructuredTool]] = None
+        self._all_sessions: List[_PooledSession] = []
+        self._tools_verified = False   # True once the tool list came from the live server
+        self._refresh_task: Optional[asyncio.Task] = None
+        self.tools_hash: Optional[str] = None
+        self.tools_refreshed_at: Optional[float] = None
+        # Called with the new tool list when a refresh finds a different tool set
+        self.on_tools_changed: Optional[Callable[[List[StructuredTool]], Awaitable[None]]] = None
+        self.stats = {"calls": 0, "errors": 0, "connects": 0, "reconnects": 0, "total_call_seconds": 0.0,
+                      "tool_refreshes": 0, "tool_changes": 0}
+
+    def _ensure_primitives(self):
+        # Created lazily so they bind to the running event loop
+        if self._idle is None:
+            self._idle = asyncio.Queue()
+            self._lock = asyncio.Lock()
+
+    # ---------------- Connections ----------------
+    async def _connect(self) -> _PooledSession:
+        """Opens a new session, retrying with exponential backoff."""
+        delay = 0.5
+        for attempt in range(MCP_MAX_RECONNECT_ATTEMPTS):
+            pooled = _PooledSession(self.url)
+            try:
+                await asyncio.wait_for(pooled.wait_ready(), timeout=MCP_CALL_TIMEOUT)
+                self.stats["connects"] += 1
+                self._all_sessions.append(pooled)
+                self._schedule_refresh()
+                return pooled
+            except Exception as e:
+                await pooled.close()
+                print(f"⚠️ MCP: Connect attempt {attempt+1}/{MCP_MAX_RECONNECT_ATTEMPTS} failed: {e}. Retrying in {delay}s")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 10)
+        raise ConnectionError(f"Could not connect to MCP server at {self.url}")
+
+    async def _acquire(self) -> _PooledSession:
+        self._ensure_primitives()
+        while True:
+            try:
+                pooled = self._idle.get_nowait()
+            except asyncio.QueueEmpty:
+                async with self._lock:
+                    can_open = self._open < self.pool_size
+                    if can_open:
+                        self._open += 1
+                if can_open:
+                    try:
+                        return await self._connect()
+                    except Exception:
+                        async with self._lock:
+                            self._open -= 1
+                        raise
+                pooled = await self._idle.get()
+            if pooled.alive:
+                return pooled
+            await self._discard(pooled)
+
+    def _release(self, pooled: _PooledSession):
+        self._idle.put_nowait(pooled)
+
+    async def _discard(self, pooled: _PooledSession):
+        await pooled.close()
+        if pooled in self._all_sessions:
+            self._all_sessions.remove(pooled)
+        async with self._lock:
+            self._open -= 1
+
+    # ---------------- Tool discovery ----------------
+    async def _discover(self) -> List[Dict]:
+        pooled = await self._acquire()
+        try:
+            result = await pooled.session.list_tools()
+        finally:
+            self._release(pooled)
+        specs = [{"name": t.name, "description": t.description or "", "input_schema": t.inputSchema} for t in result.tools]
+        with open(self.cache_file, "w") as f:
+            json.dump(specs, f)
+        return specs
+
+    @staticmethod
+    def _specs_hash(specs: List[Dict]) -> str:
+        return hashlib.sha256(json.dumps(specs, sort_keys=True).encode()).hexdigest()[:16]
+
+    def _set_specs(self, specs: List[Dict]):
+        self._tool_specs = specs
+        self.tools_hash = self._specs_hash(specs)
+        self._langchain_tools = [self._make_tool(spec) for spec in specs]
+
+    async def get_tools(self, refresh: bool = False) -> List[StructuredTool]:
+        """
+        Returns LangChain tools backed by the pool. Uses the cached tool list when
+        available, so startup does not block on the MCP server.
+        """
+        if refresh:
+            await self.refresh_tools()
+            return self._langchain_tools
+        if self._langchain_tools is not None:
+            return self._langchain_tools
+
+        if os.path.exists(self.cache_file):
+            with open(self.cache_file, "r") as f:
+                specs = json.load(f)
+            print(f"📦 MCP: Loaded {len(specs)} tools from cache.")
+        else:
+            specs = await self._discover()
+            self._tools_verified = True
+            self.tools_refreshed_at = time.time()
+            print(f"✅ MCP: Discovered {len(specs)} tools.")
+        self._set_specs(specs)
+        return self._langchain_tools
+
+    async def refresh_tools(self) -> bool:
+        """
+        Re-lists the server's tools and rewrites the cache. Returns True (and calls
+        on_tools_changed) when the tool set differs from the one in use.
+        """
+        specs = await self._discover()
+        self._tools_verified = True
+        self.tools_refreshed_at = time.time()
+        self.stats["tool_refreshes"] += 1
+        if self._tool_specs is not None and self._specs_hash(specs) == self.tools_hash:
+            return False
+        self._set_specs(specs)
+        self.stats["tool_changes"] += 1
+        print(f"🔄 MCP: Tool list changed ({len(specs)} tools, hash {self.tools_hash}).")
+        if self.on_tools_changed is not None:
+            await self.on_tools_changed(self._langchain_tools)
+        return True
+
+    def _schedule_refresh(self):
+        """After the first connect, checks a cache-loaded tool list against the server in the background."""
+        if self._tools_verified or self._refresh_task is not None:
+            return
+        self._refresh_task = asyncio.create_task(self._background_refresh())
+
+    async def _background_refresh(self):
+        try:
+            await self.refresh_tools()
+        except Exception as e:
+            print(f"⚠️ MCP: Background tool refresh failed: {e}")
+        finally:
+            self._refresh_task = None
+
+    def _make_tool(self, spec: Dict) -> StructuredTool:
+        async def _run(**kwargs):
+            return await self.call_tool(spec["name"], kwargs)
+        return StructuredTool(
+            name=spec["name"],
+            description=spec["description"],
+            args_schema=spec["input_schema"],
+            coroutine=_run,
+        )
+
+    # ---------------- Tool calls ----------------
+    async def call_tool(self, name: str, arguments: Dict) -> str:
+        start = time.perf_counter()
+        self.stats["calls"] += 1
+        for attempt in range(2):
+            pooled = await self._acquire()
+            try:
+                result = await asyncio.wait_for(pooled.session.call_tool(name, arguments), timeout=MCP_CALL_TIMEOUT)
+                self._release(pooled)
+                break
+            except Exception as e:
+                # Broken connection: drop it and retry once on a fresh session
+                await self._discard(pooled)
+                if attempt == 1:
+                    self.stats["errors"] += 1
+                    raise ToolException(f"MCP tool '{name}' failed: {e}")
+                self.stats["reconnects"] += 1
+                print(f"🔁 MCP: Session error during '{name}' ({e}). Reconnecting...")
+        self.stats["total_call_seconds"] += time.perf_counter() - start
+
+        text = "\n".join(getattr(c, "text", "") for c in result.content)
+        if result.isError:
+            self.stats["errors"] += 1
+            raise ToolException(text)
+        return text
+
+    def get_stats(self) -> Dict:
+        calls = self.stats["calls"] or 1
+        return {
+            **self.stats,
+            "open_sessions": self._open,
+            "idle_sessions": self._idle.qsize() if self._idle else 0,
+            "pool_size": self.pool_size,
+            "avg_call_seconds": round(self.stats["total_call_seconds"] / calls, 4),
+            "cached_tools": [s["name"] for s in (self._tool_specs or [])],
+            "tools_hash": self.tools_hash,
+            "tools_verified": self._tools_verified,
+            "tools_refreshed_at": self.tools_refreshed_at,
+        }
+
+    async def close(self):
+        if self._refresh_task is not None:
+            self._refresh_task.cancel()
+            self._refresh_task = None
+        for pooled in list(self._all_sessions):
+            await pooled.close()
+        self._all_sessions.clear()
+        self._open = 0
+        self._idle = None
+        self._lock = None
@@ -0,0 +1,118 @@
+# filename: ocr_fallback.py
+"""
+OCR fallback for scanned PDFs.
+
+Only pages WITHOUT a text layer are rasterised and OCR'd (pypdfium2 + local
+Tesseract). Pages are processed in a bounded process pool and the recognised
+text is merged back into the page Documents returned by PyPDFLoader, so the
+downstream extraction sees the full document.
+"""
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, List
+
+# =========================================================
+# 1️⃣ CONFIGURATION
+# =========================================================
+OCR_ENABLED = os.getenv("OCR_ENABLED", "true").lower() == "true"
+OCR_MAX_WORKERS = int(os.getenv("OCR_MAX_WORKERS", str(min(4, os.cpu_count() or 1))))
+OCR_MIN_PAGE_CHARS = int(os.getenv("OCR_MIN_PAGE_CHARS", "20"))  # Below this a page has "no text layer"
+OCR_DPI = int(os.getenv("OCR_DPI", "200"))
+OCR_LANG = os.getenv("OCR_LANG", "eng+hin")  # Indian circulars are often bilingual
+
+_ocr_pool = None
+
+
+def get_ocr_pool():
+    """Lazily creates the shared (bounded) OCR process pool."""
+    global _ocr_pool
+    if _ocr_pool is None:
+        _ocr_pool = ProcessPoolExecutor(max_workers=OCR_MAX_WORKERS)
+    return _ocr_pool
+
+
+def shutdown_ocr_pool():
+    global _ocr_pool
+    if _ocr_pool is not None:
+        _ocr_pool.shutdown(wait=False, cancel_futures=True)
+        _ocr_pool = None
+
+
+# =========================================================
+# 2️⃣ WORKER (runs inside the process pool)
+# =========================================================
+def _ocr_page(file_path: str, page_index: int, dpi: int, lang: str):
+    """Rasterises and OCRs a single page. Returns (page_index, text, cpu_seconds)."""
+    import pypdfium2 as pdfium
+    import pytesseract
+
+    cpu_start = time.process_time()
+    pdf = pdfium.PdfDocument(file_path)
+    try:
+        page = pdf[page_index]
+        bitmap = page.render(scale=dpi / 72)
+        image = bitmap.to_pil()
+        text = pytesseract.image_to_string(image, lang=lang)
+        page.close()
+    finally:
+        pdf.close()
+    return page_index, text, time.process_time() - cpu_start
+
+
+# =========================================================
+# 3️⃣ PUBLIC API
+# =========================================================
+def find_textless_pages(docs) -> List[int]:
+    """Indexes of page Documents that have no usable text layer."""
+    return [i for i, d in enumerate(docs) if len((d.page_content or "").strip()) < OCR_MIN_PAGE_CHARS]
+
+
+def ocr_textless_pages(file_path: str, docs) -> Dict:
+    """
+    OCRs only the text-less pages of `docs` (one Document per page, as returned
+    by PyPDFLoader) and merges the result into them IN PLACE.
+    Returns stats including the CPU seconds spent, so workers can be sized.
+    """
+    pdf_filename = os.path.basename(file_path)
+    missing = find_textless_pages(docs)
+    stats = {
+        "pages_total": len(docs),
+        "pages_ocr": 0,
+        "pages_failed": 0,
+        "cpu_seconds": 0.0,
+        "wall_seconds": 0.0,
+    }
+    if not missing:
+        return stats
+    if not OCR_ENABLED:
+        print(f"⚠️ OCR: {len(missing)} text-less pages in {pdf_filename} but OCR is disabled.")
+        return stats
+
+    print(f"🔠 OCR: {len(missing)}/{len(docs)} pages of {pdf_filename} have no text layer. Running OCR...")
+    wall_start = time.perf_counter()
+    pool = get_ocr_pool()
+    futures = {}
+    for i in missing:
+        # PyPDFLoader stores the 0-based page number in metadata; fall back to list position
+        page_index = docs[i].metadata.get("page", i)
+        futures[pool.submit(_ocr_page, file_path, page_index, OCR_DPI, OCR_LANG)] = i
+
+    for future in as_completed(futures):
+        doc_index = futures[future]
+        try:
+            _, text, cpu_seconds = future.result()
+            stats["cpu_seconds"] += cpu_seconds
+            if text.strip():
+                docs[doc_index].page_content = text
+                docs[doc_index].metadata["ocr"] = True
+                stats["pages_ocr"] += 1
+        except Exception as e:
+            stats["pages_failed"] += 1
+            print(f"❌ OCR: Page {doc_index} of {pdf_filename} failed: {e}")
+
+    stats["wall_seconds"] = round(time.perf_counter() - wall_start, 3)
+    stats["cpu_seconds"] = round(stats["cpu_seconds"], 3)
+    print(f"✅ OCR: {pdf_filename} -> {stats['pages_ocr']} pages recovered, "
+          f"{stats['cpu_seconds']}s CPU / {stats['wall_seconds']}s wall ({OCR_MAX_WORKERS} workers).")
+    return stats
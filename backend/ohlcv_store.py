@@ -0,0 +1,201 @@
+# filename: ohlcv_store.py
+"""
+Local columnar OHLCV store for the Finance MCP server.
+
+One directory per ticker with one raw binary file per column (date, OHLCV and the
+derived indicators). Files are append-only and read back with np.memmap, so long
+histories are served from local disk without copies or network calls.
+Only the missing bars are fetched on each sync, and indicators are computed for the
+new rows only (using the last LOOKBACK rows as context).
+"""
+import os
+import re
+import json
+import time
+import threading
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+PRICE_COLUMNS = ("open", "high", "low", "close", "volume")
+INDICATOR_COLUMNS = ("sma_20", "sma_50", "rsi_14", "pp_r1", "pp_s1")
+LOOKBACK = 50  # Longest indicator window (SMA_50); enough context for incremental updates
+TICKER_PATTERN = re.compile(r"^[A-Z0-9.\-^=]{1,20}$")  # e.g. AAPL, INFY.NS, ^NSEI, EURUSD=X, BRK-B
+
+
+def validate_ticker(ticker: str) -> str:
+    """Returns the ticker if it is safe to use as a directory name, else raises ValueError."""
+    if not isinstance(ticker, str) or not TICKER_PATTERN.match(ticker) or ".." in ticker or ticker.strip(".") == "":
+        raise ValueError(f"Invalid ticker symbol: {ticker!r}")
+    return ticker
+
+
+class OHLCVStore:
+    def __init__(self, root: str, indicator_fn: Callable, backfill_days: int = 730, sync_ttl_seconds: int = 3600):
+        """
+        indicator_fn(close, high, low) takes (1 x n) matrices and returns a dict with
+        SMA_20, SMA_50, RSI_14, PP_R1 and PP_S1 matrices of the same shape.
+        """
+        self.root = root
+        self.indicator_fn = indicator_fn
+        self.backfill_days = backfill_days
+        self.sync_ttl_seconds = sync_ttl_seconds
+        self._locks: Dict[str, threading.Lock] = {}
+        self._locks_guard = threading.Lock()
+        self.stats = {"syncs": 0, "rows_appended": 0, "network_fetches": 0, "fresh_reads": 0}
+        os.makedirs(root, exist_ok=True)
+
+    # ---------------- Layout ----------------
+    def _dir(self, ticker: str) -> str:
+        # Tickers come from the LLM: never let one escape the store root
+        return os.path.join(self.root, validate_ticker(ticker))
+
+    def _col_path(self, ticker: str, column: str) -> str:
+        return os.path.join(self._dir(ticker), f"{column}.bin")
+
+    @staticmethod
+    def _dtype(column: str):
+        return np.int64 if column == "date" else np.float64
+
+    def _lock(self, ticker: str) -> threading.Lock:
+        with self._locks_guard:
+            return self._locks.setdefault(ticker, threading.Lock())
+
+    def _read_meta(self, ticker: str) -> dict:
+        path = os.path.join(self._dir(ticker), "meta.json")
+        if os.path.exists(path):
+            with open(path, "r") as f:
+                return json.load(f)
+        return {"rows": 0, "last_date": None, "synced_at": 0}
+
+    def _write_meta(self, ticker: str, meta: dict):
+        path = os.path.join(self._dir(ticker), "meta.json")
+        tmp = f"{path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(meta, f)
+        os.replace(tmp, path)
+
+    # ---------------- Reads (zero-copy) ----------------
+    def read(self, ticker: str, last_n: Optional[int] = None) -> Dict[str, np.ndarray]:
+        """Memory-maps the committed rows of every column (optionally only the last n)."""
+        meta = self._read_meta(ticker)
+        rows = meta["rows"]
+        columns = {}
+        for column in ("date",) + PRICE_COLUMNS + INDICATOR_COLUMNS:
+            if rows == 0:
+                columns[column] = np.empty(0, dtype=self._dtype(column))
+                continue
+            mm = np.memmap(self._col_path(ticker, column), dtype=self._dtype(column), mode="r", shape=(rows,))
+            columns[column] = mm[-last_n:] if last_n else mm
+        return columns
+
+    def row_count(self, ticker: str) -> int:
+        return self._read_meta(ticker)["rows"]
+
+    # ---------------- Incremental append ----------------
+    def sync(self, ticker: str, fetch_fn: Callable[[str, datetime, datetime], pd.DataFrame], force: bool = False) -> int:
+        """
+        Appends the bars missing since the last stored date. The last stored bar is
+        re-fetched and replaced (today's bar changes until the close).
+        Returns the number of rows appended.
+        """
+        with self._lock(ticker):
+            meta = self._read_meta(ticker)
+            if not force and time.time() - meta["synced_at"] < self.sync_ttl_seconds:
+                self.stats["fresh_reads"] += 1
+                return 0
+
+            os.makedirs(self._dir(ticker), exist_ok=True)
+            end = datetime.now()
+            if meta["last_date"] is None:
+                start = end - timedelta(days=self.backfill_days)
+            else:
+                start = datetime(1970, 1, 1) + timedelta(days=meta["last_date"])
+
+            self.stats["network_fetches"] += 1
+            frame = fetch_fn(ticker, start, end)
+            self.stats["syncs"] += 1
+            new = self._frame_to_columns(frame)
+
+            keep = meta["rows"]
+            if keep and len(new["date"]):
+                # Bars the fetch re-delivered (normally just the still-forming last bar) are replaced
+                stored_dates = self.read(ticker)["date"]
+                keep = int(np.searchsorted(stored_dates, new["date"][0], side="left"))
+
+            appended = len(new["date"])
+            if appended:
+                new.update(self._incremental_indicators(ticker, keep, new))
+                self._truncate(ticker, keep)
+                for column, values in new.items():
+                    with open(self._col_path(ticker, column), "ab") as f:
+                        f.write(np.ascontiguousarray(values, dtype=self._dtype(column)).tobytes())
+                meta["rows"] = keep + appended
+                meta["last_date"] = int(new["date"][-1])
+                self.stats["rows_appended"] += appended
+
+            meta["synced_at"] = time.time()
+            self._write_meta(ticker, meta)
+            return appended
+
+    def _truncate(self, ticker: str, rows: int):
+        """Drops everything past `rows` (replaced bar or leftovers of an interrupted append)."""
+        for column in ("date",) + PRICE_COLUMNS + INDICATOR_COLUMNS:
+            path = self._col_path(ticker, column)
+            if os.path.exists(path):
+                with open(path, "r+b") as f:
+                    f.truncate(rows * np.dtype(self._dtype(column)).itemsize)
+
+    def _incremental_indicators(self, ticker: str, keep: int, new: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+        """Computes indicators for the new rows only, using the last LOOKBACK stored rows as context."""
+        if keep:
+            full = self.read(ticker)
+            start = max(0, keep - LOOKBACK)
+            context = {c: full[c][start:keep] for c in ("close", "high", "low")}
+        else:
+            context = {c: np.empty(0) for c in ("close", "high", "low")}
+
+        close = np.concatenate([context["close"], new["close"]])[None, :]
+        high = np.concatenate([context["high"], new["high"]])[None, :]
+        low = np.concatenate([context["low"], new["low"]])[None, :]
+        ind = self.indicator_fn(close, high, low)
+        n_new = len(new["close"])
+        return {
+            "sma_20": ind["SMA_20"][0, -n_new:],
+            "sma_50": ind["SMA_50"][0, -n_new:],
+            "rsi_14": ind["RSI_14"][0, -n_new:],
+            "pp_r1": ind["PP_R1"][0, -n_new:],
+            "pp_s1": ind["PP_S1"][0, -n_new:],
+        }
+
+    @staticmethod
+    def _frame_to_columns(frame: pd.DataFrame) -> Dict[str, np.ndarray]:
+        if frame is None or frame.empty:
+            return {"date": np.empty(0, dtype=np.int64), **{c: np.empty(0) for c in PRICE_COLUMNS}}
+        frame = frame.sort_index()
+        index = pd.DatetimeIndex(frame.index)
+        if index.tz is not None:
+            index = index.tz_localize(None)
+        dates = index.normalize().values.astype("datetime64[D]").astype(np.int64)
+        # One bar per day (keep the latest)
+        _, last_idx = np.unique(dates[::-1], return_index=True)
+        keep = np.sort(len(dates) - 1 - last_idx)
+        return {
+            "date": dates[keep],
+            "open": frame["Open"].to_numpy(dtype=float)[keep],
+            "high": frame["High"].to_numpy(dtype=float)[keep],
+            "low": frame["Low"].to_numpy(dtype=float)[keep],
+            "close": frame["Close"].to_numpy(dtype=float)[keep],
+            "volume": frame["Volume"].to_numpy(dtype=float)[keep] if "Volume" in frame else np.zeros(len(keep)),
+        }
+
+    def get_stats(self) -> dict:
+        tickers = [d for d in os.listdir(self.root) if os.path.isdir(os.path.join(self.root, d))]
+        size = 0
+        for t in tickers:
+            directory = os.path.join(self.root, t)
+            for name in os.listdir(directory):
+                size += os.path.getsize(os.path.join(directory, name))
+        return {**self.stats, "tickers": len(tickers), "bytes_on_disk": size}
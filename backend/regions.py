@@ -0,0 +1,125 @@
+# filename: regions.py
+"""
+Canonical region hierarchy for geographic eligibility.
+
+    State / UT  -[:PART_OF]->  Pan-India  -[:PART_OF]->  Country(India)
+
+Free-text regions from extraction ("TN", "Orissa", "All India", "North-East")
+are resolved to canonical keys so grants and SME profiles compare exactly.
+"""
+import re
+from typing import Dict, Iterable, List, Optional, Tuple
+
+PAN_INDIA = "pan-india"
+
+STATES = {
+    # States
+    "andhra pradesh": "Andhra Pradesh", "arunachal pradesh": "Arunachal Pradesh", "assam": "Assam",
+    "bihar": "Bihar", "chhattisgarh": "Chhattisgarh", "goa": "Goa", "gujarat": "Gujarat",
+    "haryana": "Haryana", "himachal pradesh": "Himachal Pradesh", "jharkhand": "Jharkhand",
+    "karnataka": "Karnataka", "kerala": "Kerala", "madhya pradesh": "Madhya Pradesh",
+    "maharashtra": "Maharashtra", "manipur": "Manipur", "meghalaya": "Meghalaya", "mizoram": "Mizoram",
+    "nagaland": "Nagaland", "odisha": "Odisha", "punjab": "Punjab", "rajasthan": "Rajasthan",
+    "sikkim": "Sikkim", "tamil nadu": "Tamil Nadu", "telangana": "Telangana", "tripura": "Tripura",
+    "uttar pradesh": "Uttar Pradesh", "uttarakhand": "Uttarakhand", "west bengal": "West Bengal",
+    # Union Territories
+    "andaman and nicobar islands": "Andaman and Nicobar Islands", "chandigarh": "Chandigarh",
+    "dadra and nagar haveli and daman and diu": "Dadra and Nagar Haveli and Daman and Diu",
+    "delhi": "Delhi", "jammu and kashmir": "Jammu and Kashmir", "ladakh": "Ladakh",
+    "lakshadweep": "Lakshadweep", "puducherry": "Puducherry",
+}
+
+ALIASES = {
+    "ap": "andhra pradesh", "tn": "tamil nadu", "up": "uttar pradesh", "mp": "madhya pradesh",
+    "wb": "west bengal", "hp": "himachal pradesh", "j&k": "jammu and kashmir", "jk": "jammu and kashmir",
+    "orissa": "odisha", "uttaranchal": "uttarakhand", "pondicherry": "puducherry",
+    "new delhi": "delhi", "nct of delhi": "delhi", "bengal": "west bengal", "chattisgarh": "chhattisgarh",
+    "andaman": "andaman and nicobar islands", "daman and diu": "dadra and nagar haveli and daman and diu",
+    "dadra and nagar haveli": "dadra and nagar haveli and daman and diu",
+}
+
+# Major cities -> state key, for registers that only carry a city column
+CITIES = {
+    "mumbai": "maharashtra", "pune": "maharashtra", "nagpur": "maharashtra", "nashik": "maharashtra",
+    "aurangabad": "maharashtra", "thane": "maharashtra", "bengaluru": "karnataka", "bangalore": "karnataka",
+    "mysuru": "karnataka", "mysore": "karnataka", "hubli": "karnataka", "chennai": "tamil nadu",
+    "coimbatore": "tamil nadu", "madurai": "tamil nadu", "tiruppur": "tamil nadu", "hyderabad": "telangana",
+    "warangal": "telangana", "visakhapatnam": "andhra pradesh", "vijayawada": "andhra pradesh",
+    "kolkata": "west bengal", "howrah": "west bengal", "ahmedabad": "gujarat", "surat": "gujarat",
+    "vadodara": "gujarat", "rajkot": "gujarat", "jaipur": "rajasthan", "jodhpur": "rajasthan",
+    "udaipur": "rajasthan", "lucknow": "uttar pradesh", "kanpur": "uttar pradesh", "noida": "uttar pradesh",
+    "ghaziabad": "uttar pradesh", "agra": "uttar pradesh", "varanasi": "uttar pradesh", "gurugram": "haryana",
+    "gurgaon": "haryana", "faridabad": "haryana", "ludhiana": "punjab", "amritsar": "punjab",
+    "indore": "madhya pradesh", "bhopal": "madhya pradesh", "patna": "bihar", "ranchi": "jharkhand",
+    "jamshedpur": "jharkhand", "bhubaneswar": "odisha", "raipur": "chhattisgarh", "guwahati": "assam",
+    "kochi": "kerala", "thiruvananthapuram": "kerala", "dehradun": "uttarakhand", "shimla": "himachal pradesh",
+    "srinagar": "jammu and kashmir", "panaji": "goa", "delhi": "delhi", "new delhi": "delhi",
+}
+
+NATIONAL_NAMES = {"india", "pan india", "pan-india", "all india", "all-india", "national", "nationwide",
+                  "all states", "all states and uts", "entire country", "across india"}
+
+GROUPS = {
+    "north east": ["arunachal pradesh", "assam", "manipur", "meghalaya", "mizoram", "nagaland", "sikkim", "tripura"],
+    "north eastern region": ["arunachal pradesh", "assam", "manipur", "meghalaya", "mizoram", "nagaland", "sikkim", "tripura"],
+    "ner": ["arunachal pradesh", "assam", "manipur", "meghalaya", "mizoram", "nagaland", "sikkim", "tripura"],
+    "himalayan states": ["himachal pradesh", "uttarakhand", "jammu and kashmir", "ladakh", "sikkim"],
+}
+
+
+def _normalise(name: str) -> str:
+    name = (name or "").lower().replace("&", " and ")
+    name = re.sub(r"[^a-z\s-]", " ", name)
+    name = re.sub(r"\b(government|govt|state|union territory|ut) of\b", " ", name)
+    return re.sub(r"[\s-]+", " ", name).strip()
+
+
+def resolve_region(name: str) -> Tuple[List[str], bool]:
+    """Returns (canonical keys, resolved). A national region resolves to [PAN_INDIA]."""
+    raw = (name or "").strip().lower()
+    if raw in ALIASES:
+        return [ALIASES[raw]], True
+    norm = _normalise(name)
+    if not norm:
+        return [], True
+    if norm in NATIONAL_NAMES or raw in NATIONAL_NAMES:
+        return [PAN_INDIA], True
+    if norm in STATES:
+        return [norm], True
+    if norm in ALIASES:
+        return [ALIASES[norm]], True
+    for group, members in GROUPS.items():
+        if re.search(rf"\b{group}\b", norm):
+            return list(members), True
+    # Longer text that still names a state ("Government of Gujarat")
+    found = [key for key in STATES if re.search(rf"\b{re.escape(key)}\b", norm)]
+    return (found, True) if found else ([], False)
+
+
+def resolve_regions(names: Iterable[str]) -> Tuple[List[str], bool]:
+    """Canonical keys for a list of regions; `unresolved` is True if any name was not recognised."""
+    keys, unresolved = set(), False
+    for name in names or []:
+        resolved, ok = resolve_region(name)
+        keys.update(resolved)
+        unresolved |= not ok
+    if PAN_INDIA in keys:
+        keys = {PAN_INDIA}
+    return sorted(keys), unresolved
+
+
+def resolve_sme_state(location: Optional[str]) -> Optional[str]:
+    """Canonical state key for an SME location, or None if it cannot be resolved to one state."""
+    keys, _ = resolve_region(location or "")
+    return keys[0] if len(keys) == 1 and keys[0] != PAN_INDIA else None
+
+
+def state_for_city(city: Optional[str]) -> Optional[str]:
+    """State name for a known city, else None (unknown cities are not guessed)."""
+    key = CITIES.get(_normalise(city or ""))
+    return STATES[key] if key else None
+
+
+def hierarchy_rows() -> List[Dict]:
+    """Rows for materialising the State -> Pan-India -> India hierarchy."""
+    return [{"key": key, "name": name} for key, name in STATES.items()]
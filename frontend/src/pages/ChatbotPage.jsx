@@ -277,7 +277,7 @@ const ChatbotPage = () => {
             const data = await response.json();
 
             setMessages((prev) => [...prev, { 
-                text: `✅ Document Ingested! Added ${data.chunks_added} chunks to knowledge base.`, 
+                text: `✅ Document Queued! Ingesting in background (Job: ${data.job_ids.join(", ")}).`, 
                 sender: "bot", 
                 type: "text" 
             }]);
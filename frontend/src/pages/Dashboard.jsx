@@ -1,12 +1,17 @@
-import React, { useState } from 'react';
+import React, { useEffect, useRef, useState } from 'react';
 import { useNavigate } from 'react-router-dom';
 
 const DashboardPage = () => {
     const [textInput, setTextInput] = useState('');
     const [loading, setLoading] = useState(false);
     const [status, setStatus] = useState('');
+    const [progress, setProgress] = useState(null);
+    const eventsRef = useRef(null);
     const navigate = useNavigate();
 
+    // Close the progress stream when leaving the page
+    useEffect(() => () => eventsRef.current?.close(), []);
+
     const API_BASE_URL = "http://localhost:8000";
 
     // --- Backend Interaction ---
@@ -44,6 +49,34 @@ const DashboardPage = () => {
         }
     };
 
+    // /scrape returns a job handle at once; progress arrives as server-sent events
+    const followJob = (data) => {
+        eventsRef.current?.close();
+        const events = new EventSource(`${API_BASE_URL}${data.events_url}`);
+        eventsRef.current = events;
+
+        events.addEventListener('progress', (event) => {
+            const job = JSON.parse(event.data);
+            setProgress(job.progress);
+            if (job.status === 'completed') {
+                setStatus(`✅ Success: ${job.message}`);
+            } else if (job.status === 'failed') {
+                setStatus(`❌ Error: ${job.error}`);
+            } else {
+                setStatus(`⏳ Job ${job.job_id} is ${job.status}...`);
+            }
+        });
+        events.addEventListener('done', () => {
+            events.close();
+            setLoading(false);
+        });
+        events.onerror = () => {
+            events.close();
+            setStatus(`⚠️ Warning: lost the progress stream. Check /jobs/${data.job_id} for the result.`);
+            setLoading(false);
+        };
+    };
+
     const handleManualScrape = async (e) => {
         e.preventDefault();
         
@@ -59,21 +92,17 @@ const DashboardPage = () => {
         }
 
         setLoading(true);
+        setProgress(null);
         setStatus(`Sending batch request for ${urlsToScrape.length} URL(s)...`);
 
         try {
-            // 2. Send the whole list in one request
+            // 2. Send the whole list in one request; the backend queues it and returns a job
             const data = await triggerScrape(urlsToScrape);
-            
-            if (data.status === 'success') {
-                setStatus(`✅ Success: ${data.message}`);
-                setTextInput(''); // Clear input on success
-            } else {
-                setStatus(`⚠️ Warning: ${data.message}`);
-            }
+            setStatus(`⏳ Queued as job ${data.job_id}...`);
+            setTextInput(''); // Clear input once accepted
+            followJob(data);
         } catch (error) {
             setStatus(`❌ Error: ${error.message}`);
-        } finally {
             setLoading(false);
         }
     };
@@ -154,6 +183,25 @@ const DashboardPage = () => {
                             <strong>Status:</strong> {status}
                         </div>
                     )}
+
+                    {/* Job Progress */}
+                    {progress && (
+                        <div className="mt-4 grid grid-cols-2 md:grid-cols-4 gap-3 text-sm">
+                            {[
+                                ['Pages fetched', progress.pages_fetched],
+                                ['PDFs downloaded', progress.pdfs_downloaded],
+                                ['Extracted', progress.extracted],
+                                ['Embedded', progress.embedded],
+                                ['Skipped', progress.skipped],
+                                ['Failed', progress.failed],
+                            ].map(([label, value]) => (
+                                <div key={label} className="p-3 rounded-lg bg-neutral-800 border border-neutral-700">
+                                    <div className="text-neutral-400">{label}</div>
+                                    <div className="text-xl font-bold text-white">{value ?? 0}</div>
+                                </div>
+                            ))}
+                        </div>
+                    )}
                 </div>
             </div>
         </div>
@@ -1,10 +1,12 @@
-import React, { useState } from 'react';
+import React, { useState, useEffect } from 'react';
 import { useLocation, useNavigate } from 'react-router-dom';
 import GrantDetailModal from './GrantDetailModal';
 import ReactMarkdown from 'react-markdown';
 import remarkGfm from 'remark-gfm';
 
-// Dummy data for fallback
+const API_BASE_URL = "http://localhost:8000";
+
+// Dummy data for fallback (backend unreachable)
 const DUMMY_GRANTS = [
     {
         id: "dummy_1",
@@ -24,7 +26,19 @@ const GrantListPage = () => {
     
     // Extract data
     const { formData, grants, checklist } = location.state || {};
-    const displayGrants = (grants && grants.length > 0) ? grants : DUMMY_GRANTS;
+    const hasMatches = grants && grants.length > 0;
+
+    // No match results: browse the catalogue instead
+    const [catalogue, setCatalogue] = useState([]);
+    useEffect(() => {
+        if (hasMatches) return;
+        fetch(`${API_BASE_URL}/grants?limit=20&include_facets=false`)
+            .then(res => res.ok ? res.json() : { grants: [] })
+            .then(data => setCatalogue(data.grants || []))
+            .catch(() => setCatalogue([]));
+    }, [hasMatches]);
+
+    const displayGrants = hasMatches ? grants : (catalogue.length > 0 ? catalogue : DUMMY_GRANTS);
 
     const [selectedGrant, setSelectedGrant] = useState(null);
     const [isModalOpen, setIsModalOpen] = useState(false);
@@ -115,6 +115,7 @@ const GrantDiscoveryModal = ({ isOpen, onClose }) => {
                     financial_performance: formData.Financial_Performance, 
                     location_state: formData.Location_State,
                     project_value: parseFloat(formData.Project_Value || 0), 
+                    project_value_unit: "Lakh", // The form asks for the budget in INR Lakhs
                     project_need_description: formData.Project_Need,
                     email: formData.Email_ID // --- NEW FIELD ---
                 }
@@ -1,6 +1,7 @@
 import streamlit as st
 import requests
 import json
+import time
 
 # =========================================================
 # CONFIGURATION
@@ -10,8 +11,10 @@ BASE_URL = "http://localhost:8000"
 CHAT_URL = f"{BASE_URL}/chat"
 # CHANGED: Pointing to the new automated scrape endpoint
 SCRAPE_URL = f"{BASE_URL}/scrape" 
+JOBS_URL = f"{BASE_URL}/jobs"
 QA_URL = f"{BASE_URL}/grant-qa"
 MATCH_URL = f"{BASE_URL}/match-grants"
+JOB_POLL_LIMIT = 900  # x 2s: stop watching (the job keeps running) after 30 minutes
 
 # Set page configuration
 st.set_page_config(
@@ -65,37 +68,49 @@ with st.sidebar:
                     url_list = [u.strip() for u in scrape_url_input.split(",") if u.strip()]
                     payload = {"urls": url_list}
                     
-                    # 2. Call the /scrape endpoint
-                    # Increased timeout to 300s because downloading multiple PDFs takes time
-                    response = requests.post(SCRAPE_URL, json=payload, timeout=300)
+                    # 2. Call the /scrape endpoint (returns a job handle immediately)
+                    response = requests.post(SCRAPE_URL, json=payload, timeout=30)
                     
-                    if response.status_code == 200:
-                        data = response.json()
-                        status.update(label="Ingestion Pipeline Active!", state="complete", expanded=False)
+                    if response.status_code == 202:
+                        job_id = response.json()["job_id"]
+                        st.write(f"🧾 Queued as job `{job_id}`")
+                        progress_box = st.empty()
                         
-                        if data.get("status") == "success":
-                            st.success(f"✅ {data.get('message')}")
-                            
-                            # Display Stats
-                            files = data.get("files_queued", [])
-                            details = data.get("details", [])
-                            
-                            col1, col2 = st.columns(2)
-                            col1.metric("URLs Processed", len(url_list))
-                            col2.metric("PDFs Queued", len(files))
+                        # 3. Poll the job until the background pipeline finishes
+                        job = {}
+                        for _ in range(JOB_POLL_LIMIT):
+                            job = requests.get(f"{JOBS_URL}/{job_id}", timeout=10).json()
+                            progress = job.get("progress", {})
+                            with progress_box.container():
+                                col1, col2, col3 = st.columns(3)
+                                col1.metric("Pages Fetched", progress.get("pages_fetched", 0))
+                                col2.metric("PDFs Downloaded", progress.get("pdfs_downloaded", 0))
+                                col3.metric("Embedded", progress.get("embedded", 0))
+                                st.caption(f"Extracted: {progress.get('extracted', 0)} · "
+                                           f"Skipped: {progress.get('skipped', 0)} · Failed: {progress.get('failed', 0)}")
+                            if job.get("status") in ("completed", "failed"):
+                                break
+                            time.sleep(2)
+                        
+                        if job.get("status") == "completed":
+                            status.update(label="Ingestion Complete!", state="complete", expanded=True)
+                            st.success(f"✅ {job.get('message')}")
                             
+                            files = job.get("files", [])
                             if files:
-                                st.caption("📄 Files currently being processed by AI:")
+                                st.caption("📄 Files processed by AI:")
                                 st.code("\n".join(files), language="text")
-                            
-                            if details:
-                                with st.expander("View Scrape Details"):
-                                    for msg in details:
-                                        st.write(f"- {msg}")
+                        elif job.get("status") == "failed":
+                            status.update(label="Failed", state="error")
+                            st.error(job.get("error"))
                         else:
-                            st.warning(f"⚠️ {data.get('message')}")
-                            if data.get("details"):
-                                st.error(data.get("details"))
+                            status.update(label="Still running in the background", state="running")
+                            st.info(f"Check progress later at {JOBS_URL}/{job_id}")
+                        
+                        if job.get("errors"):
+                            with st.expander("View Scrape Details"):
+                                for msg in job["errors"]:
+                                    st.write(f"- {msg}")
 
                     else:
                         status.update(label="Failed", state="error")